@@ -0,0 +1,179 @@
+import time
+import logging
+import threading
+from beets_utils import connect_db, format_item, LIBRARY_ITEM_COLUMNS, MAX_PAGE_SIZE
+from sidecar import get_library_version
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+ALBUM_COLUMNS = "id, album, albumartist, albumartist_sort, year, genre, label, albumtype, comp, disctotal, added, artpath"
+
+# One row per album with everything the album list shows about its tracks
+ALBUM_STATS_QUERY = """
+    SELECT album_id,
+           COUNT(*) AS track_count,
+           TOTAL(length) AS total_length,
+           GROUP_CONCAT(DISTINCT NULLIF(format, '')) AS formats,
+           AVG(NULLIF(bitrate, 0)) AS avg_bitrate,
+           COUNT(DISTINCT disc) AS disc_count
+    FROM items
+    WHERE album_id IS NOT NULL {condition}
+    GROUP BY album_id
+"""
+
+TRACK_COLUMNS = LIBRARY_ITEM_COLUMNS + ", track, tracktotal, disc, disctotal"
+
+_lock = threading.Lock()
+_refresh_thread = None
+_stats = None
+_stats_version = None
+
+def _stats_row(row):
+    return (
+        row["track_count"],
+        row["total_length"],
+        sorted(row["formats"].split(",")) if row["formats"] else [],
+        int(round(row["avg_bitrate"])) if row["avg_bitrate"] else None,
+        row["disc_count"],
+    )
+
+def compute_album_stats(album_ids=None):
+    """Aggregate track stats per album in one grouped query.
+
+    Returns ``{album_id: (track_count, total_length, formats, avg_bitrate,
+    disc_count)}`` for all albums, or only for ``album_ids``.
+    """
+    conn = connect_db()
+    try:
+        if album_ids is None:
+            rows = conn.execute(ALBUM_STATS_QUERY.format(condition=""))
+        else:
+            placeholders = ",".join("?" * len(album_ids))
+            rows = conn.execute(
+                ALBUM_STATS_QUERY.format(condition=f"AND album_id IN ({placeholders})"), list(album_ids)
+            )
+        return {row["album_id"]: _stats_row(row) for row in rows}
+    finally:
+        conn.close()
+
+def _refresh(version):
+    global _stats, _stats_version, _refresh_thread
+    try:
+        started = time.time()
+        stats = compute_album_stats()
+        with _lock:
+            _stats, _stats_version = stats, version
+        logger.info(f"Aggregated stats of {len(stats)} albums in {time.time() - started:.2f}s")
+    except Exception as e:
+        logger.error(f"Error aggregating album stats: {str(e)}")
+    finally:
+        _refresh_thread = None
+
+def _start_refresh(version):
+    global _refresh_thread
+    with _lock:
+        if _refresh_thread is None:
+            _refresh_thread = threading.Thread(target=_refresh, args=(version,), daemon=True,
+                                               name="album-stats")
+            _refresh_thread.start()
+
+def warm_album_stats():
+    """Aggregate the album stats in the background."""
+    _start_refresh(get_library_version())
+
+def get_album_stats(album_ids):
+    """Get the track stats of the given albums.
+
+    Stats for the whole library are aggregated once per library version and
+    kept in memory. While they are being aggregated again, the requested
+    albums are aggregated directly and ``stale`` is returned as True.
+    """
+    version = get_library_version()
+    with _lock:
+        stats, stats_version = _stats, _stats_version
+    if stats is not None and stats_version == version:
+        return {album_id: stats.get(album_id) for album_id in album_ids}, False
+
+    _start_refresh(version)
+    return compute_album_stats(album_ids) if album_ids else {}, True
+
+def format_album(row, stats):
+    """Convert an albums row and its track stats to a dictionary."""
+    album = dict(row)
+    album["has_art"] = bool(album.pop("artpath"))
+    track_count, total_length, formats, avg_bitrate, disc_count = stats or (0, 0.0, [], None, 0)
+    minutes, seconds = divmod(int(total_length), 60)
+    album.update({
+        "track_count": track_count,
+        "total_length": total_length,
+        "length_formatted": f"{minutes}:{seconds:02d}",
+        "formats": formats,
+        "avg_bitrate": avg_bitrate,
+        "disc_count": disc_count,
+    })
+    return album
+
+def get_albums(artist=None, page=1, limit=100):
+    """Get a page of albums with their track stats, optionally filtered by artist.
+
+    An artist matches albums they are the album artist of, and albums with
+    any of their tracks, so compilations stay one album.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    offset = (max(page, 1) - 1) * limit
+    conn = connect_db()
+    try:
+        if artist:
+            rows = conn.execute(f"""
+                SELECT {ALBUM_COLUMNS}
+                FROM albums
+                WHERE albumartist = ? OR id IN (SELECT album_id FROM items WHERE artist = ?)
+                ORDER BY year DESC, album
+                LIMIT ? OFFSET ?
+            """, (artist, artist, limit + 1, offset)).fetchall()
+        else:
+            rows = conn.execute(f"""
+                SELECT {ALBUM_COLUMNS}
+                FROM albums
+                ORDER BY year DESC, album
+                LIMIT ? OFFSET ?
+            """, (limit + 1, offset)).fetchall()
+    finally:
+        conn.close()
+
+    stats, stale = get_album_stats([row["id"] for row in rows[:limit]])
+    return {
+        "albums": [format_album(row, stats.get(row["id"])) for row in rows[:limit]],
+        "has_more": len(rows) > limit,
+        "stale": stale,
+    }
+
+def get_album_details(album_id):
+    """Get an album with its stats and tracklist ordered by disc and track."""
+    conn = connect_db()
+    try:
+        row = conn.execute(f"SELECT {ALBUM_COLUMNS} FROM albums WHERE id = ?", (album_id,)).fetchone()
+        if not row:
+            return None
+        tracks = conn.execute(f"""
+            SELECT {TRACK_COLUMNS}
+            FROM items
+            WHERE album_id = ?
+            ORDER BY disc, track, id
+        """, (album_id,)).fetchall()
+    finally:
+        conn.close()
+
+    tracks = [format_item(track) for track in tracks]
+    formats = sorted({track["format"] for track in tracks if track["format"]})
+    bitrates = [track["bitrate"] for track in tracks if track["bitrate"]]
+    album = format_album(row, (
+        len(tracks),
+        sum(track["length"] or 0 for track in tracks),
+        formats,
+        int(round(sum(bitrates) / len(bitrates))) if bitrates else None,
+        len({track["disc"] for track in tracks if track["disc"] is not None}),
+    ))
+    album["tracks"] = tracks
+    return album
@@ -1,12 +1,48 @@
 import os
 import logging
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+import multiprocessing
+import base64
+from flask import (
+    Flask, render_template, request, jsonify, session, redirect, url_for, send_file,
+    Response, stream_with_context
+)
 from beets_utils import (
-    get_library_items, get_item_details, execute_beets_command, 
-    get_album_art, import_music, get_item_count, search_library,
-    get_albums, get_artists, check_beets_config, 
+    get_library_items, get_library_page, get_item_details, get_items_batch,
+    search_library, MAX_PAGE_SIZE,
+    check_beets_config, 
     read_beets_config, update_beets_config, get_beets_plugins, get_beets_info,
-    reset_database, check_paths, initialize_database
+    reset_database, check_paths, initialize_database, get_db_pool_stats,
+    get_config_cache_stats, warm_beets_metadata, refresh_beets_metadata
+)
+from search_index import search_items, rebuild_search_index
+from artist_index import get_artist_page
+from albums import get_albums, get_album_details, warm_album_stats
+from export import export_items
+from library_stats import get_library_stats
+from beets_query import run_query
+from facets import browse_library, parse_facet_filters
+from art_cache import get_cached_album_art, get_art_cache_stats, prefetch_album_art
+from thumbnails import (
+    get_album_thumbnail, thumbnails_available, start_thumbnail_job, THUMBNAIL_SIZES,
+    pause_thumbnail_job, get_thumbnail_job_status
+)
+from command_stream import stream_beets_command, cancel_command, COMMAND_TIMEOUT
+from command_results import (
+    run_spooled_command, get_command_result, read_result_lines, delete_command_result
+)
+from beets_worker import get_worker_status
+from library_counts import get_library_counts, warm_library_counts
+from replica import get_library_changes
+from library_events import stream_library_events, claim_event_stream, release_event_stream
+from columnar import (
+    get_snapshot_page, get_snapshot_items, aggregate_library, parse_range_filters,
+    get_snapshot_stats, warm_library_snapshot
+)
+from response_cache import cached_json, skip_response_cache, get_response_cache_stats
+from import_jobs import (
+    enqueue_import, get_import_job, list_import_jobs, cancel_import_job,
+    retry_import_job, read_import_output, stream_import_events, start_import_dispatcher,
+    claim_import_stream, release_import_stream
 )
 
 # Set up logging
@@ -17,6 +53,23 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "default_beets_gui_secret")
 
+def init_app():
+    """Start the background work of a process that serves the app."""
+    # Pick up import jobs queued before the last restart
+    start_import_dispatcher()
+
+    # Ask beet for its version, plugins and config while the first page loads
+    warm_beets_metadata()
+    warm_library_counts()
+    warm_album_stats()
+    warm_library_snapshot()
+
+# The thumbnail job's spawned pool workers import __main__ again, which is
+# main.py (and so this module) under `python main.py`. They must not start a
+# dispatcher that could claim an import job and orphan it when the pool exits.
+if multiprocessing.parent_process() is None:
+    init_app()
+
 # Add configuration route
 @app.route('/config')
 def config_view():
@@ -53,60 +106,288 @@ def commands_view():
     return render_template('commands.html')
 
 @app.route('/api/library')
+@cached_json
 def api_library():
-    """Get library items with pagination."""
-    page = request.args.get('page', 1, type=int)
+    """Get library items with cursor pagination.
+
+    Pass ``cursor`` (from ``next_cursor``/``prev_cursor``) to move between pages.
+    ``sort`` takes comma separated fields, prefixed with ``-`` for descending.
+    The legacy ``page`` parameter still selects OFFSET paging.
+    """
+    page = request.args.get('page', type=int)
     limit = request.args.get('limit', 50, type=int)
     sort = request.args.get('sort', 'artist')
+    order = request.args.get('order', 'asc')
+    cursor = request.args.get('cursor')
     
     try:
-        items = get_library_items(page, limit, sort)
-        total = get_item_count()
+        if page is not None and not cursor:
+            # Offset paging, kept for backward compatibility
+            items = get_snapshot_items(page, limit, sort, order)
+            if items is None:
+                items = get_library_items(page, limit, sort, order)
+            counts = get_library_counts()
+            if counts['stale']:
+                skip_response_cache()
+            return jsonify({
+                'items': items,
+                'total': counts['items'],
+                'page': page,
+                'limit': limit
+            })
+        
+        # The in-memory snapshot answers when it is current, SQL otherwise
+        result = get_snapshot_page(limit, sort, cursor, order)
+        if result is None:
+            result = get_library_page(limit, sort, cursor, order)
+        counts = get_library_counts()
+        if counts['stale']:
+            skip_response_cache()
         return jsonify({
-            'items': items,
-            'total': total,
-            'page': page,
-            'limit': limit
+            'items': result['items'],
+            'total': counts['items'],
+            'limit': limit,
+            'sort': result['sort'],
+            'next_cursor': result['next_cursor'],
+            'prev_cursor': result['prev_cursor']
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error fetching library: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/library/events')
+def api_library_events():
+    """Stream library changes (imports, ``beet modify``, ``beet update``) as Server-Sent Events."""
+    # EventSource sends the id of the last event it saw when it reconnects
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('since'))
+    if not claim_event_stream():
+        # Each stream holds a worker thread; the page retries later with ?since=
+        return jsonify({'error': 'Too many library event streams open'}), 503, {'Retry-After': '60'}
+    response = Response(stream_with_context(stream_library_events(last_event_id)),
+                        mimetype='text/event-stream')
+    # Called once the response is done, even if the stream never started
+    response.call_on_close(release_event_stream)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/library/aggregate')
+@cached_json
+def api_library_aggregate():
+    """Count items and total length grouped by a field.
+
+    ``by`` names the field; numeric fields narrow the items with a range,
+    e.g. ``year=1990..1999`` or ``bitrate=320``.
+    """
+    by = request.args.get('by', 'year')
+    
+    try:
+        return jsonify(aggregate_library(by, parse_range_filters(request.args)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error aggregating library: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/library/snapshot')
+def api_library_snapshot():
+    """Get the state and memory footprint of the in-memory library snapshot."""
+    try:
+        return jsonify(get_snapshot_stats())
+    except Exception as e:
+        logger.error(f"Error getting library snapshot stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/library/changes')
+def api_library_changes():
+    """Get items added, modified or deleted since a sync token, in batches.
+
+    Without ``since`` the batches page through the whole library. Clients
+    keep the returned ``token`` for the next call and start over when
+    ``reset`` is true.
+    """
+    since = request.args.get('since')
+    limit = request.args.get('limit', 5000, type=int)
+    
+    try:
+        result = get_library_changes(since, limit)
+        if result is None:
+            return jsonify({'error': 'The library replica is not ready yet'}), 503
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error fetching library changes: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/browse')
+@cached_json
+def api_browse():
+    """Get a page of items narrowed by facet filters, with live facet counts.
+
+    Facets are ``format``, ``bitrate`` (kbps bucket), ``samplerate``, ``year``,
+    ``genre`` and ``label``; each may be repeated. ``year_min``/``year_max``
+    select a range of years.
+    """
+    page = request.args.get('page', 1, type=int)
+    limit = request.args.get('limit', 50, type=int)
+    sort = request.args.get('sort', 'artist,album,disc,track')
+    
+    try:
+        filters = parse_facet_filters(request.args)
+        result = browse_library(filters, page, limit, sort)
+        if result['building'] or result['stale']:
+            skip_response_cache()
+        return jsonify({**result, 'page': page, 'limit': limit})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error browsing library: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/search')
+@cached_json
 def api_search():
-    """Search the library with a query."""
+    """Search the library with a query, best matches first."""
     query = request.args.get('query', '')
+    page = request.args.get('page', 1, type=int)
+    limit = request.args.get('limit', 50, type=int)
     
     try:
-        results = search_library(query)
-        return jsonify({'results': results})
+        result = search_items(query, page, limit) if query.strip() else None
+        if result is None:
+            # Full-text index is still being built, fall back to a table scan
+            result = search_library(query, page, limit)
+            skip_response_cache()
+        elif result['stale']:
+            # The index has not caught up with the library yet
+            skip_response_cache()
+        return jsonify({
+            'results': result['results'],
+            'has_more': result['has_more'],
+            'page': page,
+            'limit': limit
+        })
     except Exception as e:
         logger.error(f"Error searching library: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/query')
+@cached_json
+def api_query():
+    """Run a beets query, e.g. ``artist:X year:1990..1999 format:FLAC year-``.
+
+    Pass ``album=1`` to query albums instead of items. Queries the SQL
+    compiler does not understand are run with ``beet ls``.
+    """
+    query = request.args.get('q', '')
+    albums = request.args.get('album', '0').lower() in ('1', 'true', 'yes')
+    page = request.args.get('page', 1, type=int)
+    limit = request.args.get('limit', 50, type=int)
+    
+    try:
+        result = run_query(query, albums, page, limit)
+        if result['stale']:
+            skip_response_cache()
+        return jsonify({**result, 'page': page, 'limit': limit})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error running query: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/search/rebuild', methods=['POST'])
+def api_rebuild_search_index():
+    """Rebuild the full-text search index from scratch."""
+    try:
+        result = rebuild_search_index()
+        return jsonify({'success': True, **result})
+    except Exception as e:
+        logger.error(f"Error rebuilding search index: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/counts')
+@cached_json
+def api_counts():
+    """Get the number of items, albums and artists, and items per format."""
+    try:
+        counts = get_library_counts()
+        if counts['stale']:
+            skip_response_cache()
+        return jsonify(counts)
+    except Exception as e:
+        logger.error(f"Error counting library: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/stats')
+@cached_json
+def api_stats():
+    """Get library totals and format, bitrate, sample rate, year and added-per-month distributions."""
+    try:
+        stats = get_library_stats()
+        if stats['building'] or stats['stale']:
+            skip_response_cache()
+        return jsonify(stats)
+    except Exception as e:
+        logger.error(f"Error fetching library stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/artists')
+@cached_json
 def api_artists():
-    """Get all artists in the library."""
+    """Get a page of artists with track/album counts and the letter index.
+
+    ``prefix`` filters on the start of the artist or sort name, ``letter``
+    selects one entry of the letter index (A-Z or #).
+    """
+    prefix = request.args.get('prefix', '').strip()
+    letter = request.args.get('letter', '').strip()
+    page = request.args.get('page', 1, type=int)
+    limit = request.args.get('limit', 100, type=int)
+    
     try:
-        artists = get_artists()
-        return jsonify({'artists': artists})
+        result = get_artist_page(prefix or None, letter or None, page, limit)
+        if result['stale']:
+            skip_response_cache()
+        return jsonify({**result, 'page': page, 'limit': limit})
     except Exception as e:
         logger.error(f"Error fetching artists: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/albums')
+@cached_json
 def api_albums():
-    """Get all albums in the library."""
+    """Get a page of albums with track count, length, formats and bitrate."""
     artist = request.args.get('artist', '')
+    page = request.args.get('page', 1, type=int)
+    limit = request.args.get('limit', 100, type=int)
     
     try:
-        albums = get_albums(artist)
-        return jsonify({'albums': albums})
+        result = get_albums(artist, page, limit)
+        if result['stale']:
+            skip_response_cache()
+        return jsonify({**result, 'page': page, 'limit': limit})
     except Exception as e:
         logger.error(f"Error fetching albums: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/album/<int:album_id>')
+@cached_json
+def api_album_details(album_id):
+    """Get an album with its tracklist ordered by disc and track number."""
+    try:
+        album = get_album_details(album_id)
+        if album is None:
+            return jsonify({'error': 'Album not found'}), 404
+        return jsonify(album)
+    except Exception as e:
+        logger.error(f"Error fetching album details: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/item/<int:item_id>')
+@cached_json
 def api_item_details(item_id):
     """Get detailed information for a specific item."""
     try:
@@ -116,19 +397,221 @@ def api_item_details(item_id):
         logger.error(f"Error fetching item details: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/items/batch', methods=['POST'])
+def api_items_batch():
+    """Get the details of many items at once.
+
+    Send ``ids`` (a list of item ids) or a search ``query`` with an optional
+    ``limit``, and optionally ``fields`` to return only those fields.
+    """
+    data = request.get_json(silent=True) or {}
+    fields = data.get('fields')
+    
+    try:
+        if fields is not None and not isinstance(fields, list):
+            raise ValueError("fields must be a list of field names")
+        if data.get('query'):
+            query = data['query']
+            limit = int(data.get('limit', MAX_PAGE_SIZE))
+            result = search_items(query, 1, limit)
+            if result is None:
+                result = search_library(query, 1, limit)
+            ids = [item['id'] for item in result['results']]
+        elif isinstance(data.get('ids'), list):
+            ids = data['ids']
+        else:
+            raise ValueError("Either ids or query is required")
+        return jsonify(get_items_batch(ids, fields))
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error fetching items: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/export')
+def api_export():
+    """Stream the whole library, or the items matching filters, as a file.
+
+    ``format`` is ``ndjson`` (default) or ``csv``, ``fields`` a comma separated
+    list of columns, ``where`` (repeatable) a filter like ``year>=2000`` or
+    ``genre~rock``, and ``gzip=1`` compresses the download.
+    """
+    fmt = request.args.get('format', 'ndjson')
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    filters = request.args.getlist('where')
+    compress = request.args.get('gzip', '0').lower() in ('1', 'true', 'yes')
+    
+    try:
+        mimetype, filename, chunks = export_items(fmt, fields, filters, compress)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error exporting library: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
+    response = Response(chunks, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Cached art is addressed by its key, so versioned URLs never change content
+ART_MAX_AGE = 365 * 24 * 3600
+
 @app.route('/api/albumart/<int:item_id>')
 def api_album_art(item_id):
-    """Get album art for a specific item."""
+    """Get album art for a specific item as base64 JSON (legacy, prefer /api/art/)."""
     try:
-        art_data = get_album_art(item_id)
+        entry = get_cached_album_art(item_id=item_id)
+        art_data = None
+        if entry:
+            with open(entry['path'], 'rb') as f:
+                art_data = base64.b64encode(f.read()).decode('utf-8')
         return jsonify({'albumArt': art_data})
     except Exception as e:
         logger.error(f"Error fetching album art: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def send_album_art(entry):
+    """Send a cached art image with an ETag, honouring If-None-Match."""
+    response = send_file(entry['path'], mimetype=entry['mimetype'], etag=entry['key'], conditional=True)
+    if request.args.get('v') == entry['key']:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = ART_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        # Unversioned URLs must revalidate, the art may change
+        response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/art/album/<int:album_id>')
+def api_album_art_image(album_id):
+    """Get the raw album art image for an album.
+
+    Add ``?v=<key>`` (as returned in redirects from /api/art/item/) to get an
+    immutable, long-lived cacheable response.
+    """
+    try:
+        entry = get_cached_album_art(album_id=album_id)
+        if not entry:
+            return jsonify({'error': 'No album art found'}), 404
+        return send_album_art(entry)
+    except Exception as e:
+        logger.error(f"Error fetching album art: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/art/item/<int:item_id>')
+def api_item_art_image(item_id):
+    """Get the album art image for an item, redirecting to its album's art URL."""
+    try:
+        entry = get_cached_album_art(item_id=item_id)
+        if not entry:
+            return jsonify({'error': 'No album art found'}), 404
+        if entry['album_id'] is None:
+            return send_album_art(entry)
+        return redirect(url_for('api_album_art_image', album_id=entry['album_id'], v=entry['key']))
+    except Exception as e:
+        logger.error(f"Error fetching album art: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/art/album/<int:album_id>/thumb/<int:size>')
+def api_album_thumbnail(album_id, size):
+    """Get a resized thumbnail of an album's art."""
+    try:
+        entry = get_album_thumbnail(album_id, size)
+        if not entry:
+            return jsonify({'error': 'No album art found'}), 404
+        return send_album_art(entry)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except RuntimeError as e:
+        # Pillow is not installed
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error fetching album thumbnail: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/art/prefetch', methods=['POST'])
+def api_prefetch_album_art():
+    """Warm the art cache for a page of albums and return their art URLs.
+
+    With ``size`` the URLs point at thumbnails of that size instead of the
+    full images.
+    """
+    data = request.get_json() or {}
+    album_ids = data.get('album_ids', [])
+    size = data.get('size')
+    
+    if not isinstance(album_ids, list) or len(album_ids) > 500:
+        return jsonify({'error': 'album_ids must be a list of at most 500 ids'}), 400
+    if size is not None and size not in THUMBNAIL_SIZES:
+        return jsonify({'error': f'size must be one of {list(THUMBNAIL_SIZES)}'}), 400
+    
+    try:
+        keys = prefetch_album_art([int(album_id) for album_id in album_ids])
+        if size and not thumbnails_available():
+            # Never hand out full-size images where a thumbnail was asked for
+            keys = {album_id: None for album_id in keys}
+        art = {}
+        for album_id, key in keys.items():
+            if not key:
+                art[str(album_id)] = None
+            elif size:
+                art[str(album_id)] = url_for('api_album_thumbnail', album_id=album_id, size=size, v=key)
+            else:
+                art[str(album_id)] = url_for('api_album_art_image', album_id=album_id, v=key)
+        return jsonify({'art': art})
+    except (TypeError, ValueError):
+        return jsonify({'error': 'album_ids must be integers'}), 400
+    except Exception as e:
+        logger.error(f"Error prefetching album art: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/thumbnails/status', methods=['GET'])
+def api_thumbnail_status():
+    """Get the progress of the thumbnail generation job."""
+    try:
+        return jsonify(get_thumbnail_job_status())
+    except Exception as e:
+        logger.error(f"Error getting thumbnail job status: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/thumbnails/start', methods=['POST'])
+def api_start_thumbnails():
+    """Start or resume generating thumbnails for all albums."""
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        return jsonify(start_thumbnail_job(restart=bool(data.get('restart'))))
+    except RuntimeError as e:
+        # Pillow is not installed, no job is started
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error starting thumbnail job: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/thumbnails/pause', methods=['POST'])
+def api_pause_thumbnails():
+    """Pause the thumbnail job; it can be resumed later."""
+    try:
+        return jsonify(pause_thumbnail_job())
+    except Exception as e:
+        logger.error(f"Error pausing thumbnail job: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/art/stats')
+def api_art_cache_stats():
+    """Get statistics about the album art cache."""
+    try:
+        return jsonify(get_art_cache_stats())
+    except Exception as e:
+        logger.error(f"Error getting art cache stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/command', methods=['POST'])
 def api_command():
-    """Execute a beets command."""
+    """Execute a beets command, spooling its output to disk."""
     data = request.get_json()
     command = data.get('command', '')
     
@@ -136,15 +619,82 @@ def api_command():
         return jsonify({'error': 'No command provided'}), 400
     
     try:
-        result = execute_beets_command(command)
+        result = run_spooled_command(command)
         return jsonify({'result': result})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error executing command: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/command/results/<result_id>', methods=['GET'])
+def api_command_result(result_id):
+    """Get the line counts and return code of a spooled command result."""
+    result = get_command_result(result_id)
+    if result is None:
+        return jsonify({'error': 'Command result not found'}), 404
+    return jsonify({'result': result})
+
+@app.route('/api/command/results/<result_id>/lines', methods=['GET'])
+def api_command_result_lines(result_id):
+    """Get a range of lines from a spooled command result."""
+    try:
+        stream = request.args.get('stream', 'stdout')
+        start = request.args.get('start', 0, type=int)
+        count = request.args.get('count', 1000, type=int)
+        page = read_result_lines(result_id, stream, start, count)
+        if page is None:
+            return jsonify({'error': 'Command result not found'}), 404
+        return jsonify(page)
+    except Exception as e:
+        logger.error(f"Error reading command result: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/command/results/<result_id>', methods=['DELETE'])
+def api_delete_command_result(result_id):
+    """Delete a spooled command result."""
+    if not delete_command_result(result_id):
+        return jsonify({'error': 'Command result not found'}), 404
+    return jsonify({'success': True})
+
+@app.route('/api/command/stream', methods=['POST'])
+def api_command_stream():
+    """Execute a beets command, streaming its output as it is produced."""
+    data = request.get_json()
+    command = data.get('command', '')
+    
+    if not command:
+        return jsonify({'error': 'No command provided'}), 400
+    
+    try:
+        timeout = data.get('timeout')
+        timeout = min(int(timeout), COMMAND_TIMEOUT) if timeout else None
+        frames = stream_beets_command(command, timeout)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error executing command: {str(e)}")
         return jsonify({'error': str(e)}), 500
+    
+    response = Response(frames, mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/command/<run_id>/cancel', methods=['POST'])
+def api_cancel_command(run_id):
+    """Cancel a streamed beets command."""
+    try:
+        if not cancel_command(run_id):
+            return jsonify({'error': 'Command is not running'}), 404
+        return jsonify({'success': True})
+    except Exception as e:
+        logger.error(f"Error cancelling command: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/import', methods=['POST'])
 def api_import():
-    """Import music files."""
+    """Queue an import job."""
     data = request.get_json()
     path = data.get('path', '')
     
@@ -152,12 +702,93 @@ def api_import():
         return jsonify({'error': 'No path provided'}), 400
     
     try:
-        result = import_music(path)
-        return jsonify({'result': result})
+        job = enqueue_import(path, autotag=data.get('autotag', True))
+        return jsonify({'job': job}), 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error queueing import: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/import/jobs', methods=['GET'])
+def api_import_jobs():
+    """List recent import jobs."""
+    try:
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        return jsonify({'jobs': list_import_jobs(limit)})
+    except Exception as e:
+        logger.error(f"Error listing import jobs: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/import/jobs/<int:job_id>', methods=['GET'])
+def api_import_job(job_id):
+    """Get the status and progress of an import job."""
+    try:
+        job = get_import_job(job_id)
+        if job is None:
+            return jsonify({'error': 'Import job not found'}), 404
+        return jsonify({'job': job})
+    except Exception as e:
+        logger.error(f"Error getting import job: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/import/jobs/<int:job_id>/cancel', methods=['POST'])
+def api_cancel_import_job(job_id):
+    """Cancel a queued or running import job."""
+    try:
+        job = cancel_import_job(job_id)
+        if job is None:
+            return jsonify({'error': 'Import job not found'}), 404
+        return jsonify({'job': job})
+    except Exception as e:
+        logger.error(f"Error cancelling import job: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/import/jobs/<int:job_id>/retry', methods=['POST'])
+def api_retry_import_job(job_id):
+    """Queue a finished import job again."""
+    try:
+        job = retry_import_job(job_id)
+        if job is None:
+            return jsonify({'error': 'Import job not found'}), 404
+        return jsonify({'job': job}), 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Error importing music: {str(e)}")
+        logger.error(f"Error retrying import job: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/import/jobs/<int:job_id>/log', methods=['GET'])
+def api_import_job_log(job_id):
+    """Read an import job's output from a byte offset."""
+    try:
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        text, next_offset = read_import_output(job_id, offset)
+        return jsonify({'text': text, 'offset': next_offset})
+    except Exception as e:
+        logger.error(f"Error reading import log: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/import/jobs/<int:job_id>/events', methods=['GET'])
+def api_import_job_events(job_id):
+    """Stream an import job's output and progress as Server-Sent Events."""
+    # EventSource sends the id of the last event it saw when it reconnects
+    offset = request.headers.get('Last-Event-ID', request.args.get('offset', '0'))
+    try:
+        offset = max(int(offset), 0)
+    except ValueError:
+        offset = 0
+    if not claim_import_stream():
+        # Each stream holds a worker thread; the page retries later with ?offset=
+        return jsonify({'error': 'Too many import event streams open'}), 503, {'Retry-After': '10'}
+    response = Response(stream_with_context(stream_import_events(job_id, offset)),
+                        mimetype='text/event-stream')
+    # Called once the response is done, even if the stream never started
+    response.call_on_close(release_import_stream)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # Add new endpoints for beets configuration management
 @app.route('/api/beets/config', methods=['GET'])
 def api_get_beets_config():
@@ -205,6 +836,15 @@ def api_get_beets_info():
         return jsonify({'error': str(e)}), 500
 
 # Add new endpoints for database reset and path checking
+@app.route('/api/beets/refresh_info', methods=['POST'])
+def api_refresh_beets_info():
+    """Reload the cached beets version, plugin list and config."""
+    try:
+        return jsonify(refresh_beets_metadata())
+    except Exception as e:
+        logger.error(f"Error refreshing beets info: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/beets/reset', methods=['POST'])
 def api_reset_database():
     """Reset the beets database."""
@@ -235,5 +875,41 @@ def api_initialize_database():
         logger.error(f"Error initializing database: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/beets/db_pool', methods=['GET'])
+def api_db_pool_stats():
+    """Get statistics about the pooled database connections."""
+    try:
+        return jsonify(get_db_pool_stats())
+    except Exception as e:
+        logger.error(f"Error getting database pool stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/beets/worker', methods=['GET'])
+def api_beets_worker_status():
+    """Get the status of the warm beets worker."""
+    try:
+        return jsonify(get_worker_status())
+    except Exception as e:
+        logger.error(f"Error getting beets worker status: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/response_cache', methods=['GET'])
+def api_response_cache_stats():
+    """Get statistics about the API response cache."""
+    try:
+        return jsonify(get_response_cache_stats())
+    except Exception as e:
+        logger.error(f"Error getting response cache stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/beets/config_cache', methods=['GET'])
+def api_config_cache_stats():
+    """Get hit/miss statistics of the beets config cache."""
+    try:
+        return jsonify(get_config_cache_stats())
+    except Exception as e:
+        logger.error(f"Error getting config cache stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,412 @@
+import os
+import time
+import base64
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from beets_utils import connect_db, beet_album_art_query, fetch_album_art_with_beet
+from sidecar import get_cache_dir
+
+try:
+    # mutagen comes with beets; without it only artpath and the beet fallback work
+    import mutagen
+    from mutagen.flac import Picture
+except ImportError:
+    mutagen = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Upper bound for the on-disk art cache; least recently used images go first
+ART_CACHE_MAX_BYTES = int(os.environ.get("ART_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+# How long an album without art is remembered before we look again
+ART_MISS_TTL = int(os.environ.get("ART_MISS_TTL", "3600"))
+
+# Only touch an entry's mtime for LRU bookkeeping this often
+_TOUCH_INTERVAL = 60
+
+# Threads extracting art for cache misses, and how long a request waits for one
+ART_WORKERS = int(os.environ.get("ART_WORKERS", "4"))
+ART_EXTRACT_TIMEOUT = float(os.environ.get("ART_EXTRACT_TIMEOUT", "30"))
+
+# ID3/FLAC picture type of the front cover
+FRONT_COVER = 3
+
+_IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+]
+
+_MIMETYPES = {
+    "jpg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+    "webp": "image/webp",
+    "bin": "application/octet-stream",
+}
+
+_evict_lock = threading.Lock()
+_cache_size = None
+_counters = {
+    "hits": 0, "misses": 0, "stored": 0, "evicted": 0, "negative_hits": 0,
+    "from_artpath": 0, "from_embedded": 0, "from_beet": 0,
+}
+
+_executor_lock = threading.Lock()
+_executor = None
+_inflight = {}
+
+def get_art_cache_dir():
+    """Get the directory holding cached album art."""
+    art_dir = get_cache_dir() / "art"
+    art_dir.mkdir(parents=True, exist_ok=True)
+    return art_dir
+
+def sniff_image_type(data):
+    """Guess the MIME type and file extension of raw image bytes."""
+    extension = "bin"
+    for signature, candidate in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            extension = candidate
+            break
+    else:
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            extension = "webp"
+    return _MIMETYPES[extension], extension
+
+def _decode_path(path):
+    if isinstance(path, bytes):
+        return os.fsdecode(path)
+    return path
+
+def get_art_source(album_id=None, item_id=None):
+    """Look up where the art for an album (or a single item) comes from.
+
+    Returns a dictionary with the album's artpath and the path of its first
+    track, or None if neither the album nor the item exist. Items that do not
+    belong to an album are treated as an album of their own.
+    """
+    conn = connect_db()
+    try:
+        if item_id is not None:
+            row = conn.execute("SELECT album_id FROM items WHERE id = ?", (item_id,)).fetchone()
+            if not row:
+                return None
+            album_id = row["album_id"]
+            if album_id is None:
+                item = conn.execute("""
+                    SELECT id, path, album, albumartist, artist
+                    FROM items WHERE id = ?
+                """, (item_id,)).fetchone()
+                return {
+                    "owner": f"item-{item['id']}",
+                    "album_id": None,
+                    "artpath": None,
+                    "item_path": _decode_path(item["path"]),
+                    "query": beet_album_art_query(item["album"], item["albumartist"], item["artist"]) if item["album"] else None,
+                }
+
+        album = conn.execute("SELECT id, artpath, album, albumartist FROM albums WHERE id = ?", (album_id,)).fetchone()
+        first_item = conn.execute("""
+            SELECT path, artist
+            FROM items
+            WHERE album_id = ?
+            ORDER BY disc, track, id
+            LIMIT 1
+        """, (album_id,)).fetchone()
+        if not album and not first_item:
+            return None
+        return {
+            "owner": f"album-{album_id}",
+            "album_id": album_id,
+            "artpath": _decode_path(album["artpath"]) if album and album["artpath"] else None,
+            "item_path": _decode_path(first_item["path"]) if first_item else None,
+            "query": beet_album_art_query(album["album"], album["albumartist"]) if album and album["album"] else None,
+        }
+    finally:
+        conn.close()
+
+def art_cache_key(source):
+    """Build the cache key for an art source.
+
+    The key covers the album id and the path and mtime of the file the art is
+    read from (artpath, or the first track for embedded art), so replacing the
+    art yields a new key and stale entries simply age out.
+    """
+    version = "none"
+    for path in (source["artpath"], source["item_path"]):
+        if path:
+            try:
+                stat = os.stat(path)
+                version = f"{path}:{stat.st_mtime_ns}:{stat.st_size}"
+                break
+            except OSError:
+                continue
+    digest = hashlib.sha256(f"{source['owner']}|{version}".encode("utf-8", "surrogateescape"))
+    return digest.hexdigest()[:32]
+
+def read_artpath(path):
+    """Read an album's art file, returning None if it is missing."""
+    try:
+        with open(path, "rb") as f:
+            return f.read() or None
+    except OSError as e:
+        logger.debug(f"Could not read artpath {path}: {e}")
+        return None
+
+def _pick_picture(pictures):
+    """Prefer the front cover among embedded pictures, else take the first one."""
+    pictures = [picture for picture in pictures if getattr(picture, "data", None)]
+    for picture in pictures:
+        if getattr(picture, "type", None) == FRONT_COVER:
+            return picture.data
+    return pictures[0].data if pictures else None
+
+def extract_embedded_art(path):
+    """Read embedded cover art from an audio file with mutagen.
+
+    Handles ID3 (APIC), FLAC pictures, MP4 ``covr`` atoms and Vorbis/Opus
+    ``metadata_block_picture`` comments. Returns None if there is none.
+    """
+    if mutagen is None:
+        return None
+    try:
+        audio = mutagen.File(path)
+    except Exception as e:
+        logger.debug(f"Could not read tags from {path}: {e}")
+        return None
+    if audio is None:
+        return None
+
+    # FLAC keeps pictures in their own metadata blocks
+    pictures = getattr(audio, "pictures", None)
+    if pictures:
+        return _pick_picture(pictures)
+
+    tags = audio.tags
+    if not tags:
+        return None
+    if hasattr(tags, "getall"):
+        # ID3 (MP3, AIFF, ...)
+        return _pick_picture(tags.getall("APIC"))
+    if "covr" in tags:
+        # MP4/M4A
+        covers = tags["covr"]
+        return bytes(covers[0]) if covers else None
+    if "metadata_block_picture" in tags:
+        # Ogg Vorbis/Opus store base64 encoded FLAC picture blocks
+        decoded = []
+        for value in tags["metadata_block_picture"]:
+            try:
+                decoded.append(Picture(base64.b64decode(value)))
+            except Exception:
+                continue
+        return _pick_picture(decoded)
+    return None
+
+def load_art_bytes(source, use_beet=True):
+    """Fetch the art image for a source without consulting the cache.
+
+    Reads the album's artpath first, then art embedded in its first track, and
+    only runs ``beet albumart`` if neither has any (and ``use_beet`` is set).
+    """
+    if source.get("artpath"):
+        data = read_artpath(source["artpath"])
+        if data:
+            _counters["from_artpath"] += 1
+            return data
+    if source.get("item_path"):
+        data = extract_embedded_art(source["item_path"])
+        if data:
+            _counters["from_embedded"] += 1
+            return data
+    if not use_beet or not source.get("query"):
+        return None
+    data = fetch_album_art_with_beet(source["query"])
+    if data:
+        _counters["from_beet"] += 1
+    return data
+
+def _find_entry(key):
+    art_dir = get_art_cache_dir()
+    for extension, mimetype in _MIMETYPES.items():
+        path = art_dir / f"{key}.{extension}"
+        if path.exists():
+            return path, mimetype
+    return None, None
+
+def _touch(path):
+    """Mark a cache entry as recently used."""
+    try:
+        if time.time() - path.stat().st_mtime > _TOUCH_INTERVAL:
+            os.utime(path)
+    except OSError:
+        pass
+
+def _store(key, data):
+    global _cache_size
+    mimetype, extension = sniff_image_type(data)
+    path = get_art_cache_dir() / f"{key}.{extension}"
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    _counters["stored"] += 1
+    with _evict_lock:
+        if _cache_size is not None:
+            _cache_size += len(data)
+        if _cache_size is None or _cache_size > ART_CACHE_MAX_BYTES:
+            _evict_locked()
+    return path, mimetype
+
+def _evict_locked():
+    """Delete least recently used entries until the cache fits its budget."""
+    global _cache_size
+    entries = []
+    total = 0
+    for entry in os.scandir(get_art_cache_dir()):
+        if not entry.is_file() or entry.name.startswith("."):
+            continue
+        stat = entry.stat()
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+
+    if total > ART_CACHE_MAX_BYTES:
+        # Leave some headroom so we don't evict on every store
+        target = ART_CACHE_MAX_BYTES * 0.9
+        entries.sort()
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                _counters["evicted"] += 1
+            except OSError:
+                pass
+    _cache_size = total
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ART_WORKERS, thread_name_prefix="art")
+        return _executor
+
+def _fill_cache(key, source):
+    """Load art for a cache miss and store it, remembering albums without art."""
+    miss_marker = get_art_cache_dir() / f"{key}.none"
+    data = load_art_bytes(source)
+    if not data:
+        miss_marker.touch()
+        return None
+    return _store(key, data)
+
+def _lookup(key):
+    """Check the cache for a key; returns (entry, known_missing)."""
+    path, mimetype = _find_entry(key)
+    if path is not None:
+        _counters["hits"] += 1
+        _touch(path)
+        return (path, mimetype), False
+
+    miss_marker = get_art_cache_dir() / f"{key}.none"
+    try:
+        if time.time() - miss_marker.stat().st_mtime < ART_MISS_TTL:
+            _counters["negative_hits"] += 1
+            return None, True
+    except FileNotFoundError:
+        pass
+    return None, False
+
+def _submit(key, source):
+    """Schedule a cache fill on the art thread pool, sharing in-flight work.
+
+    Concurrent requests for the same album wait on one extraction instead of
+    each reading the audio file.
+    """
+    executor = _get_executor()
+    with _executor_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future
+        _counters["misses"] += 1
+        future = executor.submit(_fill_cache, key, source)
+        _inflight[key] = future
+    future.add_done_callback(lambda _: _forget(key))
+    return future
+
+def _forget(key):
+    with _executor_lock:
+        _inflight.pop(key, None)
+
+def _entry(key, found, source):
+    if found is None:
+        return None
+    path, mimetype = found
+    return {"key": key, "path": path, "mimetype": mimetype, "album_id": source["album_id"]}
+
+def get_cached_album_art(album_id=None, item_id=None):
+    """Get album art through the on-disk cache.
+
+    Returns a dictionary with the cache ``key`` (usable as an ETag), the
+    ``path`` of the cached image and its ``mimetype``, or None if the album
+    has no art.
+    """
+    source = get_art_source(album_id=album_id, item_id=item_id)
+    if source is None:
+        return None
+    key = art_cache_key(source)
+
+    found, known_missing = _lookup(key)
+    if found is None and not known_missing:
+        found = _submit(key, source).result(timeout=ART_EXTRACT_TIMEOUT)
+    return _entry(key, found, source)
+
+def prefetch_album_art(album_ids):
+    """Warm the cache for several albums at once.
+
+    Cache misses are extracted concurrently on the art thread pool. Returns a
+    dictionary mapping each album id to its cache key, or None if it has no art.
+    """
+    keys = {}
+    pending = {}
+    for album_id in album_ids:
+        source = get_art_source(album_id=album_id)
+        if source is None:
+            keys[album_id] = None
+            continue
+        key = art_cache_key(source)
+        found, known_missing = _lookup(key)
+        if found is not None:
+            keys[album_id] = key
+        elif known_missing:
+            keys[album_id] = None
+        else:
+            pending[album_id] = (key, _submit(key, source))
+
+    wait([future for _, future in pending.values()], timeout=ART_EXTRACT_TIMEOUT)
+    for album_id, (key, future) in pending.items():
+        found = future.result() if future.done() and not future.exception() else None
+        keys[album_id] = key if found else None
+    return keys
+
+def get_art_cache_stats():
+    """Get statistics about the album art cache."""
+    with _evict_lock:
+        if _cache_size is None:
+            _evict_locked()
+        size = _cache_size
+    return {
+        "path": str(get_art_cache_dir()),
+        "size_bytes": size,
+        "max_bytes": ART_CACHE_MAX_BYTES,
+        "workers": ART_WORKERS,
+        "in_flight": len(_inflight),
+        "mutagen_available": mutagen is not None,
+        **_counters,
+    }
@@ -0,0 +1,202 @@
+import os
+import time
+import logging
+import threading
+import unicodedata
+from beets_utils import connect_db, MAX_PAGE_SIZE
+from sidecar import (
+    connect_sidecar, connect_sidecar_read, set_sync_state,
+    get_read_signature, collect_item_changes, SidecarSync
+)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between two incremental syncs triggered by requests
+ARTIST_SYNC_INTERVAL = float(os.environ.get("ARTIST_SYNC_INTERVAL", "2"))
+
+ARTIST_COLUMNS = "artist, sort_name, letter, track_count, album_count, total_length"
+
+_sync_lock = threading.Lock()
+
+def artist_letter(name):
+    """Get the letter an artist is filed under: A-Z, or # for anything else."""
+    if not name:
+        return "#"
+    first = unicodedata.normalize("NFKD", name.strip()[:1])[:1].upper()
+    return first if "A" <= first <= "Z" else "#"
+
+def _create_schema(conn):
+    # What the summary was built from, so changed items can be subtracted again
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS artist_items (
+            id INTEGER PRIMARY KEY,
+            mtime REAL,
+            artist TEXT,
+            artist_sort TEXT,
+            album_id INTEGER,
+            length REAL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS artist_items_artist ON artist_items (artist)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS artist_summary (
+            artist TEXT PRIMARY KEY,
+            sort_name TEXT NOT NULL,
+            letter TEXT NOT NULL,
+            track_count INTEGER NOT NULL,
+            album_count INTEGER NOT NULL,
+            total_length REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS artist_summary_sort ON artist_summary (sort_name COLLATE NOCASE, artist)")
+    conn.execute("CREATE INDEX IF NOT EXISTS artist_summary_letter ON artist_summary (letter, sort_name COLLATE NOCASE, artist)")
+
+def sync_artist_index():
+    """Bring the artist summary up to date with the beets items table.
+
+    Only artists of items added, modified or deleted since the last sync are
+    aggregated again. Returns a summary of what was updated.
+    """
+    with _sync_lock:
+        signature = get_read_signature()
+        started = time.time()
+        conn = connect_sidecar(attach_library=True)
+        conn.create_function("artist_letter", 1, artist_letter, deterministic=True)
+        try:
+            _create_schema(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                changed, deleted = collect_item_changes(conn, "artist_items")
+                artists = 0
+                if changed or deleted:
+                    # Artists the changed items belonged to before and after
+                    conn.execute("DROP TABLE IF EXISTS temp.affected_artists")
+                    conn.execute("""
+                        CREATE TEMP TABLE affected_artists AS
+                        SELECT artist FROM main.artist_items
+                        WHERE id IN (SELECT id FROM temp.changed_items UNION ALL SELECT id FROM temp.deleted_items)
+                        UNION
+                        SELECT i.artist FROM lib.items i JOIN temp.changed_items c ON c.id = i.id
+                    """)
+                    conn.execute("DELETE FROM artist_items WHERE id IN (SELECT id FROM temp.deleted_items)")
+                    conn.execute("""
+                        INSERT OR REPLACE INTO artist_items (id, mtime, artist, artist_sort, album_id, length)
+                        SELECT i.id, i.mtime, i.artist, i.artist_sort, i.album_id, i.length
+                        FROM lib.items i
+                        JOIN temp.changed_items c ON c.id = i.id
+                    """)
+                    conn.execute("DELETE FROM artist_summary WHERE artist IN (SELECT artist FROM temp.affected_artists)")
+                    conn.execute("""
+                        INSERT INTO artist_summary (artist, sort_name, letter, track_count, album_count, total_length)
+                        SELECT artist, sort_name, artist_letter(sort_name), track_count, album_count, total_length
+                        FROM (
+                            SELECT artist,
+                                   COALESCE(MAX(NULLIF(artist_sort, '')), artist) AS sort_name,
+                                   COUNT(*) AS track_count,
+                                   COUNT(DISTINCT album_id) AS album_count,
+                                   TOTAL(length) AS total_length
+                            FROM artist_items
+                            WHERE artist IN (SELECT artist FROM temp.affected_artists) AND artist != ''
+                            GROUP BY artist
+                        )
+                    """)
+                    artists = conn.execute("SELECT COUNT(*) FROM temp.affected_artists").fetchone()[0]
+                    conn.execute("DROP TABLE temp.affected_artists")
+                conn.execute("DROP TABLE IF EXISTS temp.changed_items")
+                conn.execute("DROP TABLE IF EXISTS temp.deleted_items")
+                set_sync_state(conn, "artist_index_built", int(time.time()))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+        _syncer.mark_synced(signature)
+        elapsed = time.time() - started
+        if changed or deleted:
+            logger.info(f"Artist index synced: {artists} artists updated in {elapsed:.2f}s")
+        return {"artists": artists, "elapsed": round(elapsed, 3)}
+
+_syncer = SidecarSync("artist index", sync_artist_index, "artist_index_built", ARTIST_SYNC_INTERVAL)
+
+def ensure_artist_index():
+    """Make sure the artist summary is usable, syncing it in the background if the library changed.
+
+    Returns False while the initial build is still running.
+    """
+    return _syncer.ensure()
+
+# Same rows as artist_summary, aggregated straight from the library
+_FALLBACK_QUERY = """
+    SELECT artist, sort_name, artist_letter(sort_name) AS letter, track_count, album_count, total_length
+    FROM (
+        SELECT artist,
+               COALESCE(MAX(NULLIF(artist_sort, '')), artist) AS sort_name,
+               COUNT(*) AS track_count,
+               COUNT(DISTINCT album_id) AS album_count,
+               TOTAL(length) AS total_length
+        FROM items
+        WHERE artist != ''
+        GROUP BY artist
+    )
+"""
+
+def _query_artists(conn, table, prefix, letter, limit, offset):
+    conditions, params = [], []
+    if prefix:
+        # Prefix match on either the display or the sort name
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        conditions.append("(artist LIKE ? ESCAPE '\\' OR sort_name LIKE ? ESCAPE '\\')")
+        params += [escaped + "%", escaped + "%"]
+    if letter:
+        conditions.append("letter = ?")
+        params.append(letter)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = conn.execute(f"""
+        SELECT {ARTIST_COLUMNS}
+        FROM {table}
+        {where}
+        ORDER BY sort_name COLLATE NOCASE, artist
+        LIMIT ? OFFSET ?
+    """, params + [limit + 1, offset]).fetchall()
+    letters = [
+        {"letter": row[0], "count": row[1]}
+        for row in conn.execute(f"SELECT letter, COUNT(*) FROM {table} GROUP BY letter ORDER BY letter = '#', letter")
+    ]
+    return rows, letters
+
+def get_artist_page(prefix=None, letter=None, page=1, limit=100):
+    """Get one page of artists with their track/album counts and duration.
+
+    Filters by name ``prefix`` and/or index ``letter`` and includes the letter
+    index with the number of artists under each letter. Until the summary is
+    built the same data is aggregated straight from the library. ``stale``
+    is set then and while the summary lags behind the library.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    offset = (max(page, 1) - 1) * limit
+    letter = letter.upper() if letter else None
+
+    ready = ensure_artist_index()
+    if ready:
+        conn = connect_sidecar_read()
+        try:
+            rows, letters = _query_artists(conn, "artist_summary", prefix, letter, limit, offset)
+        finally:
+            conn.close()
+    else:
+        conn = connect_db()
+        conn.create_function("artist_letter", 1, artist_letter, deterministic=True)
+        try:
+            rows, letters = _query_artists(conn, f"({_FALLBACK_QUERY})", prefix, letter, limit, offset)
+        finally:
+            conn.close()
+
+    return {
+        "artists": [dict(row) for row in rows[:limit]],
+        "has_more": len(rows) > limit,
+        "letters": letters,
+        "stale": not ready or _syncer.stale(),
+    }
@@ -0,0 +1,307 @@
+import re
+import json
+import shlex
+import logging
+import subprocess
+from datetime import datetime
+from functools import lru_cache
+from beets_utils import (
+    connect_db, format_item, run_beet, LIBRARY_ITEM_COLUMNS, MAX_PAGE_SIZE
+)
+from albums import ALBUM_COLUMNS, format_album, get_album_stats
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Seconds `beet ls` may take when a query has to fall back to beets
+QUERY_FALLBACK_TIMEOUT = 60
+
+# Fields a term without a field name is matched against, as in beets
+ITEM_DEFAULT_FIELDS = ("artist", "title", "comments", "album", "albumartist", "genre")
+ALBUM_DEFAULT_FIELDS = ("album", "albumartist", "genre")
+
+ITEM_DEFAULT_SORT = ["artist+", "album+", "disc+", "track+"]
+ALBUM_DEFAULT_SORT = ["albumartist+", "album+"]
+
+DATE_FIELDS = {"added", "mtime"}
+BOOL_FIELDS = {"comp"}
+PATH_FIELDS = {"path", "artpath"}
+
+# [-|^][field:][=|=~|:]value, the same split beets makes
+_TERM_RE = re.compile(r"^(-|\^)?(?:(\w+):)?(=~|=|:)?(.*)$", re.S)
+_SORT_RE = re.compile(r"^(\w+)([+-])$")
+
+class UnsupportedQuery(Exception):
+    """A beets query uses syntax the SQL compiler does not translate."""
+
+class _Table:
+    """Columns of a beets table and how its rows relate to the other table."""
+
+    def __init__(self, name, columns, attributes, default_fields, default_sort):
+        self.name = name
+        self.columns = columns
+        self.attributes = attributes
+        self.default_fields = [field for field in default_fields if field in columns]
+        self.default_sort = default_sort
+
+def _load_tables(conn):
+    def columns(table):
+        return {row["name"]: (row["type"] or "").upper() for row in conn.execute(f"PRAGMA table_info({table})")}
+    return (
+        _Table("items", columns("items"), "item_attributes", ITEM_DEFAULT_FIELDS, ITEM_DEFAULT_SORT),
+        _Table("albums", columns("albums"), "album_attributes", ALBUM_DEFAULT_FIELDS, ALBUM_DEFAULT_SORT),
+    )
+
+@lru_cache(maxsize=256)
+def _compile_regexp(pattern):
+    return re.compile(pattern)
+
+def _regexp(value, pattern):
+    if value is None:
+        return False
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", errors="replace")
+    return _compile_regexp(pattern).search(str(value)) is not None
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _parse_number(field, value):
+    if field == "length" and ":" in value:
+        # beets accepts lengths as M:SS
+        minutes, _, seconds = value.partition(":")
+        try:
+            return int(minutes) * 60 + float(seconds)
+        except ValueError:
+            raise UnsupportedQuery(f"Invalid length: {value}")
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            raise UnsupportedQuery(f"Not a number: {value}")
+
+def _parse_date(value, end=False):
+    """Get the timestamp a YYYY[-MM[-DD]] date starts at, or the next one starts at."""
+    for fmt, precision in (("%Y-%m-%d", "day"), ("%Y-%m", "month"), ("%Y", "year")):
+        try:
+            date = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if end:
+            if precision == "day":
+                date = datetime.fromordinal(date.toordinal() + 1)
+            elif precision == "month":
+                date = date.replace(year=date.year + date.month // 12, month=date.month % 12 + 1)
+            else:
+                date = date.replace(year=date.year + 1)
+        return date.timestamp()
+    raise UnsupportedQuery(f"Unsupported date: {value}")
+
+def _range_condition(column, field, value, parse):
+    """Compile ``a..b``, ``a..``, ``..b`` or a single value to SQL."""
+    if ".." in value:
+        low, _, high = value.partition("..")
+        conditions, params = [], []
+        if low:
+            conditions.append(f"{column} >= ?")
+            params.append(parse(field, low))
+        if high:
+            conditions.append(f"{column} <= ?")
+            params.append(parse(field, high))
+        return " AND ".join(conditions) or f"{column} IS NOT NULL", params
+    return f"{column} = ?", [parse(field, value)]
+
+def _date_condition(column, value):
+    # Dates select the whole day, month or year they name
+    if ".." in value:
+        low, _, high = value.partition("..")
+    else:
+        low = high = value
+    conditions, params = [], []
+    if low:
+        conditions.append(f"{column} >= ?")
+        params.append(_parse_date(low))
+    if high:
+        conditions.append(f"{column} < ?")
+        params.append(_parse_date(high, end=True))
+    return " AND ".join(conditions) or f"{column} IS NOT NULL", params
+
+def _value_condition(column, field, column_type, operator, value):
+    """Compile one field match to SQL against ``column``."""
+    if operator == ":":
+        try:
+            _compile_regexp(value)
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression {value!r}: {e}")
+        return f"beets_regexp({column}, ?)", [value]
+    if field in PATH_FIELDS:
+        raise UnsupportedQuery("Path queries are left to beets")
+    if field in DATE_FIELDS:
+        return _date_condition(column, value)
+    if field in BOOL_FIELDS and value.lower() in ("true", "false", "yes", "no", "1", "0"):
+        return f"{column} = ?", [int(value.lower() in ("true", "yes", "1"))]
+    if column_type in ("INTEGER", "REAL", "NUMERIC"):
+        if operator is not None:
+            raise UnsupportedQuery(f"Exact match on numeric field {field}")
+        return _range_condition(column, field, value, _parse_number)
+    if operator == "=":
+        return f"{column} = ?", [value]
+    if operator == "=~":
+        return f"{column} = ? COLLATE NOCASE", [value]
+    return f"{column} LIKE ? ESCAPE '\\'", [f"%{_escape_like(value)}%"]
+
+def _field_condition(table, other, field, operator, value):
+    """Compile a match on a column of the table, the related table or a flexible attribute."""
+    if field in table.columns:
+        return _value_condition(field, field, table.columns[field], operator, value)
+    if field in other.columns:
+        # Match through the album an item belongs to, or any item of an album
+        sql, params = _value_condition(field, field, other.columns[field], operator, value)
+        if table.name == "items":
+            return f"album_id IN (SELECT id FROM albums WHERE {sql})", params
+        return f"id IN (SELECT album_id FROM items WHERE {sql})", params
+    if field in DATE_FIELDS | PATH_FIELDS:
+        raise UnsupportedQuery(f"Unsupported field: {field}")
+    # Flexible attributes are stored as text in the attributes table
+    if operator is None and re.fullmatch(r"-?[\d.]*\.\.-?[\d.]*", value) and value != "..":
+        sql, params = _range_condition("CAST(value AS REAL)", field, value, _parse_number)
+    else:
+        sql, params = _value_condition("value", field, "TEXT", operator, value)
+    return (
+        f"id IN (SELECT entity_id FROM {table.attributes} WHERE key = ? AND {sql})",
+        [field] + params,
+    )
+
+def _term_condition(table, other, term):
+    match = _TERM_RE.match(term)
+    negate, field, operator, value = match.groups()
+    if field:
+        sql, params = _field_condition(table, other, field.lower(), operator, value)
+    else:
+        if operator not in (None, ":") or "/" in value:
+            # Path-like terms and exact matches across fields are left to beets
+            raise UnsupportedQuery(f"Unsupported term: {term}")
+        parts = [_value_condition(name, name, "TEXT", operator, value) for name in table.default_fields]
+        sql = " OR ".join(f"({part})" for part, _ in parts)
+        params = [param for _, part_params in parts for param in part_params]
+    if negate:
+        sql = f"NOT ({sql})"
+    return f"({sql})", params
+
+def _order_clause(table, sorts):
+    keys = []
+    for spec in sorts:
+        field, direction = _SORT_RE.match(spec).groups()
+        field = field.lower()
+        if field not in table.columns or field in PATH_FIELDS:
+            raise UnsupportedQuery(f"Unsupported sort field: {field}")
+        collate = " COLLATE NOCASE" if table.columns[field] == "TEXT" else ""
+        keys.append(f"{field}{collate} {'ASC' if direction == '+' else 'DESC'}")
+    return ", ".join(keys + ["id"])
+
+def compile_query(query, albums=False, conn=None):
+    """Compile a beets query to a parameterized WHERE and ORDER BY clause.
+
+    Supports ``field:value`` substring matches, ``=`` and ``=~`` exact
+    matches, ``field::regex``, numeric and date ranges with ``..``,
+    negation with ``-`` or ``^``, `` , `` between alternatives and
+    ``field+``/``field-`` sort terms. Raises UnsupportedQuery for anything
+    else, e.g. path queries or relative dates.
+    """
+    try:
+        tokens = shlex.split(query)
+    except ValueError as e:
+        raise ValueError(f"Invalid query: {e}")
+
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_db()
+    try:
+        items, album_table = _load_tables(conn)
+    finally:
+        if own_conn:
+            conn.close()
+    table, other = (album_table, items) if albums else (items, album_table)
+
+    sorts = [token for token in tokens if _SORT_RE.match(token)]
+    groups, current = [], []
+    for token in tokens:
+        if token == ",":
+            groups.append(current)
+            current = []
+        elif not _SORT_RE.match(token):
+            current.append(token)
+    groups.append(current)
+
+    alternatives, params = [], []
+    for group in groups:
+        conditions = []
+        for term in group:
+            sql, term_params = _term_condition(table, other, term)
+            conditions.append(sql)
+            params += term_params
+        alternatives.append(" AND ".join(conditions) or "1")
+    where = " OR ".join(f"({alternative})" for alternative in alternatives)
+    return table.name, where, params, _order_clause(table, sorts or table.default_sort)
+
+def _fallback_ids(query, albums):
+    """Ask beets for the ids matching a query it understands but we do not."""
+    args = ["ls", "-f", "$id"] + (["-a"] if albums else []) + shlex.split(query)
+    try:
+        result = run_beet(args, timeout=QUERY_FALLBACK_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        raise ValueError("beets took too long to run the query")
+    if result.returncode != 0:
+        raise ValueError(result.stderr.strip() or f"beet ls exited with {result.returncode}")
+    return [int(line) for line in result.stdout.split() if line.isdigit()]
+
+def _fetch_rows(conn, table, ids):
+    columns = ALBUM_COLUMNS if table == "albums" else LIBRARY_ITEM_COLUMNS
+    rows = conn.execute(f"""
+        SELECT {columns} FROM {table}
+        WHERE id IN (SELECT value FROM json_each(?))
+    """, (json.dumps(ids),)).fetchall()
+    by_id = {row["id"]: row for row in rows}
+    return [by_id[row_id] for row_id in ids if row_id in by_id]
+
+def run_query(query, albums=False, page=1, limit=50):
+    """Run a beets query and return a page of structured results.
+
+    Queries are compiled to SQL when possible; anything else is run with
+    ``beet ls`` and only the matching ids are taken from its output.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    offset = (max(page, 1) - 1) * limit
+    conn = connect_db()
+    try:
+        conn.create_function("beets_regexp", 2, _regexp, deterministic=True)
+        try:
+            table, where, params, order = compile_query(query, albums, conn)
+            compiled = True
+            columns = ALBUM_COLUMNS if albums else LIBRARY_ITEM_COLUMNS
+            rows = conn.execute(f"""
+                SELECT {columns} FROM {table}
+                WHERE {where}
+                ORDER BY {order}
+                LIMIT ? OFFSET ?
+            """, params + [limit + 1, offset]).fetchall()
+        except UnsupportedQuery as e:
+            logger.info(f"Running query with beets ({e}): {query}")
+            compiled = False
+            table = "albums" if albums else "items"
+            ids = _fallback_ids(query, albums)
+            rows = _fetch_rows(conn, table, ids[offset:offset + limit + 1])
+    finally:
+        conn.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    stale = False
+    if albums:
+        stats, stale = get_album_stats([row["id"] for row in rows])
+        results = [format_album(row, stats.get(row["id"])) for row in rows]
+    else:
+        results = [format_item(row) for row in rows]
+    return {"results": results, "has_more": has_more, "compiled": compiled, "stale": stale}
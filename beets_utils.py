@@ -4,8 +4,12 @@ import subprocess
 import sqlite3
 import tempfile
 import base64
+import threading
 from pathlib import Path
+import re
 import json
+import copy
+import time
 import yaml
 from flask import current_app, session
 import shutil
@@ -41,33 +45,108 @@ def get_beets_config_path():
     config_path_str = os.environ.get("BEETS_CONFIG_PATH", str(DEFAULT_CONFIG_PATH))
     return Path(config_path_str)
 
+class ConfigCache:
+    """Parsed beets config, re-read only when the file changes.
+
+    Every lookup costs a single ``stat()``: the parsed YAML is reused as long as
+    the file's mtime, size and inode are unchanged. Writers in this module call
+    invalidate() explicitly as well, in case a rewrite keeps all three.
+    """
+
+    def __init__(self, path_getter):
+        self._path_getter = path_getter
+        self._lock = threading.Lock()
+        self._entry = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _file_identity(config_path):
+        try:
+            stat = os.stat(config_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _parse(self, config_path):
+        """Parse the config and derive the library path from it."""
+        default_db_path = config_path.parent / "library.db"
+        config, error, db_path = None, None, default_db_path
+        try:
+            if config_path.exists():
+                with open(config_path, 'r') as f:
+                    config = yaml.safe_load(f) or {}
+        except Exception as e:
+            logger.error(f"Error reading beets config: {str(e)}")
+            error = e
+
+        if isinstance(config, dict) and isinstance(config.get("library"), str):
+            # Make sure the library path from config is absolute
+            library_path = Path(config["library"])
+            if not library_path.is_absolute():
+                # Assume it's relative to the config directory
+                library_path = config_path.parent / library_path
+            db_path = library_path
+        return {"config": config, "error": error, "db_path": db_path}
+
+    def get(self):
+        """Get the cache entry for the current config file, parsing it if needed.
+
+        The entry holds the parsed ``config`` (None if the file is missing), the
+        parse ``error`` if any and the resolved ``db_path``. Treat the config as
+        read-only; it is shared between requests.
+        """
+        config_path = self._path_getter()
+        identity = self._file_identity(config_path)
+        with self._lock:
+            entry = self._entry
+            if entry is not None and entry["path"] == config_path and entry["identity"] == identity:
+                self.hits += 1
+                return entry
+            self.misses += 1
+        entry = self._parse(config_path)
+        entry["path"] = config_path
+        entry["identity"] = identity
+        with self._lock:
+            self._entry = entry
+        return entry
+
+    def invalidate(self):
+        """Forget the parsed config so the next lookup reads the file again."""
+        with self._lock:
+            self._entry = None
+            self.invalidations += 1
+
+    def stats(self):
+        """Get the hit/miss counters of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+                "config_path": str(self._entry["path"]) if self._entry else None,
+            }
+
+_config_cache = ConfigCache(get_beets_config_path)
+
+def invalidate_config_cache():
+    """Drop the cached beets config, e.g. after writing the config file."""
+    _config_cache.invalidate()
+
+def get_config_cache_stats():
+    """Get statistics about the beets config cache."""
+    return _config_cache.stats()
+
 def get_beets_db_path():
     """Get the path to the beets database, derived from config file setting or default.
     
-    Reads the config file to find the 'library' setting.
+    Uses the 'library' setting of the (cached) config file.
     If not found or config doesn't exist, defaults to a path adjacent to the config file.
     """
-    config_path = get_beets_config_path()
-    default_db_path = config_path.parent / "library.db"
-    
-    try:
-        if config_path.exists():
-            with open(config_path, 'r') as f:
-                config_data = yaml.safe_load(f)
-            
-            if isinstance(config_data, dict) and "library" in config_data:
-                library_path_str = config_data["library"]
-                # Make sure the library path from config is absolute
-                library_path = Path(library_path_str)
-                if not library_path.is_absolute():
-                    # Assume it's relative to the config directory
-                    library_path = config_path.parent / library_path
-                return library_path
-    except Exception as e:
-        logger.error(f"Error reading library path from config: {e}. Using default.")
-    
-    # Fallback to default path if config doesn't exist, can't be read, or lacks 'library' key
-    return default_db_path
+    return _config_cache.get()["db_path"]
 
 def check_beets_config():
     """Check if beets is configured correctly."""
@@ -79,11 +158,7 @@ def check_beets_config():
     db_exists = db_path.exists()
     
     # Check if beets command is available
-    try:
-        subprocess.run([BEET_EXECUTABLE, "--version"], capture_output=True, text=True, check=True)
-        beets_installed = True
-    except (subprocess.SubprocessError, FileNotFoundError):
-        beets_installed = False
+    beets_installed = _metadata_cache.get()["installed"]
     
     return {
         "config_exists": config_exists,
@@ -93,156 +168,428 @@ def check_beets_config():
         "db_path": str(db_path),     # Return as string
     }
 
+# Read connection pool tuning, overridable through the environment
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "4"))
+DB_CACHE_SIZE_KB = int(os.environ.get("DB_CACHE_SIZE_KB", "16384"))
+DB_MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_BUSY_TIMEOUT = float(os.environ.get("DB_BUSY_TIMEOUT", "5"))
+
+class PooledConnection(sqlite3.Connection):
+    """Read-only SQLite connection that returns itself to the pool on close()."""
+    pool = None
+    generation = None
+    journal_mode = None
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def discard(self):
+        """Really close the underlying SQLite handle."""
+        self.pool = None
+        super().close()
+
+class ReadConnectionPool:
+    """Thread-safe pool of long-lived, read-only connections to a SQLite database.
+
+    Connections are opened with a ``mode=ro`` URI and ``PRAGMA query_only`` and
+    keep their page cache and mmap between requests. The pool remembers the
+    device/inode of the database file and reopens its connections when the file
+    is replaced (reset/initialize, or beets recreating it).
+    """
+
+    def __init__(self, path_getter, name="Beets database", max_idle=DB_POOL_SIZE):
+        self.path_getter = path_getter
+        self.name = name
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = []
+        self._generation = 0
+        self._db_path = None
+        self._db_identity = None
+        self._in_use = 0
+        self._counters = {
+            "opened": 0,
+            "closed": 0,
+            "reused": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def _file_identity(db_path):
+        stat = os.stat(db_path)
+        return (stat.st_dev, stat.st_ino)
+
+    def _open(self, db_path, generation):
+        uri = f"{db_path.resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=DB_BUSY_TIMEOUT,
+                               check_same_thread=False, factory=PooledConnection)
+        try:
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA query_only = ON")
+            conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+            conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+            conn.execute("PRAGMA temp_store = MEMORY")
+            conn.journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        except Exception:
+            conn.discard()
+            raise
+        conn.pool = self
+        conn.generation = generation
+        with self._lock:
+            self._counters["opened"] += 1
+        return conn
+
+    def _drop_idle_locked(self):
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.discard()
+        self._counters["closed"] += len(idle)
+
+    def acquire(self):
+        """Borrow a connection, opening a new one if none is idle."""
+        db_path = self.path_getter()
+        try:
+            identity = self._file_identity(db_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"{self.name} not found at {db_path}")
+
+        conn = None
+        with self._lock:
+            if db_path != self._db_path or identity != self._db_identity:
+                if self._db_path is not None:
+                    logger.info(f"{self.name} at {db_path} changed, reopening pooled connections")
+                    self._counters["invalidations"] += 1
+                self._drop_idle_locked()
+                self._generation += 1
+                self._db_path = db_path
+                self._db_identity = identity
+            if self._idle:
+                conn = self._idle.pop()
+                self._counters["reused"] += 1
+            self._in_use += 1
+            generation = self._generation
+
+        if conn is None:
+            try:
+                conn = self._open(db_path, generation)
+            except Exception:
+                with self._lock:
+                    self._in_use -= 1
+                raise
+        return conn
+
+    def release(self, conn):
+        """Return a borrowed connection to the pool."""
+        try:
+            # Never keep a read transaction open while idle, it would pin the WAL
+            if conn.in_transaction:
+                conn.rollback()
+            reusable = True
+        except sqlite3.Error:
+            reusable = False
+
+        with self._lock:
+            self._in_use -= 1
+            if reusable and conn.generation == self._generation and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._counters["closed"] += 1
+        conn.discard()
+
+    def invalidate(self):
+        """Close idle connections and make borrowed ones close on release."""
+        with self._lock:
+            self._drop_idle_locked()
+            self._generation += 1
+            self._db_path = None
+            self._db_identity = None
+            self._counters["invalidations"] += 1
+
+    def stats(self):
+        """Return a snapshot of the pool state and counters."""
+        with self._lock:
+            journal_modes = sorted({conn.journal_mode for conn in self._idle if conn.journal_mode})
+            return {
+                "db_path": str(self._db_path) if self._db_path else None,
+                "generation": self._generation,
+                "max_idle": self.max_idle,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "journal_modes": journal_modes,
+                "cache_size_kb": DB_CACHE_SIZE_KB,
+                "mmap_size": DB_MMAP_SIZE,
+                **self._counters,
+            }
+
+_read_pool = ReadConnectionPool(get_beets_db_path)
+
 def connect_db():
-    """Connect to the beets database."""
-    # Connect to local database
-    db_path = get_beets_db_path()
-    if not db_path.exists():
-        raise FileNotFoundError(f"Beets database not found at {db_path}")
-    
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Borrow a read-only connection to the library data from a pool.
 
-def get_item_count():
-    """Get the total number of items in the library."""
-    conn = connect_db()
+    Reads are served from BeetsManager's replica of the library (see
+    replica.py) once it has been built, so they never wait for beets'
+    writers, and from the beets database until then. Callers must close()
+    the connection when done, which returns it to the pool.
+    """
+    # replica.py builds on this module
+    from replica import connect_replica_read
+    conn = connect_replica_read()
+    if conn is not None:
+        return conn
+    return _read_pool.acquire()
+
+def connect_beets_db():
+    """Borrow a read-only connection to the beets database itself.
+
+    For reads that must see beets' latest writes, e.g. import progress.
+    """
+    return _read_pool.acquire()
+
+def invalidate_db_pool():
+    """Drop pooled connections, e.g. after the database file has been replaced."""
+    _read_pool.invalidate()
+
+def get_db_pool_stats():
+    """Get statistics about the read connection pool and the library replica."""
+    from replica import get_replica_stats
+    return {**_read_pool.stats(), "replica": get_replica_stats()}
+
+# Sortable library fields and the SQL expression each one orders by.
+# NULLs are folded into a comparable value so keyset cursors stay well-defined.
+LIBRARY_SORT_FIELDS = {
+    'artist': "IFNULL(artist, '')",
+    'albumartist': "IFNULL(albumartist, '')",
+    'album': "IFNULL(album, '')",
+    'title': "IFNULL(title, '')",
+    'year': "IFNULL(year, 0)",
+    'added': "IFNULL(added, 0)",
+    'disc': "IFNULL(disc, 0)",
+    'track': "IFNULL(track, 0)",
+    'length': "IFNULL(length, 0)",
+    'format': "IFNULL(format, '')",
+    'bitrate': "IFNULL(bitrate, 0)",
+}
+
+LIBRARY_ITEM_COLUMNS = "id, title, artist, album, year, length, format, bitrate, albumartist, album_id"
+
+MAX_PAGE_SIZE = 1000
+
+def format_item(row):
+    """Convert an items row to a dictionary with a formatted length."""
+    item = dict(row)
+    # Format length in minutes:seconds
+    if 'length' in item and item['length']:
+        minutes, seconds = divmod(int(item['length']), 60)
+        item['length_formatted'] = f"{minutes}:{seconds:02d}"
+    return item
+
+def parse_sort_spec(sort='artist', order='asc'):
+    """Parse a sort specification such as ``artist,-year`` into sort keys.
+
+    Fields are comma separated and a leading ``-`` sorts that field descending.
+    ``order='desc'`` reverses the whole specification. Unknown fields are
+    ignored; an empty result falls back to sorting by artist. Returns a list of
+    ``(field, descending)`` tuples.
+    """
+    keys = []
+    seen = set()
+    for part in (sort or '').split(','):
+        part = part.strip()
+        descending = part.startswith('-')
+        field = part.lstrip('+-')
+        if field in LIBRARY_SORT_FIELDS and field not in seen:
+            seen.add(field)
+            keys.append((field, descending))
+    if not keys:
+        keys = [('artist', False)]
+    if order == 'desc':
+        keys = [(field, not descending) for field, descending in keys]
+    return keys
+
+def format_sort_spec(keys):
+    """Turn parsed sort keys back into their canonical string form."""
+    return ','.join(f"-{field}" if descending else field for field, descending in keys)
+
+def _order_by_clause(keys, reverse=False):
+    terms = []
+    for field, descending in keys:
+        descending = descending != reverse
+        terms.append(f"{LIBRARY_SORT_FIELDS[field]} {'DESC' if descending else 'ASC'}")
+    # The id is the tie-breaker that makes the ordering total
+    terms.append(f"id {'DESC' if reverse else 'ASC'}")
+    return ', '.join(terms)
+
+def encode_cursor(keys, values, direction):
+    """Build an opaque pagination cursor from a row's sort values and id."""
+    payload = json.dumps({"s": format_sort_spec(keys), "v": list(values), "d": direction},
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, keys):
+    """Decode a cursor created by encode_cursor() for the given sort keys.
+
+    Returns ``(values, direction)`` and raises ValueError for malformed cursors
+    or cursors that were issued for a different sort order.
+    """
     try:
-        cursor = conn.cursor()
-        count = cursor.execute("SELECT COUNT(*) FROM items").fetchone()[0]
-        return count
-    except Exception as e:
-        logger.error(f"Error counting items: {str(e)}")
-        raise
-    finally:
-        conn.close()
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        values = payload["v"]
+        direction = payload["d"]
+        sort_spec = payload["s"]
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+    if sort_spec != format_sort_spec(keys):
+        raise ValueError("Pagination cursor does not match the requested sort order")
+    if direction not in ('after', 'before') or not isinstance(values, list) or len(values) != len(keys) + 1:
+        raise ValueError("Invalid pagination cursor")
+    return values, direction
+
+def _keyset_condition(keys, values, direction):
+    """Build the WHERE clause that seeks past the row identified by values."""
+    exprs = [LIBRARY_SORT_FIELDS[field] for field, _ in keys] + ['id']
+    descending = [desc for _, desc in keys] + [False]
+    if direction == 'before':
+        descending = [not desc for desc in descending]
+
+    # A uniform direction can use a single row-value comparison
+    if all(descending) or not any(descending):
+        op = '<' if descending[0] else '>'
+        placeholders = ', '.join('?' for _ in exprs)
+        return f"({', '.join(exprs)}) {op} ({placeholders})", list(values)
 
-def get_library_items(page=1, limit=50, sort='artist'):
-    """Get a paginated list of library items."""
+    clauses = []
+    params = []
+    for i, expr in enumerate(exprs):
+        terms = [f"{exprs[j]} = ?" for j in range(i)]
+        terms.append(f"{expr} {'<' if descending[i] else '>'} ?")
+        clauses.append(f"({' AND '.join(terms)})")
+        params.extend(values[:i + 1])
+    return f"({' OR '.join(clauses)})", params
+
+def get_library_items(page=1, limit=50, sort='artist', order='asc'):
+    """Get a page of library items using OFFSET paging.
+
+    Kept for backward compatibility; prefer get_library_page(), whose cost does
+    not grow with the page number.
+    """
     conn = connect_db()
     try:
         cursor = conn.cursor()
         offset = (page - 1) * limit
-        
-        valid_sorts = {
-            'artist': 'artist',
-            'album': 'album',
-            'title': 'title',
-            'year': 'year',
-            'added': 'added'
-        }
-        
-        sort_field = valid_sorts.get(sort, 'artist')
+        keys = parse_sort_spec(sort, order)
         
         query = f"""
-            SELECT id, title, artist, album, year, length, format, bitrate, albumartist
+            SELECT {LIBRARY_ITEM_COLUMNS}
             FROM items
-            ORDER BY {sort_field}
+            ORDER BY {_order_by_clause(keys)}
             LIMIT ? OFFSET ?
         """
         
         rows = cursor.execute(query, (limit, offset)).fetchall()
         
-        items = []
-        for row in rows:
-            item = dict(row)
-            # Format length in minutes:seconds
-            if 'length' in item and item['length']:
-                minutes, seconds = divmod(int(item['length']), 60)
-                item['length_formatted'] = f"{minutes}:{seconds:02d}"
-            items.append(item)
-        
-        return items
+        return [format_item(row) for row in rows]
     except Exception as e:
         logger.error(f"Error fetching library items: {str(e)}")
         raise
     finally:
         conn.close()
 
-def search_library(query):
-    """Search the library with a query string."""
-    if not query:
-        return []
-    
+def get_library_page(limit=50, sort='artist', cursor=None, order='asc'):
+    """Get a page of library items using keyset (cursor) pagination.
+
+    Each page seeks directly past the (sort key, id) of the row named by the
+    cursor instead of skipping rows with OFFSET. Returns the items together with
+    ``next_cursor`` and ``prev_cursor``, which are None at either end.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    keys = parse_sort_spec(sort, order)
+    direction = 'after'
+    where = ''
+    params = []
+    if cursor:
+        values, direction = decode_cursor(cursor, keys)
+        condition, params = _keyset_condition(keys, values, direction)
+        where = f"WHERE {condition}"
+
+    sort_columns = ', '.join(f"{LIBRARY_SORT_FIELDS[field]} AS _sort{i}" for i, (field, _) in enumerate(keys))
+    query = f"""
+        SELECT {LIBRARY_ITEM_COLUMNS}, {sort_columns}
+        FROM items
+        {where}
+        ORDER BY {_order_by_clause(keys, reverse=direction == 'before')}
+        LIMIT ?
+    """
+
     conn = connect_db()
     try:
-        cursor = conn.cursor()
-        # Build search query
-        search_query = """
-            SELECT id, title, artist, album, year, length, format, bitrate, albumartist
-            FROM items
-            WHERE title LIKE ? OR artist LIKE ? OR album LIKE ? OR albumartist LIKE ?
-            ORDER BY artist, album, track
-            LIMIT 100
-        """
-        
-        pattern = f"%{query}%"
-        rows = cursor.execute(search_query, (pattern, pattern, pattern, pattern)).fetchall()
-        
-        results = []
-        for row in rows:
-            item = dict(row)
-            # Format length in minutes:seconds
-            if 'length' in item and item['length']:
-                minutes, seconds = divmod(int(item['length']), 60)
-                item['length_formatted'] = f"{minutes}:{seconds:02d}"
-            results.append(item)
-        
-        return results
+        # Fetch one extra row to learn whether another page exists
+        rows = conn.execute(query, params + [limit + 1]).fetchall()
     except Exception as e:
-        logger.error(f"Error searching library: {str(e)}")
+        logger.error(f"Error fetching library page: {str(e)}")
         raise
     finally:
         conn.close()
 
-def get_artists():
-    """Get a list of all artists in the library."""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == 'before':
+        rows.reverse()
+
+    items = []
+    boundaries = []
+    for row in rows:
+        item = format_item(row)
+        boundaries.append([item.pop(f"_sort{i}") for i in range(len(keys))] + [item['id']])
+        items.append(item)
+
+    if direction == 'after':
+        has_next, has_prev = has_more, cursor is not None
+    else:
+        has_next, has_prev = True, has_more
+
+    return {
+        "items": items,
+        "sort": format_sort_spec(keys),
+        "next_cursor": encode_cursor(keys, boundaries[-1], 'after') if items and has_next else None,
+        "prev_cursor": encode_cursor(keys, boundaries[0], 'before') if items and has_prev else None,
+    }
+
+def search_library(query, page=1, limit=100):
+    """Search the library with a substring match on title, artist and album.
+
+    This scans the whole items table; search_index.search_items() is the fast
+    path and this is only used until the full-text index has been built.
+    """
+    if not query:
+        return {"results": [], "has_more": False}
+    
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    offset = (max(page, 1) - 1) * limit
     conn = connect_db()
     try:
         cursor = conn.cursor()
-        query = """
-            SELECT DISTINCT artist
+        # Build search query
+        search_query = f"""
+            SELECT {LIBRARY_ITEM_COLUMNS}
             FROM items
-            ORDER BY artist
+            WHERE title LIKE ? OR artist LIKE ? OR album LIKE ? OR albumartist LIKE ?
+            ORDER BY artist, album, track, id
+            LIMIT ? OFFSET ?
         """
         
-        rows = cursor.execute(query).fetchall()
-        artists = [row[0] for row in rows if row[0]]
-        
-        return artists
-    except Exception as e:
-        logger.error(f"Error fetching artists: {str(e)}")
-        raise
-    finally:
-        conn.close()
-
-def get_albums(artist=None):
-    """Get a list of albums, optionally filtered by artist."""
-    conn = connect_db()
-    try:
-        cursor = conn.cursor()
-        
-        if artist:
-            query = """
-                SELECT DISTINCT album, artist, albumartist, year
-                FROM items
-                WHERE artist = ? OR albumartist = ?
-                ORDER BY year DESC, album
-            """
-            rows = cursor.execute(query, (artist, artist)).fetchall()
-        else:
-            query = """
-                SELECT DISTINCT album, artist, albumartist, year
-                FROM items
-                ORDER BY year DESC, album
-            """
-            rows = cursor.execute(query).fetchall()
-        
-        albums = [dict(row) for row in rows if row['album']]
+        pattern = f"%{query}%"
+        rows = cursor.execute(search_query, (pattern, pattern, pattern, pattern, limit + 1, offset)).fetchall()
         
-        return albums
+        return {
+            "results": [format_item(row) for row in rows[:limit]],
+            "has_more": len(rows) > limit
+        }
     except Exception as e:
-        logger.error(f"Error fetching albums: {str(e)}")
+        logger.error(f"Error searching library: {str(e)}")
         raise
     finally:
         conn.close()
@@ -258,14 +605,11 @@ def get_item_details(item_id):
         if not row:
             return None
         
-        # Convert row to dictionary
-        item = dict(row)
-        
-        # Format length in minutes:seconds
-        if 'length' in item and item['length']:
-            minutes, seconds = divmod(int(item['length']), 60)
-            item['length_formatted'] = f"{minutes}:{seconds:02d}"
-        
+        item = format_item(row)
+        # Paths are stored as BLOBs
+        for key, value in item.items():
+            if isinstance(value, bytes):
+                item[key] = os.fsdecode(value)
         return item
     except Exception as e:
         logger.error(f"Error fetching item details: {str(e)}")
@@ -273,101 +617,108 @@ def get_item_details(item_id):
     finally:
         conn.close()
 
-def get_album_art(item_id):
-    """Get album art for a specific item using beets command."""
-    try:
-        # Get item details to get the album
-        item = get_item_details(item_id)
-        if not item or not item.get('album'):
-            return None
-        
-        # Get album art locally
-        cmd = [BEET_EXECUTABLE, "albumart", "-o", "-", item.get('album')]
-        
-        # Try to be more specific if we have artist information
-        if item.get('albumartist'):
-            cmd[-1] = f"album:{item.get('album')} albumartist:{item.get('albumartist')}"
-        elif item.get('artist'):
-            cmd[-1] = f"album:{item.get('album')} artist:{item.get('artist')}"
-        
-        try:
-            result = subprocess.run(cmd, capture_output=True, check=True)
-            # Convert binary image data to base64 for embedding in HTML
-            image_data = base64.b64encode(result.stdout).decode('utf-8')
-            return image_data
-        except subprocess.CalledProcessError:
-            logger.warning(f"Failed to get album art for item {item_id}")
-            return None
-    except Exception as e:
-        logger.error(f"Error getting album art: {str(e)}")
-        return None
+# Largest number of ids one batch request may ask for
+MAX_BATCH_ITEMS = 5000
 
-def execute_beets_command(command):
-    """Execute a beets command and return the result."""
-    if not command.strip():
-        return "No command provided"
-    
-    # Execute command locally
-    cmd_parts = [BEET_EXECUTABLE] + command.split()
-    
+def get_items_batch(ids, fields=None):
+    """Get the details of many items with one query, in the order of ``ids``.
+
+    ``fields`` limits the returned columns; names that are not columns of
+    the items table are looked up as flexible attributes. Returns the items
+    found and the ids that do not exist.
+    """
+    ids = [int(item_id) for item_id in ids]
+    if len(ids) > MAX_BATCH_ITEMS:
+        raise ValueError(f"At most {MAX_BATCH_ITEMS} items can be requested at once")
+    unknown = [field for field in fields or [] if not re.fullmatch(r"\w+", str(field))]
+    if unknown:
+        raise ValueError(f"Invalid field names: {', '.join(map(str, unknown))}")
+    if not ids:
+        return {"items": [], "missing": []}
+
+    conn = connect_db()
     try:
-        # Run the command
-        result = subprocess.run(cmd_parts, capture_output=True, text=True)
-        
-        # Build response
-        response = {
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "returncode": result.returncode,
-            "success": result.returncode == 0
-        }
-        
-        return response
+        columns = [row["name"] for row in conn.execute("PRAGMA table_info(items)")]
+        flexible = []
+        if fields:
+            flexible = [field for field in fields if field not in columns]
+            columns = ["id"] + [field for field in fields if field in columns and field != "id"]
+
+        # One bound JSON array instead of thousands of placeholders
+        id_list = json.dumps(sorted(set(ids)))
+        rows = conn.execute(f"""
+            SELECT {", ".join(columns)}
+            FROM items
+            WHERE id IN (SELECT value FROM json_each(?))
+        """, (id_list,)).fetchall()
+        by_id = {row["id"]: format_item(row) for row in rows}
+
+        if by_id and (flexible or not fields):
+            attribute_filter = ""
+            params = [id_list]
+            if flexible:
+                attribute_filter = f"AND key IN ({', '.join('?' for _ in flexible)})"
+                params += flexible
+            for row in conn.execute(f"""
+                SELECT entity_id, key, value
+                FROM item_attributes
+                WHERE entity_id IN (SELECT value FROM json_each(?)) {attribute_filter}
+            """, params):
+                if row["entity_id"] in by_id:
+                    by_id[row["entity_id"]].setdefault(row["key"], row["value"])
     except Exception as e:
-        logger.error(f"Error executing beets command: {str(e)}")
+        logger.error(f"Error fetching items: {str(e)}")
         raise
+    finally:
+        conn.close()
 
-def import_music(path):
-    """Import music files into the beets library."""
-    if not path or not os.path.exists(path):
-        return {"success": False, "message": f"Path does not exist: {path}"}
-    
-    # Prepare the import command
-    cmd = [BEET_EXECUTABLE, "import", path]
-    
+    for item in by_id.values():
+        # Paths are stored as BLOBs
+        for key, value in item.items():
+            if isinstance(value, bytes):
+                item[key] = os.fsdecode(value)
+    return {
+        "items": [by_id[item_id] for item_id in ids if item_id in by_id],
+        "missing": [item_id for item_id in ids if item_id not in by_id],
+    }
+
+def beet_album_art_query(album, albumartist=None, artist=None):
+    """Build the beets query that selects an album for the albumart command."""
+    # Try to be more specific if we have artist information
+    if albumartist:
+        return f"album:{album} albumartist:{albumartist}"
+    if artist:
+        return f"album:{album} artist:{artist}"
+    return album
+
+def run_beet(args, text=True, timeout=None):
+    """Run a beet command, in the warm beets worker when it is available."""
+    # beets_worker builds on this module, so it is imported on first use
+    from beets_worker import run_beets
+    return run_beets(args, timeout=timeout, text=text)
+
+def fetch_album_art_with_beet(query):
+    """Get raw album art bytes for a beets query by running the albumart command."""
     try:
-        # Run the command - note that this might require user interaction
-        # which won't work well in a web interface
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        # Build response
-        response = {
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "returncode": result.returncode,
-            "success": result.returncode == 0
-        }
-        
-        return response
-    except Exception as e:
-        logger.error(f"Error importing music: {str(e)}")
-        raise
+        result = run_beet(["albumart", "-o", "-", query], text=False)
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, result.args)
+        return result.stdout or None
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        logger.warning(f"Failed to get album art for query {query!r}")
+        return None
 
 # New functions for configuration management
 
 def read_beets_config():
     """Read and parse the beets config file."""
     config_path = get_beets_config_path()
-    if not config_path.exists():
+    entry = _config_cache.get()
+    if entry["error"] is not None:
+        return {"error": str(entry["error"])}
+    if entry["config"] is None:
         return {"error": f"Config file not found at {config_path}"}
-    
-    try:
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
-        return config or {}
-    except Exception as e:
-        logger.error(f"Error reading beets config: {str(e)}")
-        return {"error": str(e)}
+    return entry["config"]
 
 def update_beets_config(config_updates):
     """Update the beets configuration file with new settings."""
@@ -388,6 +739,7 @@ def update_beets_config(config_updates):
                 # Write the parsed YAML directly to the config file
                 with open(config_path, 'w') as f:
                     yaml.dump(raw_config, f, default_flow_style=False, sort_keys=False)
+                invalidate_config_cache()
                 
                 return {"success": True, "message": "Configuration updated successfully from raw YAML"}
             except Exception as e:
@@ -396,10 +748,11 @@ def update_beets_config(config_updates):
         
         # Standard config update
         # Read existing config
-        current_config = {}
-        if config_path.exists():
-            with open(config_path, 'r') as f:
-                current_config = yaml.safe_load(f) or {}
+        entry = _config_cache.get()
+        if entry["error"] is not None:
+            raise entry["error"]
+        # The cached config is shared, so merge into a copy
+        current_config = copy.deepcopy(entry["config"]) if isinstance(entry["config"], dict) else {}
         
         # Create parent directories if they don't exist
         config_path.parent.mkdir(parents=True, exist_ok=True)
@@ -419,6 +772,7 @@ def update_beets_config(config_updates):
         # Write updated config back to file
         with open(config_path, 'w') as f:
             yaml.dump(updated_config, f, default_flow_style=False, sort_keys=False)
+        invalidate_config_cache()
         
         return {"success": True, "message": "Configuration updated successfully"}
     except Exception as e:
@@ -434,10 +788,10 @@ def deep_update(source, overrides):
             source[key] = value
     return source
 
-def get_beets_plugins():
-    """Get a list of available beets plugins."""
+def _load_beets_plugins():
+    """Run ``beet pluginlist`` and parse the available plugins."""
     try:
-        result = subprocess.run([BEET_EXECUTABLE, "pluginlist"], capture_output=True, text=True)
+        result = run_beet(["pluginlist"])
         if result.returncode != 0:
             return {"success": False, "error": result.stderr}
         
@@ -458,20 +812,101 @@ def get_beets_plugins():
         logger.error(f"Error getting beets plugins: {str(e)}")
         return {"success": False, "error": str(e)}
 
-def get_beets_info():
-    """Get information about the beets installation."""
+def _load_beets_info():
+    """Run ``beet version`` and ``beet config``.
+
+    Also reports whether the beet executable could be run at all.
+    """
     try:
-        version_result = subprocess.run([BEET_EXECUTABLE, "version"], capture_output=True, text=True)
-        config_result = subprocess.run([BEET_EXECUTABLE, "config"], capture_output=True, text=True)
+        version_result = run_beet(["version"])
+        config_result = run_beet(["config"])
         
         return {
             "success": True,
             "version": version_result.stdout.strip() if version_result.returncode == 0 else "Unknown",
             "config": config_result.stdout if config_result.returncode == 0 else "Error fetching configuration"
-        }
+        }, version_result.returncode == 0
     except Exception as e:
         logger.error(f"Error getting beets info: {str(e)}")
-        return {"success": False, "error": str(e)}
+        return {"success": False, "error": str(e)}, False
+
+def get_beets_signature():
+    """Fingerprint the config file and beet executable.
+
+    Anything derived from running beets is stale once this changes.
+    """
+    executable = shutil.which(BEET_EXECUTABLE) or BEET_EXECUTABLE
+    try:
+        executable_mtime = os.stat(executable).st_mtime_ns
+    except OSError:
+        executable_mtime = None
+    return (ConfigCache._file_identity(get_beets_config_path()), executable_mtime)
+
+class BeetsMetadataCache:
+    """Output of the slow ``beet`` commands describing the installation.
+
+    Version, plugin list and resolved config only change when the config file
+    or the beet executable does, so they are loaded once and kept until the
+    config file's identity or the executable's mtime changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entry = None
+
+    def get(self, refresh=False):
+        """Get the cached metadata, loading it first if it is missing or stale.
+
+        Concurrent callers wait for a single load instead of each running beet.
+        """
+        signature = get_beets_signature()
+        entry = self._entry
+        if not refresh and entry is not None and entry["signature"] == signature:
+            return entry
+        with self._lock:
+            entry = self._entry
+            if refresh or entry is None or entry["signature"] != signature:
+                started = time.time()
+                info, installed = _load_beets_info()
+                plugins = _load_beets_plugins() if installed else {"success": False, "error": "beet is not available"}
+                entry = {
+                    "signature": signature,
+                    "installed": installed,
+                    "info": info,
+                    "plugins": plugins,
+                    "loaded_at": time.time(),
+                }
+                self._entry = entry
+                logger.info(f"Loaded beets metadata in {entry['loaded_at'] - started:.2f}s")
+            return entry
+
+_metadata_cache = BeetsMetadataCache()
+
+def warm_beets_metadata():
+    """Load the beets metadata in a background thread."""
+    def load():
+        try:
+            _metadata_cache.get()
+        except Exception as e:
+            logger.error(f"Error loading beets metadata: {str(e)}")
+    threading.Thread(target=load, daemon=True, name="beets-metadata").start()
+
+def refresh_beets_metadata():
+    """Run the beet commands again and return the fresh metadata."""
+    entry = _metadata_cache.get(refresh=True)
+    return {
+        "success": True,
+        "beets_installed": entry["installed"],
+        "loaded_at": entry["loaded_at"],
+    }
+
+def get_beets_plugins():
+    """Get a list of available beets plugins."""
+    return _metadata_cache.get()["plugins"]
+
+def get_beets_info():
+    """Get information about the beets installation."""
+    return _metadata_cache.get()["info"]
 
 def reset_database():
     """Reset the beets database by moving it to a backup and letting beets recreate it."""
@@ -490,6 +925,7 @@ def reset_database():
         
         # Move the database file to backup
         shutil.move(str(db_path), str(backup_path))
+        invalidate_db_pool()
         
         # Initialize a new database
         init_result = initialize_database()
@@ -601,6 +1037,9 @@ def initialize_database():
                         "error": f"Original error: {str(e)}. Backup error: {str(backup_error)}"
                     }
         
+        # The config may have been written above
+        invalidate_config_cache()
+        
         # Run beet command to initialize a new database
         # The 'version' command is lightweight and will create the DB if it doesn't exist
         result = subprocess.run([BEET_EXECUTABLE, "version"], capture_output=True, text=True)
@@ -623,6 +1062,9 @@ def initialize_database():
                     "error": str(e)
                 }
         
+        # Any pooled connections point at the previous database file
+        invalidate_db_pool()
+        
         # Verify the database was created
         if db_path.exists():
             return {
@@ -672,6 +1114,7 @@ def initialize_database():
                     ''')
                     conn.commit()
                     conn.close()
+                    invalidate_db_pool()
                     
                     return {
                         "success": True,
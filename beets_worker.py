@@ -0,0 +1,510 @@
+import os
+import sys
+import json
+import time
+import errno
+import fcntl
+import inspect
+import socket
+import signal
+import logging
+import selectors
+import tempfile
+import threading
+import traceback
+import subprocess
+from beets_utils import BEET_EXECUTABLE, get_beets_signature
+from sidecar import get_cache_dir
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# The warm worker can be turned off to always run beet as a new process
+BEETS_WORKER_ENABLED = os.environ.get("BEETS_WORKER", "1") != "0"
+
+# Seconds without requests after which the worker exits; it is restarted on demand
+BEETS_WORKER_IDLE = int(os.environ.get("BEETS_WORKER_IDLE", "900"))
+
+# Seconds to wait before trying to start a worker again after it failed
+BEETS_WORKER_RETRY = 30
+
+# The worker answers with the command's pid within this many seconds
+BEETS_WORKER_CONNECT_TIMEOUT = 5
+
+_spawn_lock = threading.Lock()
+_last_spawn = 0.0
+
+def get_worker_socket_path():
+    """Get the path of the worker's Unix socket."""
+    return get_cache_dir() / "beets-worker.sock"
+
+def _worker_lock_path():
+    return get_cache_dir() / "beets-worker.lock"
+
+def _worker_log_path():
+    return get_cache_dir() / "beets-worker.log"
+
+def _unsupported_path():
+    return get_cache_dir() / "beets-worker.unsupported"
+
+def _worker_unsupported():
+    """Get why the worker cannot run with the installed beets, or None.
+
+    A worker that finds beets without the internals it needs records that
+    here; commands then run as new processes until beets or its config change.
+    """
+    try:
+        signature, reason = _unsupported_path().read_text().split("\n", 1)
+    except (FileNotFoundError, ValueError):
+        return None
+    if signature != repr(get_beets_signature()):
+        return None
+    return reason.strip()
+
+# Client side, used by the app processes
+
+class WorkerProcess:
+    """A command running in the warm worker, with the parts of Popen we use.
+
+    The worker forks a child for the command and reports its pid, then its
+    exit status when it ends. The child leads its own process group, so it can
+    be killed with os.killpg() like a subprocess started in a new session.
+    """
+
+    def __init__(self, sock, pid, buffer=b"", stdout=None, stderr=None):
+        self._sock = sock
+        self._buffer = buffer
+        self.pid = pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode = None
+
+    def _read_status(self, timeout):
+        self._sock.settimeout(timeout)
+        try:
+            while b"\n" not in self._buffer:
+                data = self._sock.recv(4096)
+                if not data:
+                    # The worker went away; the command died with it
+                    self.returncode = -signal.SIGKILL
+                    return
+                self._buffer += data
+        except (socket.timeout, BlockingIOError):
+            return
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        self.returncode = json.loads(line)["returncode"]
+        self._sock.close()
+
+    def poll(self):
+        if self.returncode is None:
+            self._read_status(0)
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if self.returncode is None:
+            self._read_status(timeout)
+            if self.returncode is None:
+                raise subprocess.TimeoutExpired("beet", timeout)
+        return self.returncode
+
+    def kill(self):
+        """Kill the command and everything it spawned.
+
+        The worker reaps the command, so only it knows the pid is still the
+        command's; it is asked to do the kill. Signalling the process group
+        directly is the fallback for a worker that cannot be reached.
+        """
+        try:
+            _ask_worker({"op": "kill", "pid": self.pid})
+            return
+        except (OSError, ValueError):
+            pass
+        if self.poll() is None:
+            try:
+                os.killpg(self.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+def kill_beets_process(proc):
+    """Kill a command started with start_beets_process() and everything it spawned."""
+    if isinstance(proc, WorkerProcess):
+        proc.kill()
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+def _spawn_worker():
+    """Start a worker in the background unless one was started recently."""
+    global _last_spawn
+    with _spawn_lock:
+        if time.time() - _last_spawn < BEETS_WORKER_RETRY:
+            return
+        _last_spawn = time.time()
+    if _worker_unsupported() is not None:
+        return
+    with open(_worker_log_path(), "ab") as log:
+        subprocess.Popen([sys.executable, "-m", "beets_worker", str(get_worker_socket_path())],
+                         cwd=os.path.dirname(os.path.abspath(__file__)),
+                         stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                         start_new_session=True)
+    logger.info("Starting warm beets worker")
+
+def _start_in_worker(args, stdout_fd, stderr_fd):
+    """Ask the worker to run a command.
+
+    Returns the connection, the command's pid and any bytes read past the
+    reply, or None if the worker is not available.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(BEETS_WORKER_CONNECT_TIMEOUT)
+        sock.connect(str(get_worker_socket_path()))
+        request = json.dumps({"args": args, "cwd": os.getcwd()}).encode("utf-8") + b"\n"
+        socket.send_fds(sock, [request], [stdout_fd, stderr_fd])
+        buffer = b""
+        while b"\n" not in buffer:
+            data = sock.recv(4096)
+            if not data:
+                raise ConnectionError("Worker closed the connection")
+            buffer += data
+        line, rest = buffer.split(b"\n", 1)
+        reply = json.loads(line)
+        if "pid" not in reply:
+            raise ConnectionError(reply.get("error", "Worker refused the command"))
+        return sock, reply["pid"], rest
+    except (OSError, ValueError) as e:
+        sock.close()
+        if isinstance(e, (FileNotFoundError, ConnectionRefusedError)):
+            _spawn_worker()
+        else:
+            logger.warning(f"Beets worker unavailable: {str(e)}")
+        return None
+
+def start_beets_process(args, stdout=None, stderr=None):
+    """Start ``beet <args>`` in the warm worker, or as a new process if it is not running.
+
+    ``stdout`` and ``stderr`` accept what Popen does for our uses: an open
+    file, ``subprocess.PIPE``, ``subprocess.STDOUT`` (stderr only) or None for
+    /dev/null. The command always runs in its own process group with stdin
+    closed. Returns a Popen or a WorkerProcess.
+    """
+    if BEETS_WORKER_ENABLED:
+        readers = {}
+        opened = []
+        try:
+            def resolve(name, target):
+                if target == subprocess.PIPE:
+                    read_fd, write_fd = os.pipe()
+                    opened.append(write_fd)
+                    readers[name] = os.fdopen(read_fd, "rb", buffering=0)
+                    return write_fd
+                if target is None:
+                    fd = os.open(os.devnull, os.O_WRONLY)
+                    opened.append(fd)
+                    return fd
+                return target.fileno()
+
+            stdout_fd = resolve("stdout", stdout)
+            stderr_fd = stdout_fd if stderr == subprocess.STDOUT else resolve("stderr", stderr)
+            started = _start_in_worker(args, stdout_fd, stderr_fd)
+        finally:
+            # The worker holds its own copies of the descriptors now
+            for fd in opened:
+                os.close(fd)
+        if started is not None:
+            sock, pid, rest = started
+            return WorkerProcess(sock, pid, rest, readers.get("stdout"), readers.get("stderr"))
+        for reader in readers.values():
+            reader.close()
+
+    return subprocess.Popen([BEET_EXECUTABLE] + list(args), stdin=subprocess.DEVNULL,
+                            stdout=subprocess.DEVNULL if stdout is None else stdout,
+                            stderr=subprocess.DEVNULL if stderr is None else stderr,
+                            start_new_session=True)
+
+def run_beets(args, timeout=None, text=True):
+    """Run ``beet <args>`` to completion and capture its output.
+
+    Returns a CompletedProcess like ``subprocess.run(..., capture_output=True)``,
+    with decoded output unless ``text`` is False.
+    """
+    with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+        proc = start_beets_process(args, stdout=stdout, stderr=stderr)
+        try:
+            returncode = proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            kill_beets_process(proc)
+            raise
+        stdout.seek(0)
+        stderr.seek(0)
+        out, err = stdout.read(), stderr.read()
+        if text:
+            out, err = out.decode("utf-8", errors="replace"), err.decode("utf-8", errors="replace")
+        return subprocess.CompletedProcess([BEET_EXECUTABLE] + list(args), returncode, out, err)
+
+def _ask_worker(message):
+    """Send the worker a request and return its JSON reply.
+
+    Raises OSError if the worker cannot be reached and ValueError if it did
+    not answer (e.g. an older worker without the operation).
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(BEETS_WORKER_CONNECT_TIMEOUT)
+        sock.connect(str(get_worker_socket_path()))
+        sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+        buffer = b""
+        while b"\n" not in buffer:
+            data = sock.recv(4096)
+            if not data:
+                break
+            buffer += data
+        return json.loads(buffer.split(b"\n", 1)[0])
+    finally:
+        sock.close()
+
+def get_worker_status():
+    """Ask the worker for its status, or report that it is not running."""
+    if not BEETS_WORKER_ENABLED:
+        return {"enabled": False, "running": False}
+    try:
+        status = _ask_worker({"op": "status"})
+    except (OSError, ValueError):
+        status = {"enabled": True, "running": False}
+        unsupported = _worker_unsupported()
+        if unsupported is not None:
+            status["unsupported"] = unsupported
+        return status
+    status.update({"enabled": True, "running": True})
+    return status
+
+# Worker side, run with ``python -m beets_worker <socket path>``
+
+# The worker drives beets through private internals that are not a stable
+# API. They were checked against beets 1.6.0 up to 2.10; 2.11 changed the
+# signatures of _raw_main and later _setup. Dockerfile and requirements.txt
+# pin that range, and any other beets runs commands as new processes.
+BEETS_UI_INTERNALS = ("SubcommandsOptionParser", "UserError", "_setup", "_raw_main")
+BEETS_LIBRARY_INTERNALS = ("_close", "_connections")
+
+def _takes_lib(func):
+    try:
+        return "lib" in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+def _load_beets():
+    """Import beets and its plugins and open the library once.
+
+    Uses the same setup as the ``beet`` command line. The library's SQLite
+    connection is closed again, since forked children must open their own.
+    Raises RuntimeError if beets lacks the internals the worker relies on.
+    """
+    try:
+        from beets import ui
+    except ImportError as e:
+        raise RuntimeError(f"Cannot import beets: {str(e)}")
+    missing = [f"ui.{name}" for name in BEETS_UI_INTERNALS if not hasattr(ui, name)]
+    missing += [f"ui.{name}(lib)" for name in ("_setup", "_raw_main")
+                if hasattr(ui, name) and not _takes_lib(getattr(ui, name))]
+    if missing:
+        raise RuntimeError(f"Unsupported beets version, missing {', '.join(missing)}")
+    options, _ = ui.SubcommandsOptionParser().parse_global_options([])
+    _, _, lib = ui._setup(options)
+    missing = [f"Library.{name}" for name in BEETS_LIBRARY_INTERNALS if not hasattr(lib, name)]
+    if missing:
+        raise RuntimeError(f"Unsupported beets version, missing {', '.join(missing)}")
+    lib._close()
+    return ui, lib
+
+# Connections inherited from the worker, kept referenced so they are never
+# closed (and never touch the database) in a forked child
+_inherited_connections = []
+
+def _detach_inherited_connections(lib):
+    connections = getattr(lib, "_connections", None)
+    if connections:
+        _inherited_connections.extend(connections.values())
+        connections.clear()
+
+def _run_command(ui, lib, args):
+    """Run a beets command in a forked child and return its exit code."""
+    try:
+        ui._raw_main(list(args), lib)
+        return 0
+    except ui.UserError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        return e.code if isinstance(e.code, int) else 1
+    except KeyboardInterrupt:
+        return 1
+    except Exception:
+        traceback.print_exc()
+        return 1
+
+def _fork_command(ui, lib, server, request, fds):
+    """Fork a child running one command with the client's descriptors as stdout/stderr."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid:
+        return pid
+
+    returncode = 1
+    try:
+        server.close()
+        os.setsid()
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(fds[0], 1)
+        os.dup2(fds[1], 2)
+        try:
+            os.chdir(request.get("cwd") or "/")
+        except OSError:
+            pass
+        _detach_inherited_connections(lib)
+        returncode = _run_command(ui, lib, request["args"])
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        os._exit(returncode)
+
+def serve(socket_path):
+    """Serve beets commands on a Unix socket until idle or the config changes."""
+    logging.basicConfig(level=logging.INFO)
+    # Only one worker may serve the socket
+    lock = open(_worker_lock_path(), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        logger.info("Another beets worker is already running")
+        return
+
+    signature = get_beets_signature()
+    started = time.time()
+    try:
+        ui, lib = _load_beets()
+    except RuntimeError as e:
+        # Clients run commands as new processes until beets or its config change
+        logger.error(f"Not starting beets worker: {str(e)}")
+        _unsupported_path().write_text(f"{signature!r}\n{str(e)}\n")
+        return
+    try:
+        os.remove(_unsupported_path())
+    except FileNotFoundError:
+        pass
+    logger.info(f"Beets loaded in {time.time() - started:.2f}s")
+
+    # Bind under a temporary name so clients never see a half-ready socket
+    tmp_path = f"{socket_path}.{os.getpid()}"
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(tmp_path)
+    server.listen(16)
+    os.replace(tmp_path, socket_path)
+
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ)
+    children = {}
+    commands_run = 0
+    last_request = time.time()
+    restart = False
+    server_closed = False
+    last_check = 0.0
+
+    while True:
+        # Report finished commands to their clients
+        while children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            conn = children.pop(pid, None)
+            if conn is not None:
+                try:
+                    conn.sendall(json.dumps({"returncode": os.waitstatus_to_exitcode(status)}).encode("utf-8") + b"\n")
+                except OSError:
+                    pass
+                conn.close()
+
+        if not restart and time.time() - last_check >= 1:
+            last_check = time.time()
+            if get_beets_signature() != signature:
+                logger.info("Beets config changed, restarting worker")
+                restart = True
+            elif not children and time.time() - last_request > BEETS_WORKER_IDLE:
+                logger.info("Beets worker idle, exiting")
+                break
+        if restart:
+            if not server_closed:
+                # Stop taking commands; the new worker binds the socket again
+                selector.unregister(server)
+                server.close()
+                server_closed = True
+            if not children:
+                break
+            # Let running commands finish before restarting
+            time.sleep(0.1)
+            continue
+
+        for _ in selector.select(timeout=0.05):
+            conn, _ = server.accept()
+            last_request = time.time()
+            try:
+                conn.settimeout(BEETS_WORKER_CONNECT_TIMEOUT)
+                message, fds, _, _ = socket.recv_fds(conn, 65536, 2)
+                request = json.loads(message.split(b"\n", 1)[0])
+                if request.get("op") == "status":
+                    conn.sendall(json.dumps({
+                        "pid": os.getpid(),
+                        "started": started,
+                        "commands_run": commands_run,
+                        "active_commands": len(children),
+                    }).encode("utf-8") + b"\n")
+                    conn.close()
+                    continue
+                if request.get("op") == "kill":
+                    # Only unreaped children, so the pid cannot belong to another process yet
+                    killed = request.get("pid") in children
+                    if killed:
+                        try:
+                            os.killpg(request["pid"], signal.SIGKILL)
+                        except ProcessLookupError:
+                            # Not its own group yet (before setsid), so nothing spawned either
+                            os.kill(request["pid"], signal.SIGKILL)
+                    conn.sendall(json.dumps({"killed": killed}).encode("utf-8") + b"\n")
+                    conn.close()
+                    continue
+                if len(fds) != 2:
+                    raise ValueError("Expected stdout and stderr descriptors")
+                pid = _fork_command(ui, lib, server, request, fds)
+                for fd in fds:
+                    os.close(fd)
+                commands_run += 1
+                children[pid] = conn
+                conn.sendall(json.dumps({"pid": pid}).encode("utf-8") + b"\n")
+            except (OSError, ValueError) as e:
+                if getattr(e, "errno", None) != errno.EPIPE:
+                    logger.error(f"Error handling beets worker request: {str(e)}")
+                conn.close()
+
+    try:
+        if os.path.exists(socket_path) and not restart:
+            os.remove(socket_path)
+    finally:
+        lock.close()
+    if restart:
+        # Start over with the new configuration
+        os.execv(sys.executable, [sys.executable, "-m", "beets_worker", socket_path])
+
+if __name__ == "__main__":
+    serve(sys.argv[1])
@@ -0,0 +1,572 @@
+import os
+import sys
+import json
+import time
+import bisect
+import logging
+import threading
+from collections import OrderedDict
+from beets_utils import (
+    connect_db, format_item, parse_sort_spec, format_sort_spec, encode_cursor,
+    decode_cursor, LIBRARY_SORT_FIELDS, LIBRARY_ITEM_COLUMNS, MAX_PAGE_SIZE
+)
+from sidecar import get_library_version
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Set to 0 to keep the snapshot out of memory even when NumPy is installed
+COLUMNAR_SNAPSHOT = os.environ.get("COLUMNAR_SNAPSHOT", "1") != "0"
+
+# Sort order kept ready after every refresh; others are built on first use
+SNAPSHOT_DEFAULT_SORT = "artist,album,disc,track"
+
+# Sort permutations kept per snapshot, least recently used dropped first
+SNAPSHOT_MAX_SORTS = 8
+
+# Rows read from SQLite per step while loading
+SNAPSHOT_BATCH_SIZE = 50000
+
+# A refresh reloads everything when more than this share of items changed
+SNAPSHOT_RELOAD_SHARE = 0.25
+
+# Text columns are stored as codes into a string pool, the others as arrays
+# of this type with NULL stored as 0, the value LIBRARY_SORT_FIELDS sorts it as
+TEXT_COLUMNS = ["title", "artist", "album", "albumartist", "format"]
+NUMBER_COLUMNS = {
+    "year": "int32",
+    "disc": "int32",
+    "track": "int32",
+    "bitrate": "int32",
+    "album_id": "int32",
+    "length": "float64",
+    "added": "float64",
+}
+
+# Fields the aggregate endpoint accepts ranges for
+RANGE_FIELDS = [field for field in NUMBER_COLUMNS if field in LIBRARY_SORT_FIELDS]
+
+_ITEM_FIELDS = [field.strip() for field in LIBRARY_ITEM_COLUMNS.split(",")]
+_SELECT = f"SELECT id, IFNULL(mtime, 0), {', '.join(TEXT_COLUMNS + list(NUMBER_COLUMNS))} FROM items"
+
+_lock = threading.Lock()
+_refresh_thread = None
+_snapshot = None
+# Sort orders requests asked for that the refresh thread should build
+_pending_sorts = set()
+
+def snapshot_available():
+    """Return True if NumPy is installed and the snapshot is enabled."""
+    return np is not None and COLUMNAR_SNAPSHOT
+
+def _number(value):
+    if value is None:
+        return 0
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0
+
+class _StringPool:
+    """Interned values of a text column and their order as SQL sorts them."""
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+        self._ranks = None
+        self._keys = None
+
+    def copy(self):
+        return _StringPool(self.values)
+
+    def intern(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+            self._ranks = None
+        return code
+
+    @staticmethod
+    def sort_key(value):
+        # IFNULL(column, '') with the BINARY collation, which orders like Python
+        return value if isinstance(value, str) else "" if value is None else str(value)
+
+    def ranks(self):
+        """Get every code's position among the distinct sort keys."""
+        if self._ranks is None:
+            keys = sorted({self.sort_key(value) for value in self.values})
+            positions = {key: position for position, key in enumerate(keys)}
+            self._ranks = np.array([positions[self.sort_key(value)] for value in self.values], dtype=np.int32)
+            self._keys = keys
+        return self._ranks
+
+    def rank_of(self, value):
+        """Get the rank of any value, halfway between its neighbours if it is not in the pool."""
+        self.ranks()
+        position = bisect.bisect_left(self._keys, value)
+        if position < len(self._keys) and self._keys[position] == value:
+            return position
+        return position - 0.5
+
+    def nbytes(self):
+        return (sys.getsizeof(self.values) + sys.getsizeof(self.codes)
+                + sum(sys.getsizeof(value) for value in self.values))
+
+def _columns_from_rows(rows, pools):
+    """Turn rows of _SELECT into column arrays and NULL masks."""
+    count = len(rows)
+    values = list(zip(*rows)) or [()] * (2 + len(TEXT_COLUMNS) + len(NUMBER_COLUMNS))
+    columns = {
+        "id": np.array(values[0], dtype=np.int64),
+        "mtime": np.array([_number(value) for value in values[1]], dtype=np.float64),
+    }
+    nulls = {}
+    for name, column in zip(TEXT_COLUMNS, values[2:]):
+        intern = pools[name].intern
+        columns[name] = np.fromiter((intern(value) for value in column), dtype=np.int32, count=count)
+    for name, column in zip(NUMBER_COLUMNS, values[2 + len(TEXT_COLUMNS):]):
+        columns[name] = np.array([_number(value) for value in column], dtype=NUMBER_COLUMNS[name])
+        nulls[name] = np.fromiter((value is None for value in column), dtype=bool, count=count)
+    return columns, nulls
+
+def _concat(parts):
+    columns = {name: np.concatenate([part[0][name] for part in parts]) for name in parts[0][0]}
+    nulls = {name: np.concatenate([part[1][name] for part in parts]) for name in parts[0][1]}
+    return columns, nulls
+
+class LibrarySnapshot:
+    """The library items of one library version as NumPy columns, ordered by id.
+
+    Sort orders are answered from permutations of the rows, built with one
+    lexsort each, and cursors are found by binary search, so a page costs
+    the same at any position and for any sort order.
+    """
+
+    def __init__(self, version, columns, nulls, pools):
+        self.version = version
+        self.columns = columns
+        # Only columns that have NULLs keep their mask
+        self.nulls = {name: mask for name, mask in nulls.items() if mask.any()}
+        self.pools = pools
+        self.perms = OrderedDict()
+        self._sort_keys = {}
+        self.loaded_at = time.time()
+        # Items read again by the refresh that made this snapshot, None after a full load
+        self.changed = None
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    @classmethod
+    def load(cls, conn, version):
+        """Read every item from the database."""
+        pools = {name: _StringPool() for name in TEXT_COLUMNS}
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(f"{_SELECT} ORDER BY id")
+        parts = []
+        while True:
+            rows = cursor.fetchmany(SNAPSHOT_BATCH_SIZE)
+            if not rows:
+                break
+            parts.append(_columns_from_rows(rows, pools))
+        if not parts:
+            parts.append(_columns_from_rows([], pools))
+        columns, nulls = _concat(parts)
+        return cls(version, columns, nulls, pools)
+
+    def updated(self, conn, version):
+        """Get a snapshot of the current library, reading only items whose mtime changed.
+
+        Returns None when so much changed that loading everything is cheaper.
+        """
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute("SELECT id, IFNULL(mtime, 0) FROM items ORDER BY id")
+        current = np.fromiter(cursor, dtype=[("id", np.int64), ("mtime", np.float64)])
+        ids, mtimes = current["id"], current["mtime"]
+
+        old_ids = self.columns["id"]
+        positions = np.minimum(np.searchsorted(ids, old_ids), max(len(ids) - 1, 0))
+        if len(ids):
+            unchanged = (ids[positions] == old_ids) & (mtimes[positions] == self.columns["mtime"])
+        else:
+            unchanged = np.zeros(len(old_ids), dtype=bool)
+        kept = np.flatnonzero(unchanged)
+        fresh_ids = np.setdiff1d(ids, old_ids[kept], assume_unique=True)
+        if len(fresh_ids) > SNAPSHOT_RELOAD_SHARE * max(len(ids), 1):
+            return None
+
+        pools = {name: pool.copy() for name, pool in self.pools.items()}
+        nulls = {name: self.nulls[name][kept] if name in self.nulls else np.zeros(len(kept), dtype=bool)
+                 for name in NUMBER_COLUMNS}
+        parts = [({name: column[kept] for name, column in self.columns.items()}, nulls)]
+        for start in range(0, len(fresh_ids), SNAPSHOT_BATCH_SIZE):
+            batch = fresh_ids[start:start + SNAPSHOT_BATCH_SIZE].tolist()
+            rows = cursor.execute(
+                f"{_SELECT} WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(batch),)
+            ).fetchall()
+            if rows:
+                parts.append(_columns_from_rows(rows, pools))
+        columns, nulls = _concat(parts)
+        order = np.argsort(columns["id"], kind="stable")
+        columns = {name: column[order] for name, column in columns.items()}
+        nulls = {name: mask[order] for name, mask in nulls.items()}
+        snapshot = LibrarySnapshot(version, columns, nulls, pools)
+        snapshot.changed = len(fresh_ids)
+        return snapshot
+
+    def _sort_key(self, field):
+        """Get the column as LIBRARY_SORT_FIELDS orders it: text by rank, NULL as 0."""
+        key = self._sort_keys.get(field)
+        if key is None:
+            if field in self.pools:
+                key = self.pools[field].ranks()[self.columns[field]]
+            else:
+                key = self.columns[field]
+            self._sort_keys[field] = key
+        return key
+
+    def build_sort(self, keys):
+        """Compute and keep the row permutation for parsed sort keys."""
+        spec = format_sort_spec(keys)
+        if spec in self.perms:
+            return
+        # lexsort sorts by the last key first; the id breaks ties, ascending
+        columns = [self.columns["id"]]
+        for field, descending in reversed(keys):
+            key = self._sort_key(field)
+            columns.append(-key if descending else key)
+        perm = np.lexsort(columns).astype(np.int32)
+        with _lock:
+            self.perms[spec] = perm
+            # The default order stays; the least recently used other one goes
+            evictable = [name for name in self.perms if name != SNAPSHOT_DEFAULT_SORT]
+            for name in evictable[:max(len(self.perms) - SNAPSHOT_MAX_SORTS, 0)]:
+                del self.perms[name]
+
+    def get_perm(self, keys):
+        with _lock:
+            perm = self.perms.get(format_sort_spec(keys))
+            if perm is not None:
+                self.perms.move_to_end(format_sort_spec(keys))
+            return perm
+
+    def _row_key(self, keys, row):
+        key = tuple(-self._sort_key(field)[row] if descending else self._sort_key(field)[row]
+                    for field, descending in keys)
+        return key + (self.columns["id"][row],)
+
+    def cursor_key(self, keys, values):
+        """Turn the sort values and id of a cursor into a key comparable with _row_key()."""
+        key = []
+        for (field, descending), value in zip(keys, values):
+            if field in self.pools:
+                value = self.pools[field].rank_of(_StringPool.sort_key(value))
+            else:
+                value = _number(value)
+            key.append(-value if descending else value)
+        return tuple(key) + (values[-1],)
+
+    def bisect(self, perm, keys, target, right=False):
+        """Find the first position in perm whose row sorts after (or at, unless right) target."""
+        low, high = 0, len(perm)
+        while low < high:
+            middle = (low + high) // 2
+            key = self._row_key(keys, perm[middle])
+            if key < target or (right and key == target):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _values(self, field, rows):
+        """Get a column's values for rows as SQL returns them, NULLs included."""
+        if field in self.pools:
+            values = self.pools[field].values
+            return [values[code] for code in self.columns[field][rows].tolist()]
+        values = self.columns[field][rows].tolist()
+        if field in self.nulls:
+            return [None if null else value for value, null in zip(values, self.nulls[field][rows].tolist())]
+        return values
+
+    def sort_values(self, keys, rows):
+        """Get the sort values and ids of rows as get_library_page() selects them, for cursors."""
+        columns = []
+        for field, _ in keys:
+            if field in self.pools:
+                columns.append([_StringPool.sort_key(value) for value in self._values(field, rows)])
+            else:
+                columns.append(self.columns[field][rows].tolist())
+        columns.append(self.columns["id"][rows].tolist())
+        return [list(values) for values in zip(*columns)]
+
+    def items(self, rows):
+        """Get rows with the LIBRARY_ITEM_COLUMNS fields, like format_item() gets them from SQL."""
+        columns = [self._values(field, rows) for field in _ITEM_FIELDS]
+        return [format_item(dict(zip(_ITEM_FIELDS, values))) for values in zip(*columns)]
+
+    def aggregate(self, by, ranges):
+        """Count items and total length per value of a field, within ranges of numeric fields."""
+        mask = np.ones(len(self), dtype=bool)
+        for field, (low, high) in ranges.items():
+            if low is not None:
+                mask &= self.columns[field] >= low
+            if high is not None:
+                mask &= self.columns[field] <= high
+        lengths = self.columns["length"][mask]
+        if by in self.pools:
+            pool = self.pools[by]
+            ranks = pool.ranks()[self.columns[by][mask]]
+            counts = np.bincount(ranks, minlength=len(pool._keys))
+            totals = np.bincount(ranks, weights=lengths, minlength=len(pool._keys))
+            keys = pool._keys
+            present = np.flatnonzero(counts)
+        else:
+            keys, inverse = np.unique(self.columns[by][mask], return_inverse=True)
+            counts = np.bincount(inverse, minlength=len(keys))
+            totals = np.bincount(inverse, weights=lengths, minlength=len(keys))
+            keys = keys.tolist()
+            present = range(len(keys))
+        return [{"key": keys[i], "count": int(counts[i]), "length": float(totals[i])} for i in present]
+
+    def nbytes(self):
+        """Estimate the memory the snapshot uses."""
+        arrays = list(self.columns.values()) + list(self.nulls.values()) + list(self._sort_keys.values())
+        with _lock:
+            perms = list(self.perms.values())
+        return {
+            "columns": sum(array.nbytes for array in arrays),
+            "sorts": sum(perm.nbytes for perm in perms),
+            "strings": sum(pool.nbytes() for pool in self.pools.values()),
+        }
+
+def _refresh():
+    """Bring the snapshot up to date and build the requested sort orders, until none are left."""
+    global _snapshot, _refresh_thread
+    default_keys = parse_sort_spec(SNAPSHOT_DEFAULT_SORT)
+    try:
+        while True:
+            version = get_library_version()
+            with _lock:
+                snapshot = _snapshot
+                sorts = set(_pending_sorts)
+                _pending_sorts.clear()
+                if snapshot is not None and snapshot.version == version and not sorts:
+                    _refresh_thread = None
+                    return
+
+            if snapshot is None or snapshot.version != version:
+                started = time.time()
+                conn = connect_db()
+                try:
+                    fresh = snapshot.updated(conn, version) if snapshot is not None else None
+                    if fresh is None:
+                        fresh = LibrarySnapshot.load(conn, version)
+                finally:
+                    conn.close()
+                # Keep the sort orders in use ready before the new snapshot is served
+                if snapshot is not None:
+                    with _lock:
+                        sorts |= set(snapshot.perms)
+                fresh.build_sort(default_keys)
+                for spec in sorts:
+                    fresh.build_sort(parse_sort_spec(spec))
+                with _lock:
+                    _snapshot = fresh
+                if fresh.changed is None:
+                    logger.info(f"Library snapshot of {len(fresh)} items loaded in {time.time() - started:.2f}s")
+                else:
+                    logger.info(f"Library snapshot updated with {fresh.changed} changed items "
+                                f"in {time.time() - started:.2f}s")
+            else:
+                for spec in sorts:
+                    snapshot.build_sort(parse_sort_spec(spec))
+    except Exception as e:
+        logger.error(f"Error building library snapshot: {str(e)}")
+        with _lock:
+            _refresh_thread = None
+
+def _start_refresh(spec=None):
+    global _refresh_thread
+    with _lock:
+        if spec:
+            _pending_sorts.add(spec)
+        if _refresh_thread is None:
+            _refresh_thread = threading.Thread(target=_refresh, daemon=True, name="library-snapshot")
+            _refresh_thread.start()
+
+def warm_library_snapshot():
+    """Load the snapshot in the background if it is available."""
+    if snapshot_available():
+        _start_refresh()
+
+def _current_snapshot(keys=None):
+    """Get the snapshot if it matches the library version and has the sort order ready.
+
+    Otherwise starts what is missing in the background and returns None, so
+    the caller answers from SQL meanwhile.
+    """
+    if not snapshot_available():
+        return None
+    version = get_library_version()
+    with _lock:
+        snapshot = _snapshot
+    spec = format_sort_spec(keys) if keys else None
+    if snapshot is None or snapshot.version != version:
+        _start_refresh(spec)
+        return None
+    if keys and snapshot.get_perm(keys) is None:
+        _start_refresh(spec)
+        return None
+    return snapshot
+
+def get_snapshot_page(limit=50, sort='artist', cursor=None, order='asc'):
+    """Get the same page as get_library_page() from the snapshot.
+
+    Returns None when the snapshot cannot answer yet.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    keys = parse_sort_spec(sort, order)
+    values, direction = decode_cursor(cursor, keys) if cursor else (None, 'after')
+    snapshot = _current_snapshot(keys)
+    if snapshot is None:
+        return None
+
+    perm = snapshot.get_perm(keys)
+    if perm is None:
+        # Dropped for another sort order since
+        return None
+    if values is None:
+        start = 0
+    elif direction == 'after':
+        start = snapshot.bisect(perm, keys, snapshot.cursor_key(keys, values), right=True)
+    else:
+        stop = snapshot.bisect(perm, keys, snapshot.cursor_key(keys, values))
+        start = max(stop - limit, 0)
+    if direction == 'after':
+        stop = start + limit
+        has_more = len(perm) - start > limit
+    else:
+        has_more = stop > limit
+    rows = perm[start:stop]
+
+    items = snapshot.items(rows)
+    boundaries = snapshot.sort_values(keys, rows)
+    if direction == 'after':
+        has_next, has_prev = has_more, cursor is not None
+    else:
+        has_next, has_prev = True, has_more
+
+    return {
+        "items": items,
+        "sort": format_sort_spec(keys),
+        "next_cursor": encode_cursor(keys, boundaries[-1], 'after') if items and has_next else None,
+        "prev_cursor": encode_cursor(keys, boundaries[0], 'before') if items and has_prev else None,
+    }
+
+def get_snapshot_items(page=1, limit=50, sort='artist', order='asc'):
+    """Get the same items as get_library_items() from the snapshot, or None."""
+    keys = parse_sort_spec(sort, order)
+    snapshot = _current_snapshot(keys)
+    if snapshot is None:
+        return None
+    perm = snapshot.get_perm(keys)
+    if perm is None:
+        return None
+    offset = max((page - 1) * limit, 0)
+    return snapshot.items(perm[offset:offset + limit])
+
+def parse_range_filters(args):
+    """Read ``field=low..high`` ranges (either end optional) or ``field=value`` from request arguments."""
+    ranges = {}
+    for field in RANGE_FIELDS:
+        value = args.get(field)
+        if value is None:
+            continue
+        low, separator, high = value.partition("..")
+        if not separator:
+            high = low
+        try:
+            ranges[field] = (float(low) if low else None, float(high) if high else None)
+        except ValueError:
+            raise ValueError(f"Invalid range for {field}: {value}")
+    return ranges
+
+def aggregate_library(by, ranges=None):
+    """Count items and their total length per value of a field.
+
+    ``ranges`` maps numeric fields to ``(low, high)`` bounds, either of
+    which may be None. Answered from the snapshot when it is up to date,
+    otherwise with a grouped query.
+    """
+    ranges = ranges or {}
+    if by not in LIBRARY_SORT_FIELDS:
+        raise ValueError(f"Cannot group by {by}")
+    unknown = [field for field in ranges if field not in RANGE_FIELDS]
+    if unknown:
+        raise ValueError(f"Ranges are not supported for: {', '.join(unknown)}")
+
+    snapshot = _current_snapshot()
+    if snapshot is not None:
+        groups = snapshot.aggregate(by, ranges)
+    else:
+        conditions, params = [], []
+        for field, (low, high) in ranges.items():
+            if low is not None:
+                conditions.append(f"{LIBRARY_SORT_FIELDS[field]} >= ?")
+                params.append(low)
+            if high is not None:
+                conditions.append(f"{LIBRARY_SORT_FIELDS[field]} <= ?")
+                params.append(high)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        conn = connect_db()
+        try:
+            rows = conn.execute(f"""
+                SELECT {LIBRARY_SORT_FIELDS[by]} AS key, COUNT(*) AS count, TOTAL(length) AS length
+                FROM items {where}
+                GROUP BY 1
+                ORDER BY 1
+            """, params).fetchall()
+        finally:
+            conn.close()
+        groups = [dict(row) for row in rows]
+    return {
+        "by": by,
+        "groups": groups,
+        "total": sum(group["count"] for group in groups),
+        "engine": "snapshot" if snapshot is not None else "sql",
+    }
+
+def get_snapshot_stats():
+    """Get the state and memory footprint of the snapshot."""
+    with _lock:
+        snapshot = _snapshot
+        refreshing = _refresh_thread is not None
+    stats = {
+        "available": np is not None,
+        "enabled": COLUMNAR_SNAPSHOT,
+        "refreshing": refreshing,
+        "loaded": snapshot is not None,
+    }
+    if snapshot is not None:
+        with _lock:
+            sorts = list(snapshot.perms)
+        memory = snapshot.nbytes()
+        stats.update({
+            "items": len(snapshot),
+            "current": snapshot.version == get_library_version(),
+            "loaded_at": snapshot.loaded_at,
+            "changed": snapshot.changed,
+            "sorts": sorts,
+            "memory": {**memory, "total": sum(memory.values())},
+        })
+    return stats
@@ -0,0 +1,245 @@
+import os
+import json
+import mmap
+import time
+import uuid
+import shlex
+import logging
+import subprocess
+from array import array
+from beets_utils import BEET_EXECUTABLE
+from sidecar import get_cache_dir
+from command_stream import COMMAND_TIMEOUT
+from beets_worker import start_beets_process, kill_beets_process
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Disk space all spooled command results may use together
+COMMAND_RESULTS_MAX_MB = int(os.environ.get("COMMAND_RESULTS_MAX_MB", "1024"))
+
+# Seconds a spooled result is kept after the command finished
+COMMAND_RESULT_TTL = int(os.environ.get("COMMAND_RESULT_TTL", "86400"))
+
+# Lines returned inline with a finished command; the rest is fetched in pages
+COMMAND_INLINE_LINES = 500
+
+# Most lines served by one page request
+MAX_RESULT_LINES = 10000
+
+STREAMS = ("stdout", "stderr")
+
+# Line offsets are written to the index in batches of this many entries
+_INDEX_BATCH = 65536
+
+def get_command_results_dir():
+    """Get the directory holding spooled command output."""
+    results_dir = get_cache_dir() / "command_results"
+    results_dir.mkdir(parents=True, exist_ok=True)
+    return results_dir
+
+def _is_result_id(result_id):
+    return len(result_id) == 32 and all(c in "0123456789abcdef" for c in result_id)
+
+def _data_path(result_id, stream):
+    return get_command_results_dir() / f"{result_id}.{stream}"
+
+def _index_path(result_id, stream):
+    return get_command_results_dir() / f"{result_id}.{stream}.idx"
+
+def _meta_path(result_id):
+    return get_command_results_dir() / f"{result_id}.json"
+
+def build_line_index(data_path, index_path):
+    """Write the byte offset of every line start in a file, plus its end offset.
+
+    The index is a flat array of native unsigned 64-bit integers, so line ``n``
+    spans ``index[n]:index[n + 1]``. Returns the number of lines.
+    """
+    size = os.path.getsize(data_path)
+    lines = 0
+    with open(index_path, "wb") as index:
+        offsets = array("Q", [0])
+        if size:
+            with open(data_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                pos = data.find(b"\n")
+                while pos != -1:
+                    offsets.append(pos + 1)
+                    lines += 1
+                    if len(offsets) >= _INDEX_BATCH:
+                        offsets.tofile(index)
+                        offsets = array("Q")
+                    pos = data.find(b"\n", pos + 1)
+                # A last line without a trailing newline still counts
+                if data[size - 1:size] != b"\n":
+                    offsets.append(size)
+                    lines += 1
+        offsets.tofile(index)
+    return lines
+
+def read_result_lines(result_id, stream="stdout", start=0, count=1000):
+    """Read a range of lines from a spooled result without loading the rest.
+
+    Returns ``None`` if the result does not exist, otherwise the lines and the
+    total line count of the stream.
+    """
+    if not _is_result_id(result_id) or stream not in STREAMS:
+        return None
+    meta = get_command_result(result_id)
+    if meta is None:
+        return None
+    total = meta["lines"][stream]
+    start = max(start, 0)
+    end = min(start + max(min(count, MAX_RESULT_LINES), 0), total)
+    if start >= end:
+        return {"lines": [], "start": start, "total": total}
+
+    itemsize = array("Q").itemsize
+    with open(_index_path(result_id, stream), "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as index:
+        offsets = array("Q")
+        offsets.frombytes(index[start * itemsize:(end + 1) * itemsize])
+    with open(_data_path(result_id, stream), "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        chunk = data[offsets[0]:offsets[-1]]
+
+    base = offsets[0]
+    lines = [
+        chunk[offsets[i] - base:offsets[i + 1] - base].rstrip(b"\r\n").decode("utf-8", errors="replace")
+        for i in range(len(offsets) - 1)
+    ]
+    return {"lines": lines, "start": start, "total": total}
+
+def get_command_result(result_id):
+    """Get the metadata of a spooled result, or None if it expired."""
+    if not _is_result_id(result_id):
+        return None
+    try:
+        with open(_meta_path(result_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def delete_command_result(result_id):
+    """Delete a spooled result's files. Returns False if it did not exist."""
+    if not _is_result_id(result_id):
+        return False
+    found = False
+    paths = [_meta_path(result_id)]
+    for stream in STREAMS:
+        paths += [_data_path(result_id, stream), _index_path(result_id, stream)]
+    for path in paths:
+        try:
+            os.remove(path)
+            found = True
+        except FileNotFoundError:
+            pass
+    return found
+
+def _result_size(result_id):
+    size = 0
+    for stream in STREAMS:
+        for path in (_data_path(result_id, stream), _index_path(result_id, stream)):
+            try:
+                size += os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+    return size
+
+def expire_command_results(keep=None):
+    """Delete expired results, then the oldest ones while over the disk quota.
+
+    The result named by ``keep`` is never deleted. Returns how many were removed.
+    """
+    results = []
+    now = time.time()
+    removed = 0
+    for meta_path in get_command_results_dir().glob("*.json"):
+        result_id = meta_path.stem
+        try:
+            finished = meta_path.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        if result_id != keep and now - finished > COMMAND_RESULT_TTL:
+            removed += delete_command_result(result_id)
+            continue
+        results.append((finished, result_id, _result_size(result_id)))
+
+    # Output of commands that never finished, e.g. because the app was restarted
+    for data_path in get_command_results_dir().glob("*.stdout"):
+        result_id = data_path.name.split(".")[0]
+        if result_id != keep and not _meta_path(result_id).exists():
+            try:
+                if now - data_path.stat().st_mtime > COMMAND_RESULT_TTL:
+                    removed += delete_command_result(result_id)
+            except FileNotFoundError:
+                pass
+
+    total = sum(size for _, _, size in results)
+    budget = COMMAND_RESULTS_MAX_MB * 1024 * 1024
+    for _, result_id, size in sorted(results):
+        if total <= budget:
+            break
+        if result_id == keep:
+            continue
+        removed += delete_command_result(result_id)
+        total -= size
+    if removed:
+        logger.info(f"Expired {removed} spooled command results")
+    return removed
+
+def run_spooled_command(command, timeout=None):
+    """Run a beets command with its output spooled to disk.
+
+    beet writes straight into the spool files, so the app never holds the
+    output in memory. Returns the result metadata (handle, line counts, return
+    code) with the first lines of each stream inline.
+    """
+    cmd = [BEET_EXECUTABLE] + shlex.split(command)
+    if len(cmd) == 1:
+        raise ValueError("No command provided")
+    timeout = timeout or COMMAND_TIMEOUT
+    result_id = uuid.uuid4().hex
+    started = time.time()
+    timed_out = False
+
+    with open(_data_path(result_id, "stdout"), "wb") as stdout, \
+            open(_data_path(result_id, "stderr"), "wb") as stderr:
+        proc = start_beets_process(cmd[1:], stdout=stdout, stderr=stderr)
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            kill_beets_process(proc)
+            proc.wait()
+
+    lines = {stream: build_line_index(_data_path(result_id, stream), _index_path(result_id, stream))
+             for stream in STREAMS}
+    meta = {
+        "result_id": result_id,
+        "command": command,
+        "returncode": proc.returncode,
+        "success": proc.returncode == 0 and not timed_out,
+        "timed_out": timed_out,
+        "lines": lines,
+        "bytes": {stream: os.path.getsize(_data_path(result_id, stream)) for stream in STREAMS},
+        "elapsed": round(time.time() - started, 3),
+        "created": started,
+    }
+    # The metadata file appears last, so a readable result is always complete
+    tmp_path = _meta_path(result_id).with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, _meta_path(result_id))
+
+    try:
+        expire_command_results(keep=result_id)
+    except Exception as e:
+        logger.error(f"Error expiring command results: {str(e)}")
+
+    result = dict(meta)
+    for stream in STREAMS:
+        page = read_result_lines(result_id, stream, 0, COMMAND_INLINE_LINES)
+        result[stream] = "".join(line + "\n" for line in page["lines"])
+    result["truncated"] = any(lines[stream] > COMMAND_INLINE_LINES for stream in STREAMS)
+    return result
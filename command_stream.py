@@ -0,0 +1,156 @@
+import os
+import re
+import json
+import time
+import uuid
+import shlex
+import signal
+import logging
+import selectors
+import subprocess
+from beets_utils import BEET_EXECUTABLE
+from sidecar import get_cache_dir
+from beets_worker import start_beets_process
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Seconds a streamed command may run before it is killed
+COMMAND_TIMEOUT = int(os.environ.get("COMMAND_TIMEOUT", "600"))
+
+# Largest chunk read from a pipe at once; one frame never holds more than this
+COMMAND_READ_SIZE = 65536
+
+_RUN_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+def get_command_run_dir():
+    """Get the directory holding the pid files of running commands."""
+    run_dir = get_cache_dir() / "commands"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    return run_dir
+
+def _pid_path(run_id):
+    return get_command_run_dir() / f"{run_id}.pid"
+
+def _cancel_path(run_id):
+    return get_command_run_dir() / f"{run_id}.cancel"
+
+def _kill_group(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+def cancel_command(run_id):
+    """Kill a streamed command's process group from any app process.
+
+    Returns False if no command with that run id is running.
+    """
+    if not _RUN_ID_RE.match(run_id):
+        return False
+    try:
+        with open(_pid_path(run_id)) as f:
+            pid = int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return False
+    # Tell the streaming request why its process went away
+    _cancel_path(run_id).touch()
+    logger.info(f"Cancelling command {run_id} (pid {pid})")
+    _kill_group(pid)
+    return True
+
+def _frame(frame):
+    return json.dumps(frame) + "\n"
+
+def stream_beets_command(command, timeout=None):
+    """Run a beets command, streaming its output as newline-delimited JSON frames.
+
+    The first frame carries the run id used to cancel the command. Output
+    follows as ``stdout``/``stderr`` frames holding the complete lines read so
+    far, and a final ``status`` frame reports the return code and wall time.
+    Pipes are only read when the client takes the next frame, so a slow client
+    makes beet block on its output instead of the app buffering it. If the
+    client goes away the process group is killed.
+    """
+    # Parse before streaming starts so bad quoting is still a plain error
+    cmd = [BEET_EXECUTABLE] + shlex.split(command)
+    if len(cmd) == 1:
+        raise ValueError("No command provided")
+    return _stream(cmd, command, timeout or COMMAND_TIMEOUT)
+
+def _stream(cmd, command, timeout):
+    run_id = uuid.uuid4().hex
+    started = time.time()
+
+    try:
+        proc = start_beets_process(cmd[1:], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        logger.error(f"Error starting command: {str(e)}")
+        yield _frame({"type": "status", "run_id": run_id, "returncode": None, "success": False,
+                      "error": str(e), "timed_out": False, "cancelled": False, "elapsed": 0})
+        return
+    pid_path = _pid_path(run_id)
+    pid_path.write_text(str(proc.pid))
+    logger.info(f"Streaming command {run_id}: {' '.join(cmd)}")
+
+    selector = selectors.DefaultSelector()
+    selector.register(proc.stdout, selectors.EVENT_READ, "stdout")
+    selector.register(proc.stderr, selectors.EVENT_READ, "stderr")
+    partial = {"stdout": b"", "stderr": b""}
+    timed_out = False
+    try:
+        yield _frame({"type": "start", "run_id": run_id, "command": command})
+
+        while selector.get_map():
+            remaining = timeout - (time.time() - started)
+            if remaining <= 0:
+                timed_out = True
+                _kill_group(proc.pid)
+                break
+            for key, _ in selector.select(timeout=min(remaining, 1.0)):
+                stream = key.data
+                data = os.read(key.fileobj.fileno(), COMMAND_READ_SIZE)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    data, partial[stream] = partial[stream], b""
+                    if not data:
+                        continue
+                else:
+                    data = partial[stream] + data
+                    cut = data.rfind(b"\n") + 1
+                    if cut == 0 and len(data) < COMMAND_READ_SIZE:
+                        # Wait for the rest of the line
+                        partial[stream] = data
+                        continue
+                    if cut:
+                        data, partial[stream] = data[:cut], data[cut:]
+                    else:
+                        partial[stream] = b""
+                text = data.decode("utf-8", errors="replace")
+                yield _frame({"type": stream, "lines": text.splitlines()})
+
+        returncode = proc.wait()
+        cancelled = _cancel_path(run_id).exists()
+        yield _frame({
+            "type": "status",
+            "run_id": run_id,
+            "returncode": returncode,
+            "success": returncode == 0 and not timed_out and not cancelled,
+            "timed_out": timed_out,
+            "cancelled": cancelled,
+            "elapsed": round(time.time() - started, 3),
+        })
+    finally:
+        # Also reached when the client disconnects and the generator is closed
+        if proc.poll() is None:
+            logger.info(f"Killing command {run_id} after the client went away")
+            _kill_group(proc.pid)
+            proc.wait()
+        selector.close()
+        proc.stdout.close()
+        proc.stderr.close()
+        for path in (pid_path, _cancel_path(run_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,328 @@
+import os
+import json
+import time
+import logging
+import threading
+from beets_utils import (
+    connect_db, format_item, parse_sort_spec,
+    LIBRARY_SORT_FIELDS, LIBRARY_ITEM_COLUMNS, MAX_PAGE_SIZE
+)
+from sidecar import (
+    connect_sidecar, connect_sidecar_read, get_sync_state, set_sync_state,
+    get_read_signature, collect_item_changes, SidecarSync
+)
+from library_stats import BITRATE_BUCKET_KBPS, BITRATE_MAX_KBPS
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between two incremental syncs triggered by requests
+FACET_SYNC_INTERVAL = float(os.environ.get("FACET_SYNC_INTERVAL", "2"))
+
+# Facet name -> facet_items column and how it is computed from lib.items
+FACETS = {
+    "format": ("format", "IFNULL(i.format, '')"),
+    "bitrate": ("bitrate_bucket", f"""CASE WHEN IFNULL(i.bitrate, 0) <= 0 THEN 0
+        ELSE MIN(CAST(i.bitrate / 1000 AS INTEGER) / {BITRATE_BUCKET_KBPS} * {BITRATE_BUCKET_KBPS}, {BITRATE_MAX_KBPS}) END"""),
+    "samplerate": ("samplerate", "IFNULL(i.samplerate, 0)"),
+    "year": ("year", "IFNULL(i.year, 0)"),
+    "genre": ("genre", "IFNULL(i.genre, '')"),
+    "label": ("label", "IFNULL(i.label, '')"),
+}
+NUMERIC_FACETS = {"bitrate", "samplerate", "year"}
+
+# Further columns the library can be sorted by (see LIBRARY_SORT_FIELDS)
+SORT_COLUMNS = ["artist", "albumartist", "album", "title", "added", "disc", "track", "length", "bitrate"]
+
+# Largest share of items a filter may match for its cube index to be used
+CUBE_INDEX_MAX_SHARE = 0.5
+
+_CUBE_COLUMNS = [column for column, _ in FACETS.values()]
+
+# Sort fields whose facet column is stored without NULLs, so its index can serve the order
+_SORT_EXPRESSIONS = {"year": "year", "format": "format"}
+
+# Sort keys facet_items_default_order is built for
+DEFAULT_ORDER = [("artist", False), ("album", False), ("disc", False), ("track", False)]
+
+_sync_lock = threading.Lock()
+# (facets_built, counts) of the unfiltered facet counts
+_unfiltered_counts = (None, None)
+
+def _create_schema(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS facet_items (
+            id INTEGER PRIMARY KEY,
+            mtime REAL,
+            {", ".join(_CUBE_COLUMNS + SORT_COLUMNS)}
+        )
+    """)
+    for column in _CUBE_COLUMNS:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS facet_items_{column} ON facet_items ({column})")
+    # Serves the library's default order without sorting
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS facet_items_default_order ON facet_items
+        (IFNULL(artist, ''), IFNULL(album, ''), IFNULL(disc, 0), IFNULL(track, 0), id)
+    """)
+    # Number of items per combination of facet values, far fewer rows than items
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS facet_cube (
+            {", ".join(f"{column} NOT NULL" for column in _CUBE_COLUMNS)},
+            count INTEGER NOT NULL,
+            PRIMARY KEY ({", ".join(_CUBE_COLUMNS)})
+        ) WITHOUT ROWID
+    """)
+    # One covering index led by each facet, so every facet's counts are read
+    # in group order instead of being sorted
+    for column in _CUBE_COLUMNS[1:]:
+        others = [other for other in _CUBE_COLUMNS if other != column]
+        conn.execute(f"""
+            CREATE INDEX IF NOT EXISTS facet_cube_{column}
+            ON facet_cube ({column}, {", ".join(others)}, count)
+        """)
+
+def _apply_to_cube(conn, id_table, sign):
+    """Add (sign=1) or subtract (sign=-1) the facet_items rows listed in id_table, or all rows."""
+    columns = ", ".join(_CUBE_COLUMNS)
+    where = f"WHERE id IN (SELECT id FROM {id_table})" if id_table else ""
+    # WHERE true keeps the parser from reading ON CONFLICT as a join
+    conn.execute(f"""
+        INSERT INTO facet_cube ({columns}, count)
+        SELECT * FROM (
+            SELECT {columns}, {sign} * COUNT(*) FROM main.facet_items {where} GROUP BY {columns}
+        ) WHERE true
+        ON CONFLICT ({columns}) DO UPDATE SET count = count + excluded.count
+    """)
+
+def sync_facets():
+    """Bring facet_items and the facet count cube up to date with the library.
+
+    Only items added, modified or deleted since the last sync are touched.
+    """
+    with _sync_lock:
+        signature = get_read_signature()
+        started = time.time()
+        conn = connect_sidecar(attach_library=True)
+        try:
+            _create_schema(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                changed, deleted = collect_item_changes(conn, "facet_items")
+                if changed or deleted:
+                    first_run = conn.execute("SELECT 1 FROM facet_items LIMIT 1").fetchone() is None
+                    conn.execute("CREATE TEMP TABLE stale_facet_items AS SELECT id FROM temp.changed_items UNION ALL SELECT id FROM temp.deleted_items")
+                    _apply_to_cube(conn, "temp.stale_facet_items", -1)
+                    conn.execute("DELETE FROM facet_items WHERE id IN (SELECT id FROM temp.stale_facet_items)")
+                    conn.execute(f"""
+                        INSERT INTO facet_items (id, mtime, {", ".join(_CUBE_COLUMNS + SORT_COLUMNS)})
+                        SELECT i.id, i.mtime, {", ".join([expression for _, expression in FACETS.values()] + [f"i.{column}" for column in SORT_COLUMNS])}
+                        FROM lib.items i
+                        JOIN temp.changed_items c ON c.id = i.id
+                    """)
+                    _apply_to_cube(conn, None if first_run else "temp.changed_items", 1)
+                    conn.execute("DELETE FROM facet_cube WHERE count <= 0")
+                    conn.execute("DROP TABLE temp.stale_facet_items")
+                    if first_run:
+                        # Give the planner statistics to choose between the facet indexes
+                        conn.execute("ANALYZE facet_items")
+                        conn.execute("ANALYZE facet_cube")
+                conn.execute("DROP TABLE IF EXISTS temp.changed_items")
+                conn.execute("DROP TABLE IF EXISTS temp.deleted_items")
+                if changed or deleted or not get_sync_state(conn, "facets_built"):
+                    # Also the version the cached unfiltered counts are kept for
+                    set_sync_state(conn, "facets_built", time.time())
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+        _syncer.mark_synced(signature)
+        elapsed = time.time() - started
+        if changed or deleted:
+            logger.info(f"Facets synced: {changed} changed, {deleted} deleted items in {elapsed:.2f}s")
+        return {"changed": changed, "deleted": deleted, "elapsed": round(elapsed, 3)}
+
+_syncer = SidecarSync("facets", sync_facets, "facets_built", FACET_SYNC_INTERVAL)
+
+def ensure_facets():
+    """Make sure the facets are usable, syncing them in the background if the library changed.
+
+    Returns False while the initial build is still running.
+    """
+    return _syncer.ensure()
+
+def parse_facet_filters(args):
+    """Read facet filters from request arguments.
+
+    Every facet takes one or more values (``format=FLAC&format=MP3``); the year
+    also takes a range with ``year_min`` and ``year_max``.
+    """
+    filters = {}
+    for name in FACETS:
+        values = args.getlist(name)
+        if values:
+            filters[name] = [int(value) for value in values] if name in NUMERIC_FACETS else values
+    year_range = [args.get("year_min", type=int), args.get("year_max", type=int)]
+    if any(value is not None for value in year_range):
+        filters["year_range"] = year_range
+    return filters
+
+def _filter_clause(filters, exclude=None):
+    conditions, params = [], []
+    for name, values in filters.items():
+        if name == "year_range":
+            if exclude == "year":
+                continue
+            low, high = values
+            if low is not None:
+                conditions.append("year >= ?")
+                params.append(low)
+            if high is not None:
+                conditions.append("year <= ?")
+                params.append(high)
+        elif name != exclude:
+            column = FACETS[name][0]
+            conditions.append(f"{column} IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(values))
+    return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), params
+
+def _facet_counts(conn, name, where="", params=(), hint=""):
+    column = FACETS[name][0]
+    order = column if name in NUMERIC_FACETS else "count DESC, value"
+    return [
+        {"value": row[0], "count": row[1]}
+        for row in conn.execute(f"""
+            SELECT {column} AS value, SUM(count) AS count
+            FROM facet_cube {hint} {where}
+            GROUP BY {column}
+            ORDER BY {order}
+        """, params)
+    ]
+
+def _unfiltered_facet_counts(conn):
+    """Get every facet's counts without filters, cached until the facets change."""
+    global _unfiltered_counts
+    version = get_sync_state(conn, "facets_built")
+    cached_version, counts = _unfiltered_counts
+    if counts is None or cached_version != version:
+        counts = {name: _facet_counts(conn, name) for name in FACETS}
+        _unfiltered_counts = (version, counts)
+    return counts
+
+def _filter_shares(filters, unfiltered, everything):
+    """Estimate the share of items each filtered facet lets through."""
+    shares = {}
+    for key, values in filters.items():
+        if key == "year_range":
+            low, high = values
+            matching = sum(
+                entry["count"] for entry in unfiltered["year"]
+                if (low is None or entry["value"] >= low) and (high is None or entry["value"] <= high)
+            )
+            name = "year"
+        else:
+            wanted = set(values)
+            matching = sum(entry["count"] for entry in unfiltered[key] if entry["value"] in wanted)
+            name = key
+        shares[name] = min(shares.get(name, 1.0), matching / everything if everything else 0.0)
+    return shares
+
+def _cube_hint(shares, exclude=None):
+    """Point the cube query at the index of its most selective filter.
+
+    The planner has no estimate for json_each() lists and otherwise scans
+    the whole cube in group order, which is slow when few rows match.
+    """
+    candidates = [(share, name) for name, share in shares.items() if name != exclude]
+    if not candidates:
+        return ""
+    share, name = min(candidates)
+    column = FACETS[name][0]
+    # The primary key already leads with the first facet
+    if share > CUBE_INDEX_MAX_SHARE or column == _CUBE_COLUMNS[0]:
+        return ""
+    return f"INDEXED BY facet_cube_{column}"
+
+def _order_index(sort_keys):
+    """Get the facet_items index that returns rows in the given order, if any."""
+    if sort_keys == DEFAULT_ORDER:
+        return "facet_items_default_order"
+    if len(sort_keys) == 1 and sort_keys[0][0] in _SORT_EXPRESSIONS:
+        # Single column indexes end with the id, which breaks the ties
+        return f"facet_items_{sort_keys[0][0]}"
+    return None
+
+def browse_library(filters, page=1, limit=50, sort='artist,album,disc,track'):
+    """Get a page of items matching the facet filters, and the facet counts.
+
+    Each facet's counts apply all filters except the facet's own, so they
+    show how many items every choice would leave. Counts come from the
+    precomputed facet_cube; items from the indexed facet_items table.
+    Returns ``{"building": True}`` until the facets have been built.
+    """
+    if not ensure_facets():
+        return {"building": True}
+
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    offset = (max(page, 1) - 1) * limit
+    conn = connect_sidecar_read()
+    try:
+        unfiltered = _unfiltered_facet_counts(conn)
+        everything = sum(entry["count"] for entry in unfiltered["format"])
+        shares = _filter_shares(filters, unfiltered, everything)
+        facets = {}
+        for name in FACETS:
+            where, params = _filter_clause(filters, exclude=name)
+            if where:
+                facets[name] = _facet_counts(conn, name, where, params, _cube_hint(shares, exclude=name))
+            else:
+                facets[name] = unfiltered[name]
+        where, params = _filter_clause(filters)
+        # Same ordering as the library view, on facet_items' copy of the sort columns
+        sort_keys = parse_sort_spec(sort)
+        order = ", ".join(
+            f"{_SORT_EXPRESSIONS.get(field, LIBRARY_SORT_FIELDS[field])} {'DESC' if descending else 'ASC'}"
+            for field, descending in sort_keys
+        ) + ", id"
+        total = everything
+        if where:
+            total = conn.execute(f"SELECT TOTAL(count) FROM facet_cube {_cube_hint(shares)} {where}", params).fetchone()[0]
+        hint = ""
+        order_index = _order_index(sort_keys)
+        if where and order_index:
+            # The planner cannot know how many rows match; walking the index
+            # in sort order is cheap when matches are common, sorting them when rare
+            if total and (offset + limit + 1) * everything / total < total * 4:
+                hint = f"INDEXED BY {order_index}"
+        ids = [row[0] for row in conn.execute(f"""
+            SELECT id FROM facet_items {hint} {where}
+            ORDER BY {order}
+            LIMIT ? OFFSET ?
+        """, params + [limit + 1, offset])]
+    finally:
+        conn.close()
+
+    items = []
+    if ids[:limit]:
+        conn = connect_db()
+        try:
+            rows = conn.execute(f"""
+                SELECT {LIBRARY_ITEM_COLUMNS}
+                FROM items
+                WHERE id IN (SELECT value FROM json_each(?))
+            """, (json.dumps(ids[:limit]),)).fetchall()
+        finally:
+            conn.close()
+        by_id = {row["id"]: row for row in rows}
+        items = [format_item(by_id[item_id]) for item_id in ids[:limit] if item_id in by_id]
+
+    return {
+        "building": False,
+        "stale": _syncer.stale(),
+        "items": items,
+        "has_more": len(ids) > limit,
+        "total": int(total),
+        "facets": facets,
+    }
@@ -0,0 +1,454 @@
+import os
+import json
+import time
+import signal
+import logging
+import threading
+import subprocess
+from beets_utils import BEET_EXECUTABLE, connect_beets_db
+from sidecar import get_cache_dir, connect_sidecar
+from beets_worker import start_beets_process
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Imports allowed to run at the same time, across all app processes
+IMPORT_WORKERS = int(os.environ.get("IMPORT_WORKERS", "1"))
+
+# Finished jobs (and their logs) kept in the history
+IMPORT_HISTORY_LIMIT = int(os.environ.get("IMPORT_HISTORY_LIMIT", "200"))
+
+# Seconds between progress updates of a running import
+IMPORT_POLL_INTERVAL = 1.0
+
+# A running job whose heartbeat is older than this belongs to a dead process
+IMPORT_STALE_AFTER = 30
+
+# Seconds to wait for beet to exit after SIGTERM before killing it
+IMPORT_KILL_TIMEOUT = 10
+
+# Every open event stream holds a worker thread: streams end after this many
+# seconds so EventSource reconnects (with Last-Event-ID), and only this many
+# are open per worker process at a time
+IMPORT_EVENT_STREAM_SECONDS = 300
+IMPORT_EVENT_MAX_STREAMS = int(os.environ.get("IMPORT_EVENT_MAX_STREAMS", "2"))
+
+AUDIO_EXTENSIONS = {
+    ".mp3", ".flac", ".m4a", ".mp4", ".aac", ".ogg", ".oga", ".opus", ".wav",
+    ".aiff", ".aif", ".ape", ".wv", ".wma", ".mpc", ".alac", ".dsf",
+}
+
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled", "interrupted")
+
+# Import log tags of albums beets left out of the library
+SKIPPED_LOG_TAGS = {"skip", "duplicate-skip"}
+
+_dispatcher_lock = threading.Lock()
+_dispatcher_thread = None
+# Import processes of the jobs this process runs, by job id
+_running_lock = threading.Lock()
+_running = {}
+_streams_lock = threading.Lock()
+_open_streams = 0
+
+def get_import_log_dir():
+    """Get the directory holding the output of import jobs."""
+    log_dir = get_cache_dir() / "import_logs"
+    log_dir.mkdir(parents=True, exist_ok=True)
+    return log_dir
+
+def _output_path(job_id):
+    return get_import_log_dir() / f"{job_id}.out"
+
+def _beets_log_path(job_id):
+    return get_import_log_dir() / f"{job_id}.beets.log"
+
+def _create_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL,
+            options TEXT NOT NULL DEFAULT '{}',
+            status TEXT NOT NULL,
+            created REAL NOT NULL,
+            started REAL,
+            finished REAL,
+            updated REAL,
+            owner_pid INTEGER,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            returncode INTEGER,
+            albums_total INTEGER,
+            albums_done INTEGER NOT NULL DEFAULT 0,
+            error TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS import_jobs_status ON import_jobs (status, id)")
+
+def _connect():
+    conn = connect_sidecar()
+    _create_tables(conn)
+    return conn
+
+def count_album_directories(path):
+    """Estimate how many albums an import will process.
+
+    beets groups files into albums by directory, so this counts directories
+    that directly contain audio files.
+    """
+    if os.path.isfile(path):
+        return 1
+    total = 0
+    for _, _, files in os.walk(path):
+        if any(os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS for name in files):
+            total += 1
+    return total
+
+def build_import_command(job_id, path, options):
+    """Build the non-interactive ``beet import`` command line for a job."""
+    cmd = [BEET_EXECUTABLE, "import", "-q", "-l", str(_beets_log_path(job_id))]
+    if not options.get("autotag", True):
+        # Import as-is, using existing tags
+        cmd.append("-A")
+    cmd.append(path)
+    return cmd
+
+def _job_to_dict(row):
+    job = dict(row)
+    job["options"] = json.loads(job["options"] or "{}")
+    now = time.time()
+    if job["status"] == "running" and job["updated"] and now - job["updated"] > IMPORT_STALE_AFTER:
+        job["status"] = "interrupted"
+    start = job["started"]
+    end = job["finished"] or (now if job["status"] == "running" else None)
+    job["elapsed"] = round(end - start, 1) if start and end else 0
+    if job["albums_total"] is not None:
+        job["albums_remaining"] = max(job["albums_total"] - job["albums_done"], 0)
+    else:
+        job["albums_remaining"] = None
+    job["albums_per_minute"] = round(job["albums_done"] / job["elapsed"] * 60, 2) if job["elapsed"] else 0
+    return job
+
+def enqueue_import(path, autotag=True):
+    """Queue an import job for a path and return it."""
+    if not path or not os.path.exists(path):
+        raise ValueError(f"Path does not exist: {path}")
+    conn = _connect()
+    try:
+        job_id = conn.execute("""
+            INSERT INTO import_jobs (path, options, status, created)
+            VALUES (?, ?, 'queued', ?)
+        """, (path, json.dumps({"autotag": bool(autotag)}), time.time())).lastrowid
+        row = conn.execute("SELECT * FROM import_jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    logger.info(f"Queued import job {job_id} for {path}")
+    start_import_dispatcher()
+    return _job_to_dict(row)
+
+def get_import_job(job_id):
+    """Get an import job with its progress, or None if it does not exist."""
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM import_jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return _job_to_dict(row) if row else None
+
+def list_import_jobs(limit=50):
+    """List the most recent import jobs, newest first."""
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT * FROM import_jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    finally:
+        conn.close()
+    return [_job_to_dict(row) for row in rows]
+
+def cancel_import_job(job_id):
+    """Cancel a queued job, or ask the process running it to stop.
+
+    Returns the updated job, or None if it does not exist.
+    """
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("""
+            UPDATE import_jobs SET status = 'cancelled', finished = ?
+            WHERE id = ? AND status = 'queued'
+        """, (time.time(), job_id))
+        conn.execute("UPDATE import_jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    return get_import_job(job_id)
+
+def retry_import_job(job_id):
+    """Queue a finished job again with the same path and options."""
+    job = get_import_job(job_id)
+    if job is None:
+        return None
+    if job["status"] not in FINISHED_STATUSES:
+        raise ValueError(f"Import job {job_id} is still {job['status']}")
+    return enqueue_import(job["path"], job["options"].get("autotag", True))
+
+def read_import_output(job_id, offset=0, max_bytes=65536):
+    """Read part of a job's output log starting at a byte offset.
+
+    Returns the text and the offset to continue reading from.
+    """
+    try:
+        with open(_output_path(job_id), "rb") as f:
+            f.seek(offset)
+            data = f.read(max_bytes)
+    except FileNotFoundError:
+        return "", offset
+    # Don't split a multi-byte character between two reads
+    cut = len(data)
+    if cut == max_bytes:
+        while cut > 0 and (data[cut - 1] & 0xC0) == 0x80:
+            cut -= 1
+        if cut > 0 and data[cut - 1] >= 0xC0:
+            cut -= 1
+        cut = cut or len(data)
+    return data[:cut].decode("utf-8", errors="replace"), offset + cut
+
+def _claim_next_job(conn):
+    """Atomically take the oldest queued job if a worker slot is free."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        now = time.time()
+        # Jobs whose process died are not running anymore
+        conn.execute("""
+            UPDATE import_jobs SET status = 'interrupted', finished = ?, error = 'App stopped during import'
+            WHERE status = 'running' AND updated < ?
+        """, (now, now - IMPORT_STALE_AFTER))
+        running = conn.execute("SELECT COUNT(*) FROM import_jobs WHERE status = 'running'").fetchone()[0]
+        if running >= IMPORT_WORKERS:
+            conn.execute("COMMIT")
+            return None
+        row = conn.execute("SELECT * FROM import_jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute("""
+            UPDATE import_jobs SET status = 'running', started = ?, updated = ?, owner_pid = ?
+            WHERE id = ?
+        """, (now, now, os.getpid(), row["id"]))
+        conn.execute("COMMIT")
+        return row
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def _last_album_id():
+    """Get the highest album id in beets' database, 0 if it has none."""
+    try:
+        # The replica may not have caught up with a running import yet
+        conn = connect_beets_db()
+    except FileNotFoundError:
+        return 0
+    try:
+        return conn.execute("SELECT IFNULL(MAX(id), 0) FROM albums").fetchone()[0]
+    finally:
+        conn.close()
+
+def _count_imported_albums(after_id):
+    """Count albums added since the highest album id was ``after_id``.
+
+    beets gives new albums ids above every existing one. Imports running at
+    the same time (another job, or ``beet import`` outside the app) cannot
+    be told apart, so their albums count too.
+    """
+    try:
+        conn = connect_beets_db()
+    except FileNotFoundError:
+        return 0
+    try:
+        return conn.execute("SELECT COUNT(*) FROM albums WHERE id > ?", (after_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+def _count_skipped_albums(job_id):
+    """Count albums the importer skipped, from its import log.
+
+    Each log line starts with a tag for what happened to an album's paths,
+    e.g. ``skip`` or ``duplicate-skip``; the other tags mean it was imported.
+    """
+    try:
+        with open(_beets_log_path(job_id), "r", errors="replace") as f:
+            return sum(1 for line in f if line.split(" ", 1)[0] in SKIPPED_LOG_TAGS)
+    except FileNotFoundError:
+        return 0
+
+def _stop_process(proc):
+    """Terminate an import's whole process group."""
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=IMPORT_KILL_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.wait()
+    except ProcessLookupError:
+        pass
+
+def _run_job(row):
+    job_id = row["id"]
+    options = json.loads(row["options"] or "{}")
+    # Registered before the slow directory walk so the heartbeat covers it
+    with _running_lock:
+        _running[job_id] = None
+    conn = _connect()
+    try:
+        albums_total = count_album_directories(row["path"])
+        conn.execute("UPDATE import_jobs SET albums_total = ? WHERE id = ?", (albums_total, job_id))
+
+        cmd = build_import_command(job_id, row["path"], options)
+        # Albums above this id are the job's
+        last_album_id = _last_album_id()
+        logger.info(f"Running import job {job_id}: {' '.join(cmd)}")
+        with open(_output_path(job_id), "ab") as output:
+            output.write(f"> {' '.join(cmd)}\n".encode("utf-8"))
+            output.flush()
+            # A new session lets cancellation kill beet and anything it spawned
+            proc = start_beets_process(cmd[1:], stdout=output, stderr=subprocess.STDOUT)
+        with _running_lock:
+            _running[job_id] = proc
+
+        cancelled = False
+        while proc.poll() is None:
+            time.sleep(IMPORT_POLL_INTERVAL)
+            done = _count_imported_albums(last_album_id) + _count_skipped_albums(job_id)
+            conn.execute("UPDATE import_jobs SET albums_done = ?, updated = ? WHERE id = ?",
+                         (done, time.time(), job_id))
+            cancel = conn.execute("SELECT cancel_requested FROM import_jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            if cancel and not cancelled:
+                logger.info(f"Cancelling import job {job_id}")
+                cancelled = True
+                _stop_process(proc)
+
+        done = _count_imported_albums(last_album_id) + _count_skipped_albums(job_id)
+        if cancelled:
+            status = "cancelled"
+        else:
+            status = "succeeded" if proc.returncode == 0 else "failed"
+        conn.execute("""
+            UPDATE import_jobs
+            SET status = ?, returncode = ?, albums_done = ?, finished = ?, updated = ?
+            WHERE id = ?
+        """, (status, proc.returncode, done, time.time(), time.time(), job_id))
+        logger.info(f"Import job {job_id} {status} with return code {proc.returncode}")
+    except Exception as e:
+        logger.error(f"Error running import job {job_id}: {str(e)}")
+        conn.execute("""
+            UPDATE import_jobs SET status = 'failed', error = ?, finished = ?, updated = ?
+            WHERE id = ?
+        """, (str(e), time.time(), time.time(), job_id))
+    finally:
+        with _running_lock:
+            _running.pop(job_id, None)
+        conn.close()
+
+def _prune_history(conn):
+    """Delete the oldest finished jobs and their logs beyond the history limit."""
+    placeholders = ", ".join("?" for _ in FINISHED_STATUSES)
+    rows = conn.execute(f"""
+        SELECT id FROM import_jobs
+        WHERE status IN ({placeholders})
+        ORDER BY id DESC LIMIT -1 OFFSET ?
+    """, (*FINISHED_STATUSES, IMPORT_HISTORY_LIMIT)).fetchall()
+    for row in rows:
+        for path in (_output_path(row["id"]), _beets_log_path(row["id"])):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        conn.execute("DELETE FROM import_jobs WHERE id = ?", (row["id"],))
+
+def _heartbeat(conn):
+    """Keep the jobs this process runs from looking abandoned."""
+    with _running_lock:
+        job_ids = list(_running)
+    if job_ids:
+        placeholders = ", ".join("?" for _ in job_ids)
+        conn.execute(f"UPDATE import_jobs SET updated = ? WHERE id IN ({placeholders})",
+                     (time.time(), *job_ids))
+
+def _dispatch_forever():
+    conn = None
+    last_prune = 0
+    while True:
+        try:
+            if conn is None:
+                conn = _connect()
+            _heartbeat(conn)
+            row = _claim_next_job(conn)
+            if row is not None:
+                threading.Thread(target=_run_job, args=(row,), daemon=True,
+                                 name=f"import-{row['id']}").start()
+                continue
+            if time.time() - last_prune > 3600:
+                _prune_history(conn)
+                last_prune = time.time()
+        except Exception as e:
+            logger.error(f"Error dispatching import jobs: {str(e)}")
+            if conn is not None:
+                conn.close()
+                conn = None
+        time.sleep(IMPORT_POLL_INTERVAL)
+
+def start_import_dispatcher():
+    """Start the background thread that runs queued import jobs."""
+    global _dispatcher_thread
+    with _dispatcher_lock:
+        if _dispatcher_thread is None or not _dispatcher_thread.is_alive():
+            _dispatcher_thread = threading.Thread(target=_dispatch_forever, daemon=True,
+                                                  name="import-dispatcher")
+            _dispatcher_thread.start()
+
+def claim_import_stream():
+    """Reserve one of the IMPORT_EVENT_MAX_STREAMS streams; False if all are open."""
+    global _open_streams
+    with _streams_lock:
+        if _open_streams >= IMPORT_EVENT_MAX_STREAMS:
+            return False
+        _open_streams += 1
+        return True
+
+def release_import_stream():
+    """Free a stream reserved with claim_import_stream()."""
+    global _open_streams
+    with _streams_lock:
+        _open_streams -= 1
+
+def stream_import_events(job_id, offset=0):
+    """Yield Server-Sent Events with a job's output and progress until it ends.
+
+    Each output chunk carries its log offset as the event id, so a reconnecting
+    EventSource resumes where it left off via Last-Event-ID. A stream ends
+    after IMPORT_EVENT_STREAM_SECONDS, without a ``done`` event, to be reopened.
+    """
+    last_progress = None
+    ends = time.time() + IMPORT_EVENT_STREAM_SECONDS
+    while time.time() < ends:
+        job = get_import_job(job_id)
+        if job is None:
+            yield f"event: error\ndata: {json.dumps({'error': 'Import job not found'})}\n\n"
+            return
+
+        while True:
+            text, new_offset = read_import_output(job_id, offset)
+            if not text:
+                break
+            offset = new_offset
+            yield f"id: {offset}\nevent: output\ndata: {json.dumps({'text': text})}\n\n"
+
+        progress = json.dumps(job)
+        if progress != last_progress:
+            last_progress = progress
+            yield f"event: progress\ndata: {progress}\n\n"
+
+        if job["status"] in FINISHED_STATUSES:
+            yield f"event: done\ndata: {progress}\n\n"
+            return
+        # Comment lines keep proxies from closing an idle stream
+        yield ": keep-alive\n\n"
+        time.sleep(IMPORT_POLL_INTERVAL)
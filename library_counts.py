@@ -0,0 +1,129 @@
+import json
+import time
+import logging
+import threading
+from beets_utils import connect_db
+from sidecar import (
+    connect_sidecar, connect_sidecar_read, get_sync_state, set_sync_state,
+    get_read_signature, get_library_version
+)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_refresh_thread = None
+_counts = None
+_counts_version = None
+
+def compute_library_counts():
+    """Count items, albums, artists and items per format with full scans."""
+    started = time.time()
+    conn = connect_db()
+    try:
+        formats = {}
+        for row in conn.execute("SELECT IFNULL(format, '') AS format, COUNT(*) FROM items GROUP BY 1"):
+            formats[row[0] or "Unknown"] = formats.get(row[0] or "Unknown", 0) + row[1]
+        artists = conn.execute("SELECT COUNT(DISTINCT artist) FROM items WHERE artist != ''").fetchone()[0]
+        albumartists = conn.execute(
+            "SELECT COUNT(DISTINCT albumartist) FROM albums WHERE albumartist != ''"
+        ).fetchone()[0]
+        albums = conn.execute("SELECT COUNT(*) FROM albums").fetchone()[0]
+    finally:
+        conn.close()
+    counts = {
+        "items": sum(formats.values()),
+        "albums": albums,
+        "artists": artists,
+        "albumartists": albumartists,
+        "formats": dict(sorted(formats.items(), key=lambda entry: -entry[1])),
+        "computed_at": time.time(),
+        "elapsed": round(time.time() - started, 3),
+    }
+    logger.info(f"Counted {counts['items']} items in {counts['elapsed']}s")
+    return counts
+
+def _load_saved_counts(signature):
+    """Get counts saved by any app process for this exact database state."""
+    try:
+        conn = connect_sidecar_read()
+    except FileNotFoundError:
+        return None
+    try:
+        saved = get_sync_state(conn, "library_counts")
+    except Exception:
+        return None
+    finally:
+        conn.close()
+    if saved:
+        saved = json.loads(saved)
+        if saved.get("signature") == signature:
+            return saved["counts"]
+    return None
+
+def _save_counts(signature, counts):
+    conn = connect_sidecar()
+    try:
+        set_sync_state(conn, "library_counts", json.dumps({"signature": signature, "counts": counts}))
+    finally:
+        conn.close()
+
+def _refresh(version):
+    global _counts, _counts_version, _refresh_thread
+    try:
+        signature = get_read_signature()
+        counts = _load_saved_counts(signature)
+        if counts is None:
+            counts = compute_library_counts()
+            _save_counts(signature, counts)
+        with _lock:
+            _counts, _counts_version = counts, version
+    except Exception as e:
+        logger.error(f"Error counting library: {str(e)}")
+    finally:
+        _refresh_thread = None
+
+def _start_refresh(version):
+    global _refresh_thread
+    with _lock:
+        if _refresh_thread is None:
+            _refresh_thread = threading.Thread(target=_refresh, args=(version,), daemon=True,
+                                               name="library-counts")
+            _refresh_thread.start()
+
+def warm_library_counts():
+    """Load or compute the counts in the background."""
+    _start_refresh(get_library_version())
+
+def get_library_counts(wait=False):
+    """Get the library counts without scanning on the request path.
+
+    Counts are recomputed only when the library version changes. Until the
+    new counts are ready the previous ones are returned with ``stale`` set.
+    Only the very first call of a process may have to wait for a count, or
+    a background thread that passes ``wait`` to get the current counts.
+    """
+    version = get_library_version()
+    with _lock:
+        counts, counts_version = _counts, _counts_version
+    if counts is not None and counts_version == version:
+        return {**counts, "stale": False}
+
+    if counts is None or wait:
+        # Nothing to fall back to yet, wait for the first count. A running
+        # refresh may be for an older version, then one more is needed.
+        for _ in range(2):
+            _start_refresh(version)
+            thread = _refresh_thread
+            if thread is not None:
+                thread.join()
+            with _lock:
+                counts, counts_version = _counts, _counts_version
+            if counts_version == version:
+                break
+        if counts is None:
+            raise RuntimeError("Library counts are not available")
+        return {**counts, "stale": counts_version != version}
+
+    _start_refresh(version)
+    return {**counts, "stale": True}
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import logging
+import threading
+from sidecar import get_library_signature, get_library_version
+from replica import sync_replica, replica_in_use, connect_replica_read
+from library_counts import get_library_counts
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Seconds between two checks of beets' database for writes
+LIBRARY_WATCH_INTERVAL = float(os.environ.get("LIBRARY_WATCH_INTERVAL", "1"))
+
+# A burst of writes (an import, a large `beet modify`) becomes one event once
+# the database has been quiet for an interval, or after this many seconds
+LIBRARY_EVENT_MAX_DELAY = 5.0
+
+# Item ids listed per event; larger changes only say that the library changed
+LIBRARY_EVENT_MAX_IDS = 500
+
+# Seconds between keep-alive comments, and before a stream ends so the
+# browser reconnects (with Last-Event-ID) and frees the worker thread for a moment
+LIBRARY_EVENT_KEEPALIVE = 15
+LIBRARY_EVENT_STREAM_SECONDS = 300
+
+# Every open stream holds a worker thread, so only this many per worker
+# process; further pages are told to retry later and keep working without
+LIBRARY_EVENT_MAX_STREAMS = int(os.environ.get("LIBRARY_EVENT_MAX_STREAMS", "4"))
+
+_condition = threading.Condition()
+_watch_thread = None
+# Position of the library after the last published change:
+# {"id", "epoch", "floor", "seq", "version", "counts"}
+_state = None
+_open_streams = 0
+
+def _read_state(wait=False):
+    """Read the current position of the change log and the item and album counts.
+
+    The counts are library_counts' (``wait`` for the current ones), so
+    publishing a change does not scan the library again.
+    """
+    conn = connect_replica_read()
+    if conn is not None:
+        try:
+            # One statement, so the three values come from the same sync
+            epoch, floor, seq = conn.execute("""
+                SELECT (SELECT value FROM sync_state WHERE name = 'changes_epoch'),
+                       (SELECT value FROM sync_state WHERE name = 'changes_floor'),
+                       (SELECT seq FROM sqlite_sequence WHERE name = 'item_changes')
+            """).fetchone()
+        finally:
+            conn.close()
+        floor, seq = int(floor or 0), seq or 0
+        event_id = f"{epoch}:{seq}"
+    else:
+        # Without the replica there is no change log, only the version
+        epoch, floor, seq = None, None, None
+        event_id = get_library_version()
+    counts = get_library_counts(wait=wait)
+    return {
+        "id": event_id,
+        "epoch": epoch,
+        "floor": floor,
+        "seq": seq,
+        "version": get_library_version(),
+        "counts": {"items": counts["items"], "albums": counts["albums"]},
+    }
+
+def _publish(wait=False):
+    global _state
+    state = _read_state(wait)
+    with _condition:
+        if _state is None or state["version"] != _state["version"]:
+            _state = state
+            _condition.notify_all()
+
+def _watch():
+    """Poll beets' database for writes and publish the library state after each burst."""
+    signature = get_library_signature()
+    while True:
+        time.sleep(LIBRARY_WATCH_INTERVAL)
+        try:
+            current = get_library_signature()
+            if current == signature:
+                continue
+            started = time.time()
+            while time.time() - started < LIBRARY_EVENT_MAX_DELAY:
+                time.sleep(LIBRARY_WATCH_INTERVAL)
+                latest = get_library_signature()
+                if latest == current:
+                    break
+                current = latest
+            signature = current
+            if replica_in_use():
+                sync_replica()
+            _publish(wait=True)
+        except Exception as e:
+            logger.error(f"Error watching the library for changes: {str(e)}")
+
+def _start_watcher():
+    global _watch_thread
+    with _condition:
+        if _watch_thread is not None:
+            return
+        _watch_thread = threading.Thread(target=_watch, daemon=True, name="library-watcher")
+        _watch_thread.start()
+
+def _describe_changes(since, state):
+    """Build the event for the changes between an event id and the current state."""
+    event = {"id": state["id"], "version": state["version"], "counts": state["counts"],
+             "items": None, "deleted": None, "albums": None}
+    epoch, _, seq = (since or "").rpartition(":")
+    if (state["seq"] is None or not seq.isdigit() or epoch != str(state["epoch"])
+            or int(seq) < state["floor"]):
+        # Nothing to compare with, or the log no longer covers it: the client reloads what it shows
+        return event
+
+    conn = connect_replica_read()
+    if conn is None:
+        return event
+    try:
+        rows = conn.execute("""
+            SELECT item_id, deleted, album_id, previous_album_id
+            FROM item_changes
+            WHERE seq > ? AND seq <= ?
+            LIMIT ?
+        """, (int(seq), state["seq"], LIBRARY_EVENT_MAX_IDS + 1)).fetchall()
+    finally:
+        conn.close()
+    if len(rows) <= LIBRARY_EVENT_MAX_IDS:
+        event["items"] = [row["item_id"] for row in rows if not row["deleted"]]
+        event["deleted"] = [row["item_id"] for row in rows if row["deleted"]]
+        event["albums"] = sorted({album for row in rows
+                                  for album in (row["album_id"], row["previous_album_id"]) if album})
+    return event
+
+def claim_event_stream():
+    """Reserve one of the LIBRARY_EVENT_MAX_STREAMS streams; False if all are open."""
+    global _open_streams
+    with _condition:
+        if _open_streams >= LIBRARY_EVENT_MAX_STREAMS:
+            return False
+        _open_streams += 1
+        return True
+
+def release_event_stream():
+    """Free a stream reserved with claim_event_stream()."""
+    global _open_streams
+    with _condition:
+        _open_streams -= 1
+
+def _format_event(name, data, event_id=None):
+    lines = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{lines}event: {name}\ndata: {json.dumps(data)}\n\n"
+
+def stream_library_events(last_event_id=None):
+    """Yield Server-Sent Events whenever the library changes.
+
+    The first event, ``state``, carries the current counts. Every ``change``
+    event lists the item ids changed and deleted and the albums touched
+    since the client's previous event, or null when they are too many or
+    unknown (the client should then reload what it shows). Event ids follow
+    the replica's change log, so a reconnecting EventSource gets one event
+    covering everything it missed, from any worker.
+    """
+    _start_watcher()
+    if _state is None:
+        _publish()
+    with _condition:
+        state = _state
+    yield "retry: 2000\n\n"
+    if last_event_id and last_event_id != state["id"]:
+        yield _format_event("change", _describe_changes(last_event_id, state), state["id"])
+    else:
+        yield _format_event("state", {"version": state["version"], "counts": state["counts"]}, state["id"])
+
+    ends = time.time() + LIBRARY_EVENT_STREAM_SECONDS
+    while time.time() < ends:
+        previous = state
+        with _condition:
+            _condition.wait_for(lambda: _state is not previous, timeout=LIBRARY_EVENT_KEEPALIVE)
+            state = _state
+        if state is previous:
+            # Comment lines keep proxies from closing an idle stream
+            yield ": keep-alive\n\n"
+        else:
+            yield _format_event("change", _describe_changes(previous["id"], state), state["id"])
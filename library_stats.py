@@ -0,0 +1,174 @@
+import os
+import time
+import logging
+import threading
+from sidecar import (
+    connect_sidecar, connect_sidecar_read, get_sync_state, set_sync_state,
+    get_read_signature, collect_item_changes, SidecarSync
+)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between two incremental updates triggered by requests
+STATS_SYNC_INTERVAL = float(os.environ.get("STATS_SYNC_INTERVAL", "2"))
+
+# Width of the bitrate histogram buckets in kbps, and where it ends
+BITRATE_BUCKET_KBPS = 64
+BITRATE_MAX_KBPS = 1024
+
+# What each item contributes to the statistics, computed from lib.items.
+# beets does not store file sizes, so size is estimated from bitrate and length.
+ITEM_STATS_COLUMNS = {
+    "length": "IFNULL(i.length, 0)",
+    "size": "IFNULL(i.bitrate, 0) * IFNULL(i.length, 0) / 8",
+    "format": "IFNULL(NULLIF(i.format, ''), 'Unknown')",
+    "bitrate": f"""CASE WHEN IFNULL(i.bitrate, 0) <= 0 THEN 0
+                        ELSE MIN(CAST(i.bitrate / 1000 AS INTEGER) / {BITRATE_BUCKET_KBPS} * {BITRATE_BUCKET_KBPS}, {BITRATE_MAX_KBPS}) END""",
+    "samplerate": "IFNULL(i.samplerate, 0)",
+    "year": "IFNULL(i.year, 0)",
+    "added_month": "CASE WHEN i.added > 0 THEN strftime('%Y-%m', i.added, 'unixepoch') ELSE '' END",
+}
+
+# Histograms kept in stats_buckets, by the stats_items column they group on
+STATS_DIMENSIONS = ["format", "bitrate", "samplerate", "year", "added_month"]
+
+_sync_lock = threading.Lock()
+
+def _create_schema(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS stats_items (
+            id INTEGER PRIMARY KEY,
+            mtime REAL,
+            {", ".join(ITEM_STATS_COLUMNS)}
+        )
+    """)
+    # key has no type so years and bitrates stay numbers
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stats_buckets (
+            dimension TEXT NOT NULL,
+            key,
+            count INTEGER NOT NULL,
+            length REAL NOT NULL,
+            size REAL NOT NULL,
+            PRIMARY KEY (dimension, key)
+        )
+    """)
+
+def _apply_contributions(conn, id_table, sign):
+    """Add (sign=1) or subtract (sign=-1) the stats_items rows listed in id_table, or all rows."""
+    rows = "SELECT * FROM main.stats_items"
+    if id_table:
+        rows += f" WHERE id IN (SELECT id FROM {id_table})"
+    selects = [f"SELECT 'total', '', {sign} * COUNT(*), {sign} * TOTAL(length), {sign} * TOTAL(size) FROM ({rows})"]
+    selects += [
+        f"SELECT '{dimension}', {dimension}, {sign} * COUNT(*), {sign} * TOTAL(length), {sign} * TOTAL(size) "
+        f"FROM ({rows}) GROUP BY {dimension}"
+        for dimension in STATS_DIMENSIONS
+    ]
+    for select in selects:
+        # WHERE true keeps the parser from reading ON CONFLICT as a join
+        conn.execute(f"""
+            INSERT INTO stats_buckets (dimension, key, count, length, size)
+            SELECT * FROM ({select}) WHERE true
+            ON CONFLICT (dimension, key) DO UPDATE SET
+                count = count + excluded.count,
+                length = length + excluded.length,
+                size = size + excluded.size
+        """)
+
+def sync_library_stats():
+    """Bring the statistics up to date with the beets items table.
+
+    The first run aggregates every item in one pass. Later runs subtract what
+    changed and deleted items contributed before and add what changed items
+    contribute now, so the cost depends on the number of changes only.
+    """
+    with _sync_lock:
+        signature = get_read_signature()
+        started = time.time()
+        conn = connect_sidecar(attach_library=True)
+        try:
+            _create_schema(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                changed, deleted = collect_item_changes(conn, "stats_items")
+                if changed or deleted:
+                    first_run = conn.execute("SELECT 1 FROM stats_items LIMIT 1").fetchone() is None
+                    conn.execute("CREATE TEMP TABLE stale_items AS SELECT id FROM temp.changed_items UNION ALL SELECT id FROM temp.deleted_items")
+                    _apply_contributions(conn, "temp.stale_items", -1)
+                    conn.execute("DELETE FROM stats_items WHERE id IN (SELECT id FROM temp.stale_items)")
+                    conn.execute(f"""
+                        INSERT INTO stats_items (id, mtime, {", ".join(ITEM_STATS_COLUMNS)})
+                        SELECT i.id, i.mtime, {", ".join(ITEM_STATS_COLUMNS.values())}
+                        FROM lib.items i
+                        JOIN temp.changed_items c ON c.id = i.id
+                    """)
+                    _apply_contributions(conn, None if first_run else "temp.changed_items", 1)
+                    conn.execute("DELETE FROM stats_buckets WHERE count <= 0")
+                    conn.execute("DROP TABLE temp.stale_items")
+                conn.execute("DROP TABLE IF EXISTS temp.changed_items")
+                conn.execute("DROP TABLE IF EXISTS temp.deleted_items")
+                set_sync_state(conn, "library_stats_updated", time.time())
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+        _syncer.mark_synced(signature)
+        elapsed = time.time() - started
+        if changed or deleted:
+            logger.info(f"Library stats updated for {changed} changed and {deleted} deleted items in {elapsed:.2f}s")
+        return {"changed": changed, "deleted": deleted, "elapsed": round(elapsed, 3)}
+
+_syncer = SidecarSync("library stats", sync_library_stats, "library_stats_updated", STATS_SYNC_INTERVAL)
+
+def ensure_library_stats():
+    """Make sure the stats are usable, updating them in the background if the library changed.
+
+    Returns False while the first computation is still running.
+    """
+    return _syncer.ensure()
+
+def get_library_stats():
+    """Get the library totals and the distributions of the stored aggregates.
+
+    Returns ``{"building": True}`` until the first computation has finished.
+    """
+    if not ensure_library_stats():
+        return {"building": True}
+
+    conn = connect_sidecar_read()
+    try:
+        buckets = {dimension: [] for dimension in STATS_DIMENSIONS}
+        totals = {"items": 0, "length": 0.0, "size": 0}
+        for row in conn.execute("SELECT dimension, key, count, length, size FROM stats_buckets ORDER BY dimension, key"):
+            if row["dimension"] == "total":
+                totals = {"items": row["count"], "length": row["length"], "size": int(row["size"])}
+            elif row["dimension"] in buckets:
+                buckets[row["dimension"]].append({
+                    "key": row["key"],
+                    "count": row["count"],
+                    "length": row["length"],
+                    "size": int(row["size"]),
+                })
+        updated = get_sync_state(conn, "library_stats_updated")
+    finally:
+        conn.close()
+
+    buckets["format"].sort(key=lambda bucket: -bucket["count"])
+    return {
+        "building": False,
+        "stale": _syncer.stale(),
+        "updated": float(updated),
+        "totals": totals,
+        "formats": buckets["format"],
+        "bitrates": buckets["bitrate"],
+        "bitrate_bucket_kbps": BITRATE_BUCKET_KBPS,
+        "bitrate_max_kbps": BITRATE_MAX_KBPS,
+        "samplerates": buckets["samplerate"],
+        "years": buckets["year"],
+        "added_per_month": buckets["added_month"],
+    }
@@ -0,0 +1,405 @@
+import os
+import json
+import time
+import uuid
+import base64
+import logging
+import sqlite3
+import threading
+from beets_utils import (
+    get_beets_db_path, ReadConnectionPool, DB_CACHE_SIZE_KB, DB_MMAP_SIZE
+)
+from sidecar import (
+    get_cache_dir, get_sync_state, set_sync_state,
+    get_library_signature, collect_item_changes
+)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# The replica is a copy of beets' library tables in a database of our own, so
+# reads never wait for beets' writers and we can add the indexes the UI needs.
+REPLICA_FILENAME = "library-replica.db"
+
+# Set to 0 to serve reads from beets' database directly
+LIBRARY_REPLICA = os.environ.get("LIBRARY_REPLICA", "1") != "0"
+
+# Minimum seconds between two syncs triggered by requests
+REPLICA_SYNC_INTERVAL = float(os.environ.get("REPLICA_SYNC_INTERVAL", "2"))
+
+REPLICA_TABLES = ["items", "albums", "item_attributes", "album_attributes"]
+
+# Entries kept in the change log for delta sync; clients with an older token load everything again
+CHANGE_LOG_MAX_ROWS = int(os.environ.get("CHANGE_LOG_MAX_ROWS", "200000"))
+
+# Items per batch of get_library_changes()
+CHANGES_BATCH_SIZE = 5000
+MAX_CHANGES_BATCH_SIZE = 20000
+
+# Item fields sent to clients that keep their own copy of the library: the
+# library view columns and what its sort orders need
+SYNC_ITEM_FIELDS = ["id", "title", "artist", "album", "albumartist", "year", "disc", "track",
+                    "length", "format", "bitrate", "album_id", "added"]
+
+# Indexes beets' database does not have, for the sort orders and lookups of
+# the library views. The expressions match LIBRARY_SORT_FIELDS.
+REPLICA_INDEXES = {
+    "items_album_id": "items (album_id, disc, track)",
+    "items_artist": "items (artist)",
+    "items_added_order": "items (IFNULL(added, 0) DESC, id)",
+    "items_artist_order": "items (IFNULL(artist, ''), IFNULL(album, ''), IFNULL(disc, 0), IFNULL(track, 0), id)",
+    "items_album_order": "items (IFNULL(album, ''), IFNULL(disc, 0), IFNULL(track, 0), id)",
+    "items_title_order": "items (IFNULL(title, ''), id)",
+    "items_year_order": "items (IFNULL(year, 0), IFNULL(artist, ''), IFNULL(album, ''), id)",
+    "items_year_desc_order": "items (IFNULL(year, 0) DESC, IFNULL(artist, ''), IFNULL(album, ''), id)",
+    "albums_albumartist": "albums (albumartist)",
+    "albums_year_order": "albums (year DESC, album)",
+    "item_attributes_entity": "item_attributes (entity_id, key)",
+    "album_attributes_entity": "album_attributes (entity_id, key)",
+}
+
+_sync_lock = threading.Lock()
+# Guards starting the sync thread; never held while syncing, so requests do not wait
+_thread_lock = threading.Lock()
+_sync_thread = None
+_last_signature = None
+_last_sync = 0.0
+_ready = False
+
+def get_replica_path():
+    """Get the path to the library replica database."""
+    return get_cache_dir() / REPLICA_FILENAME
+
+def _connect_replica():
+    """Open a read-write connection to the replica with beets' database attached as ``lib``."""
+    db_path = get_beets_db_path()
+    if not db_path.exists():
+        raise FileNotFoundError(f"Beets database not found at {db_path}")
+    conn = sqlite3.connect(get_replica_path(), timeout=30, isolation_level=None,
+                           check_same_thread=False, uri=True)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sync_state (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+    conn.execute("ATTACH DATABASE ? AS lib", (f"{db_path.resolve().as_uri()}?mode=ro",))
+    return conn
+
+def _create_schema(conn):
+    """Create the replica tables with beets' own definitions.
+
+    A table whose definition no longer matches beets' (e.g. after a beets
+    upgrade added a column) is dropped and copied again. Returns True if any
+    table was (re)created.
+    """
+    created = False
+    for table in REPLICA_TABLES:
+        row = conn.execute("SELECT sql FROM lib.sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        if row is None:
+            raise RuntimeError(f"Beets database has no {table} table")
+        current = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        if current is not None and current[0] == row[0]:
+            continue
+        if current is not None:
+            logger.info(f"Schema of {table} changed, copying it again")
+            conn.execute(f"DROP TABLE main.{table}")
+        # beets' CREATE TABLE statement has no schema name, so it creates main.<table>
+        conn.execute(row[0])
+        created = True
+    columns = [row[1] for row in conn.execute("PRAGMA main.table_info(item_changes)")]
+    if columns and "album_id" not in columns:
+        # Entries logged without their albums: start a new log epoch
+        conn.execute("DROP TABLE main.item_changes")
+        conn.execute("DELETE FROM main.sync_state WHERE name = 'changes_epoch'")
+    # album_id is the item's album after the change (before it, for deleted
+    # items), previous_album_id the album a modified item moved out of
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS main.item_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id INTEGER NOT NULL,
+            deleted INTEGER NOT NULL,
+            album_id INTEGER,
+            previous_album_id INTEGER
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS main.item_changes_item ON item_changes (item_id)")
+    if created:
+        # Items are copied again from scratch, albums by comparing rows
+        conn.execute("DELETE FROM main.items")
+        conn.execute("DELETE FROM main.item_attributes")
+    return created
+
+def _sync_albums(conn):
+    """Copy albums, and their attributes, that differ from beets' rows.
+
+    beets keeps no modification time for albums, so rows are compared; the
+    albums table is a fraction of the size of items.
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.changed_albums")
+    conn.execute("""
+        CREATE TEMP TABLE changed_albums AS
+        SELECT id FROM (SELECT * FROM lib.albums EXCEPT SELECT * FROM main.albums)
+        UNION
+        SELECT id FROM main.albums WHERE id NOT IN (SELECT id FROM lib.albums)
+        UNION
+        SELECT entity_id FROM (SELECT * FROM lib.album_attributes EXCEPT SELECT * FROM main.album_attributes)
+        UNION
+        SELECT entity_id FROM (SELECT * FROM main.album_attributes EXCEPT SELECT * FROM lib.album_attributes)
+    """)
+    changed = conn.execute("SELECT COUNT(*) FROM temp.changed_albums").fetchone()[0]
+    if changed:
+        conn.execute("DELETE FROM main.albums WHERE id IN (SELECT id FROM temp.changed_albums)")
+        conn.execute("DELETE FROM main.album_attributes WHERE entity_id IN (SELECT id FROM temp.changed_albums)")
+        conn.execute("INSERT INTO main.albums SELECT * FROM lib.albums WHERE id IN (SELECT id FROM temp.changed_albums)")
+        conn.execute("""
+            INSERT INTO main.album_attributes
+            SELECT * FROM lib.album_attributes WHERE entity_id IN (SELECT id FROM temp.changed_albums)
+        """)
+    conn.execute("DROP TABLE temp.changed_albums")
+    return changed
+
+def _log_item_changes(conn, changes, rebuilt):
+    """Record the items found by collect_item_changes() in the change log.
+
+    Each item keeps only its latest entry. A rebuilt replica starts a new
+    log epoch instead, which sends every client back to a full load, and
+    the oldest entries are dropped beyond CHANGE_LOG_MAX_ROWS.
+    """
+    if rebuilt or not get_sync_state(conn, "changes_epoch"):
+        conn.execute("DELETE FROM main.item_changes")
+        set_sync_state(conn, "changes_epoch", uuid.uuid4().hex)
+        set_sync_state(conn, "changes_floor", 0)
+        return
+    if not changes:
+        return
+    stale = "SELECT id FROM temp.changed_items UNION ALL SELECT id FROM temp.deleted_items"
+    conn.execute(f"DELETE FROM main.item_changes WHERE item_id IN ({stale})")
+    # Runs before the items are copied, so main.items still has their old albums
+    conn.execute("""
+        INSERT INTO main.item_changes (item_id, deleted, album_id, previous_album_id)
+        SELECT c.id, 0, i.album_id, NULLIF(o.album_id, i.album_id)
+        FROM temp.changed_items c
+        LEFT JOIN lib.items i ON i.id = c.id
+        LEFT JOIN main.items o ON o.id = c.id
+        UNION ALL
+        SELECT d.id, 1, o.album_id, NULL
+        FROM temp.deleted_items d
+        LEFT JOIN main.items o ON o.id = d.id
+    """)
+    excess = conn.execute("SELECT COUNT(*) FROM main.item_changes").fetchone()[0] - CHANGE_LOG_MAX_ROWS
+    if excess > 0:
+        floor = conn.execute("SELECT seq FROM main.item_changes ORDER BY seq LIMIT 1 OFFSET ?",
+                             (excess - 1,)).fetchone()[0]
+        conn.execute("DELETE FROM main.item_changes WHERE seq <= ?", (floor,))
+        set_sync_state(conn, "changes_floor", floor)
+
+def sync_replica():
+    """Bring the replica up to date with beets' database.
+
+    Items are copied when they are new or their mtime changed, together with
+    their flexible attributes, and removed when beets deleted them.
+    Readers keep seeing the previous state until the sync commits.
+    """
+    global _last_signature, _last_sync, _ready
+    with _sync_lock:
+        signature = get_library_signature()
+        started = time.time()
+        conn = _connect_replica()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rebuilt = _create_schema(conn)
+                changed, deleted = collect_item_changes(conn, "items")
+                _log_item_changes(conn, changed + deleted, rebuilt)
+                if changed or deleted:
+                    stale = "SELECT id FROM temp.changed_items UNION ALL SELECT id FROM temp.deleted_items"
+                    conn.execute(f"DELETE FROM main.items WHERE id IN ({stale})")
+                    conn.execute(f"DELETE FROM main.item_attributes WHERE entity_id IN ({stale})")
+                    conn.execute("INSERT INTO main.items SELECT * FROM lib.items WHERE id IN (SELECT id FROM temp.changed_items)")
+                    conn.execute("""
+                        INSERT INTO main.item_attributes
+                        SELECT * FROM lib.item_attributes WHERE entity_id IN (SELECT id FROM temp.changed_items)
+                    """)
+                conn.execute("DROP TABLE IF EXISTS temp.changed_items")
+                conn.execute("DROP TABLE IF EXISTS temp.deleted_items")
+                albums = _sync_albums(conn)
+                # Created after the first copy, which is faster than filling indexed tables
+                for name, definition in REPLICA_INDEXES.items():
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS main.{name} ON {definition}")
+                if rebuilt:
+                    conn.execute("ANALYZE main")
+                if changed or deleted or albums or not get_sync_state(conn, "replica_synced"):
+                    set_sync_state(conn, "replica_synced", time.time())
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+        _last_signature = signature
+        _last_sync = time.time()
+        _ready = True
+        elapsed = _last_sync - started
+        if changed or deleted or albums:
+            logger.info(f"Library replica synced: {changed} changed, {deleted} deleted items, "
+                        f"{albums} changed albums in {elapsed:.2f}s")
+        return {"changed": changed, "deleted": deleted, "albums": albums, "elapsed": round(elapsed, 3)}
+
+def _sync_in_background():
+    global _sync_thread
+    try:
+        sync_replica()
+    except Exception as e:
+        logger.error(f"Error syncing library replica: {str(e)}")
+    finally:
+        _sync_thread = None
+
+def _start_sync():
+    """Sync the replica in a background thread unless a sync is running already."""
+    global _sync_thread
+    with _thread_lock:
+        if _sync_thread is None:
+            _sync_thread = threading.Thread(target=_sync_in_background, daemon=True)
+            _sync_thread.start()
+
+_replica_pool = ReadConnectionPool(get_replica_path, name="Library replica")
+
+def replica_in_use():
+    """Return True if reads can be served from the replica.
+
+    Starts building the replica in the background when it does not exist
+    yet, and syncing it when beets' database changed since the last sync.
+    """
+    global _ready
+    if not LIBRARY_REPLICA:
+        return False
+    if not _ready:
+        try:
+            conn = _replica_pool.acquire()
+        except FileNotFoundError:
+            conn = None
+        if conn is not None:
+            try:
+                _ready = bool(get_sync_state(conn, "replica_synced"))
+            except sqlite3.Error:
+                pass
+            finally:
+                conn.close()
+    if not _ready or (time.time() - _last_sync >= REPLICA_SYNC_INTERVAL
+                      and get_library_signature() != _last_signature):
+        _start_sync()
+    return _ready
+
+def connect_replica_read():
+    """Borrow a pooled read-only connection to the replica, or None if it is not usable yet."""
+    if not replica_in_use():
+        return None
+    return _replica_pool.acquire()
+
+def _encode_sync_token(epoch, seq, after=None):
+    payload = {"e": epoch, "s": seq}
+    if after is not None:
+        payload["a"] = after
+    payload = json.dumps(payload, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def _decode_sync_token(token):
+    """Decode a token from _encode_sync_token() into ``(epoch, seq, after)``."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        epoch, seq, after = payload["e"], payload["s"], payload.get("a")
+    except Exception:
+        raise ValueError("Invalid sync token")
+    if not isinstance(seq, int) or not (after is None or isinstance(after, int)):
+        raise ValueError("Invalid sync token")
+    return epoch, seq, after
+
+def get_library_changes(token=None, limit=CHANGES_BATCH_SIZE):
+    """Get a batch of the items added, modified or deleted since a sync token.
+
+    Without a token, or with one the change log no longer covers, the batch
+    starts a full load (``reset`` is true) that pages through every item by
+    id. Items come as rows of SYNC_ITEM_FIELDS. Keep calling with the
+    returned token while ``has_more`` is true. Returns None while the
+    replica is not ready, as the change log lives in it.
+    """
+    limit = max(1, min(limit, MAX_CHANGES_BATCH_SIZE))
+    position = _decode_sync_token(token) if token else None
+    conn = connect_replica_read()
+    if conn is None:
+        return None
+    try:
+        # One statement, so the three values come from the same sync
+        epoch, floor, current = conn.execute("""
+            SELECT (SELECT value FROM sync_state WHERE name = 'changes_epoch'),
+                   (SELECT value FROM sync_state WHERE name = 'changes_floor'),
+                   (SELECT seq FROM sqlite_sequence WHERE name = 'item_changes')
+        """).fetchone()
+        reset = position is None or position[0] != epoch or position[1] < int(floor or 0)
+        if reset:
+            # Changes made during the full load are replayed after it
+            position = (epoch, current or 0, 0)
+        _, seq, after = position
+        columns = ", ".join(f"i.{field}" for field in SYNC_ITEM_FIELDS)
+
+        if after is not None:
+            rows = conn.execute(f"SELECT {columns} FROM items i WHERE i.id > ? ORDER BY i.id LIMIT ?",
+                                (after, limit + 1)).fetchall()
+            has_more = len(rows) > limit
+            items = [list(row) for row in rows[:limit]]
+            deleted = []
+            next_token = _encode_sync_token(epoch, seq, items[-1][0] if has_more else None)
+        else:
+            rows = conn.execute(f"""
+                SELECT c.seq, c.item_id, c.deleted, {columns}
+                FROM item_changes c
+                LEFT JOIN items i ON i.id = c.item_id
+                WHERE c.seq > ?
+                ORDER BY c.seq
+                LIMIT ?
+            """, (seq, limit + 1)).fetchall()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            items = [list(row)[3:] for row in rows if not row["deleted"] and row["id"] is not None]
+            deleted = [row["item_id"] for row in rows if row["deleted"] or row["id"] is None]
+            next_token = _encode_sync_token(epoch, rows[-1]["seq"] if rows else seq)
+    finally:
+        conn.close()
+
+    return {
+        "fields": SYNC_ITEM_FIELDS,
+        "items": items,
+        "deleted": deleted,
+        "token": next_token,
+        "has_more": has_more,
+        "reset": reset,
+    }
+
+def get_replica_stats():
+    """Get the state of the replica and its connection pool."""
+    stats = {
+        "enabled": LIBRARY_REPLICA,
+        "ready": replica_in_use(),
+        "path": str(get_replica_path()),
+        "syncing": _sync_thread is not None,
+        "last_sync": _last_sync or None,
+        "pool": _replica_pool.stats(),
+    }
+    if stats["ready"]:
+        conn = _replica_pool.acquire()
+        try:
+            stats["items"] = conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+            stats["albums"] = conn.execute("SELECT COUNT(*) FROM albums").fetchone()[0]
+            stats["synced"] = float(get_sync_state(conn, "replica_synced"))
+        finally:
+            conn.close()
+    return stats
@@ -0,0 +1,127 @@
+import os
+import hashlib
+import logging
+import threading
+from functools import wraps
+from collections import OrderedDict
+from flask import request, g, Response
+from sidecar import get_library_version
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Memory the cached response bodies may use, per app process
+RESPONSE_CACHE_MAX_MB = int(os.environ.get("RESPONSE_CACHE_MAX_MB", "64"))
+
+# Bodies larger than this are served with an ETag but not kept in memory
+RESPONSE_CACHE_MAX_ENTRY_MB = 4
+
+class ResponseCache:
+    """LRU cache of JSON response bodies, valid for one library version."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, version, body, etag, mimetype):
+        if len(body) > RESPONSE_CACHE_MAX_ENTRY_MB * 1024 * 1024:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (version, body, etag, mimetype)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted[1])
+
+    def count_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            }
+
+_cache = ResponseCache(RESPONSE_CACHE_MAX_MB * 1024 * 1024)
+
+def get_response_cache_stats():
+    """Get statistics about the response cache."""
+    return _cache.stats()
+
+def clear_response_cache():
+    """Drop all cached responses."""
+    _cache.clear()
+
+def skip_response_cache():
+    """Keep the current response out of the cache, e.g. because it is provisional."""
+    g.skip_response_cache = True
+
+def _respond(body, etag, mimetype):
+    response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    # Let browsers keep the response but revalidate it on every use
+    response.cache_control.no_cache = True
+    response.make_conditional(request)
+    if response.status_code == 304:
+        _cache.count_not_modified()
+    return response
+
+def cached_json(view):
+    """Cache a read-only JSON view until the beets library changes.
+
+    Responses are keyed by path and query string and stored with the library
+    version they were computed at. Every response carries a strong ETag derived
+    from its body, so it is the same in every app process, and a matching
+    ``If-None-Match`` is answered with 304. Error responses are not cached.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version = get_library_version()
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+
+        entry = _cache.get(key, version)
+        if entry is not None:
+            _, body, etag, mimetype = entry
+            return _respond(body, etag, mimetype)
+
+        response = view(*args, **kwargs)
+        if isinstance(response, tuple) or response.status_code != 200 or response.is_streamed:
+            return response
+
+        body = response.get_data()
+        etag = hashlib.sha1(body).hexdigest()
+        if not g.get("skip_response_cache"):
+            _cache.put(key, version, body, etag, response.mimetype)
+        return _respond(body, etag, response.mimetype)
+    return wrapper
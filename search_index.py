@@ -0,0 +1,185 @@
+import os
+import re
+import time
+import logging
+import threading
+from beets_utils import connect_db, format_item, LIBRARY_ITEM_COLUMNS, MAX_PAGE_SIZE
+from sidecar import (
+    connect_sidecar, connect_sidecar_read, set_sync_state,
+    get_read_signature, create_item_state_table, collect_item_changes,
+    commit_item_changes, SidecarSync
+)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Columns of the full-text index, in order, with their bm25 weights
+SEARCH_COLUMNS = [
+    ("title", 10.0),
+    ("artist", 6.0),
+    ("album", 5.0),
+    ("albumartist", 4.0),
+    ("genre", 2.0),
+    ("path", 0.5),
+]
+
+# Minimum seconds between two incremental syncs triggered by searches
+SEARCH_SYNC_INTERVAL = float(os.environ.get("SEARCH_SYNC_INTERVAL", "2"))
+
+_sync_lock = threading.Lock()
+
+def _create_schema(conn):
+    columns = ", ".join(name for name, _ in SEARCH_COLUMNS)
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+            {columns},
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '1 2 3'
+        )
+    """)
+    create_item_state_table(conn, "search_state")
+
+def sync_search_index():
+    """Bring the full-text index up to date with the beets items table.
+
+    Only items whose id/mtime changed since the last sync are re-indexed and
+    deleted items are removed, so a sync after a small import is cheap. Returns
+    a summary of what was updated.
+    """
+    with _sync_lock:
+        signature = get_read_signature()
+        started = time.time()
+        conn = connect_sidecar(attach_library=True)
+        try:
+            _create_schema(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                changed, deleted = collect_item_changes(conn, "search_state")
+                if changed or deleted:
+                    conn.execute("""
+                        DELETE FROM search_fts WHERE rowid IN (
+                            SELECT id FROM temp.changed_items
+                            UNION ALL
+                            SELECT id FROM temp.deleted_items
+                        )
+                    """)
+                    conn.execute("""
+                        INSERT INTO search_fts (rowid, title, artist, album, albumartist, genre, path)
+                        SELECT i.id, i.title, i.artist, i.album, i.albumartist, i.genre, CAST(i.path AS TEXT)
+                        FROM lib.items i
+                        JOIN temp.changed_items c ON c.id = i.id
+                    """)
+                commit_item_changes(conn, "search_state")
+                set_sync_state(conn, "search_index_built", int(time.time()))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if changed + deleted > 1000:
+                conn.execute("INSERT INTO search_fts (search_fts) VALUES ('optimize')")
+        finally:
+            conn.close()
+
+        _syncer.mark_synced(signature)
+        elapsed = time.time() - started
+        if changed or deleted:
+            logger.info(f"Search index synced: {changed} updated, {deleted} removed in {elapsed:.2f}s")
+        return {"updated": changed, "removed": deleted, "elapsed": round(elapsed, 3)}
+
+def rebuild_search_index():
+    """Drop the full-text index and build it again from scratch."""
+    with _sync_lock:
+        _syncer.reset()
+        conn = connect_sidecar()
+        try:
+            conn.execute("DROP TABLE IF EXISTS search_fts")
+            conn.execute("DROP TABLE IF EXISTS search_state")
+            conn.execute("DELETE FROM sync_state WHERE name = 'search_index_built'")
+        finally:
+            conn.close()
+    return sync_search_index()
+
+_syncer = SidecarSync("search index", sync_search_index, "search_index_built", SEARCH_SYNC_INTERVAL)
+
+def ensure_search_index():
+    """Make sure the index is usable, syncing it in the background if the library changed.
+
+    Returns False while the initial build is still running. Searches meanwhile
+    use the index as it is, which search_items() reports as stale.
+    """
+    return _syncer.ensure()
+
+_TOKEN_RE = re.compile(r'(?:(\w+):)?("[^"]*"|\S+)')
+
+def build_match_expression(query):
+    """Translate a user query into an FTS5 MATCH expression.
+
+    Every word becomes a prefix term and all terms must match. ``field:word``
+    restricts a term to one of the indexed columns and ``"a phrase"`` matches
+    words in sequence.
+    """
+    columns = {name for name, _ in SEARCH_COLUMNS}
+    terms = []
+    for field, value in _TOKEN_RE.findall(query):
+        phrase = value.startswith('"') and value.endswith('"') and len(value) > 1
+        words = re.findall(r"\w+", value)
+        if not words:
+            continue
+        if phrase:
+            term = '"' + " ".join(words) + '"'
+        else:
+            term = " ".join(f'"{word}"*' for word in words)
+            if len(words) > 1:
+                term = f"({term})"
+        if field and field.lower() in columns:
+            term = f"{field.lower()} : {term}"
+        terms.append(term)
+    return " AND ".join(terms)
+
+def search_items(query, page=1, limit=50):
+    """Search the full-text index, best matches first.
+
+    Returns ``None`` if the index is not ready yet, otherwise a dictionary with
+    the page of items, whether more results follow and whether the index
+    lagged behind the library.
+    """
+    if not ensure_search_index():
+        return None
+    stale = _syncer.stale()
+
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    offset = (max(page, 1) - 1) * limit
+    expression = build_match_expression(query)
+    if not expression:
+        return {"results": [], "has_more": False, "stale": stale}
+
+    weights = ", ".join(str(weight) for _, weight in SEARCH_COLUMNS)
+    conn = connect_sidecar_read()
+    try:
+        rows = conn.execute(f"""
+            SELECT rowid
+            FROM search_fts
+            WHERE search_fts MATCH ?
+            ORDER BY bm25(search_fts, {weights})
+            LIMIT ? OFFSET ?
+        """, (expression, limit + 1, offset)).fetchall()
+    finally:
+        conn.close()
+
+    ids = [row[0] for row in rows[:limit]]
+    results = []
+    if ids:
+        conn = connect_db()
+        try:
+            placeholders = ", ".join("?" for _ in ids)
+            found = conn.execute(f"""
+                SELECT {LIBRARY_ITEM_COLUMNS}
+                FROM items
+                WHERE id IN ({placeholders})
+            """, ids).fetchall()
+        finally:
+            conn.close()
+        by_id = {row["id"]: row for row in found}
+        results = [format_item(by_id[item_id]) for item_id in ids if item_id in by_id]
+
+    return {"results": results, "has_more": len(rows) > limit, "stale": stale}
@@ -0,0 +1,294 @@
+import os
+import time
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from beets_utils import (
+    get_beets_config_path, get_beets_db_path, ReadConnectionPool,
+    DB_CACHE_SIZE_KB, DB_MMAP_SIZE
+)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# The sidecar database holds data BeetsManager derives from the beets library
+# (search index, summaries, ...). It is never written by beets itself, so we are
+# free to add tables and indexes to it.
+SIDECAR_FILENAME = "sidecar.db"
+
+def get_cache_dir():
+    """Get the directory for BeetsManager's own data, creating it if needed.
+
+    Uses BEETSMANAGER_CACHE_DIR when set, otherwise a hidden directory next to
+    the beets config file.
+    """
+    cache_dir_str = os.environ.get("BEETSMANAGER_CACHE_DIR")
+    if cache_dir_str:
+        cache_dir = Path(cache_dir_str)
+    else:
+        cache_dir = get_beets_config_path().parent / ".beetsmanager"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+def get_sidecar_path():
+    """Get the path to the sidecar database."""
+    return get_cache_dir() / SIDECAR_FILENAME
+
+def connect_sidecar(attach_library=False):
+    """Open a read-write connection to the sidecar database.
+
+    The connection runs in autocommit mode so callers control transactions with
+    explicit BEGIN/COMMIT. With ``attach_library`` the library is attached
+    read-only as ``lib`` so deltas can be computed with set-based SQL. That is
+    the replica once it has been built (see get_read_db_path()), so syncs never
+    wait for beets' writers.
+    """
+    conn = sqlite3.connect(get_sidecar_path(), timeout=30, isolation_level=None,
+                           check_same_thread=False, uri=True)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sync_state (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+    if attach_library:
+        db_path = get_read_db_path()
+        if not db_path.exists():
+            conn.close()
+            raise FileNotFoundError(f"Beets database not found at {db_path}")
+        conn.execute("ATTACH DATABASE ? AS lib", (f"{db_path.resolve().as_uri()}?mode=ro",))
+    return conn
+
+_sidecar_read_pool = ReadConnectionPool(get_sidecar_path, name="Sidecar database")
+
+def connect_sidecar_read():
+    """Borrow a pooled read-only connection to the sidecar database."""
+    return _sidecar_read_pool.acquire()
+
+def get_sync_state(conn, name, default=None):
+    """Read a value from the sidecar's sync_state table."""
+    row = conn.execute("SELECT value FROM sync_state WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else default
+
+def set_sync_state(conn, name, value):
+    """Store a value in the sidecar's sync_state table."""
+    conn.execute("INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)", (name, str(value)))
+
+def get_file_signature(db_path):
+    """Get a cheap fingerprint of a SQLite database's files.
+
+    Combines the mtime and size of the database and its WAL file, so it changes
+    whenever a write is committed.
+    """
+    signature = []
+    for path in (db_path, db_path.with_name(db_path.name + "-wal")):
+        try:
+            stat = os.stat(path)
+            signature.extend([stat.st_mtime_ns, stat.st_size, stat.st_ino])
+        except FileNotFoundError:
+            signature.extend([0, 0, 0])
+    return ":".join(str(part) for part in signature)
+
+def get_library_signature():
+    """Get a cheap fingerprint of the beets database files."""
+    return get_file_signature(get_beets_db_path())
+
+def get_read_db_path():
+    """Get the path of the database API reads are served from.
+
+    That is the replica (see replica.py) once it has been built, and beets'
+    database until then.
+    """
+    # replica.py builds on this module
+    from replica import replica_in_use, get_replica_path
+    return get_replica_path() if replica_in_use() else get_beets_db_path()
+
+def get_read_signature():
+    """Like get_library_signature(), for the database API reads are served from."""
+    return get_file_signature(get_read_db_path())
+
+class LibraryVersion:
+    """Detect commits to the beets database as cheaply as possible.
+
+    Keeps one dedicated read connection open and combines its
+    ``PRAGMA data_version``, which changes whenever another connection
+    (e.g. a beet process) commits, with the file signature, which also
+    catches the database file being replaced.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = None
+        self._identity = None
+
+    def _reconnect(self, db_path, identity):
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = sqlite3.connect(f"{db_path.resolve().as_uri()}?mode=ro", uri=True,
+                                     check_same_thread=False, isolation_level=None)
+        self._identity = identity
+
+    def get(self):
+        """Get a token that changes whenever the library's contents may have changed."""
+        signature = get_library_signature()
+        db_path = get_beets_db_path()
+        with self._lock:
+            try:
+                stat = os.stat(db_path)
+            except FileNotFoundError:
+                return f"-:{signature}"
+            identity = (db_path, stat.st_dev, stat.st_ino)
+            try:
+                if self._conn is None or identity != self._identity:
+                    self._reconnect(db_path, identity)
+                data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read data_version: {str(e)}")
+                self._conn = None
+                return f"-:{signature}"
+            return f"{data_version}:{signature}"
+
+_library_version = LibraryVersion()
+
+def get_library_version():
+    """Get the current version token of the library data API reads are served from.
+
+    Once reads are served from the replica this is its file signature, which
+    changes exactly when a sync commits, so cached responses always match the
+    rows they were computed from.
+    """
+    from replica import replica_in_use
+    if replica_in_use():
+        return f"replica:{get_read_signature()}"
+    return _library_version.get()
+
+def create_item_state_table(conn, state_table):
+    """Create a table remembering the (id, mtime) of every item a consumer has seen."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {state_table} (
+            id INTEGER PRIMARY KEY,
+            mtime REAL
+        )
+    """)
+
+def collect_item_changes(conn, state_table):
+    """Find items added, modified or deleted since a consumer last synced.
+
+    Compares ``lib.items`` against the consumer's (id, mtime) state table and
+    fills the temp tables ``changed_items`` (new or modified ids with their
+    mtime) and ``deleted_items``. Must run on a connection from
+    connect_sidecar(attach_library=True), inside a transaction. Returns the
+    number of changed and deleted items.
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.changed_items")
+    conn.execute("DROP TABLE IF EXISTS temp.deleted_items")
+    conn.execute(f"""
+        CREATE TEMP TABLE changed_items AS
+        SELECT i.id AS id, i.mtime AS mtime
+        FROM lib.items i
+        LEFT JOIN main.{state_table} s ON s.id = i.id
+        WHERE s.id IS NULL OR s.mtime IS NOT i.mtime
+    """)
+    conn.execute(f"""
+        CREATE TEMP TABLE deleted_items AS
+        SELECT s.id AS id
+        FROM main.{state_table} s
+        LEFT JOIN lib.items i ON i.id = s.id
+        WHERE i.id IS NULL
+    """)
+    changed = conn.execute("SELECT COUNT(*) FROM temp.changed_items").fetchone()[0]
+    deleted = conn.execute("SELECT COUNT(*) FROM temp.deleted_items").fetchone()[0]
+    return changed, deleted
+
+def commit_item_changes(conn, state_table):
+    """Record the deltas found by collect_item_changes() in the state table."""
+    conn.execute(f"INSERT OR REPLACE INTO main.{state_table} (id, mtime) SELECT id, mtime FROM temp.changed_items")
+    conn.execute(f"DELETE FROM main.{state_table} WHERE id IN (SELECT id FROM temp.deleted_items)")
+    conn.execute("DROP TABLE IF EXISTS temp.changed_items")
+    conn.execute("DROP TABLE IF EXISTS temp.deleted_items")
+
+class SidecarSync:
+    """Builds a consumer's sidecar tables and keeps them current in the background.
+
+    Requests call ensure() and serve whatever the tables hold, so they never
+    wait for a sync: the first call starts the initial build, later calls
+    start an incremental sync when the library changed and the last sync
+    is at least ``interval`` seconds old. ``sync`` must record its
+    ``built_state`` in sync_state and call mark_synced() when it succeeds.
+    """
+
+    def __init__(self, name, sync, built_state, interval):
+        self.name = name
+        self._sync = sync
+        self._built_state = built_state
+        self._interval = interval
+        # Guards starting the thread; never held while syncing
+        self._thread_lock = threading.Lock()
+        self._thread = None
+        self._built = False
+        self.last_signature = None
+        self.last_sync = 0.0
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def mark_synced(self, signature):
+        """Record the library signature a sync brought the tables up to."""
+        self.last_signature = signature
+        self.last_sync = time.time()
+
+    def stale(self):
+        """Return True if the library changed since the last sync."""
+        return get_read_signature() != self.last_signature
+
+    def reset(self):
+        """Forget that the tables were built, after they were dropped."""
+        self._built = False
+
+    def _run(self):
+        try:
+            self._sync()
+        except Exception as e:
+            logger.error(f"Error syncing {self.name}: {str(e)}")
+        finally:
+            self._thread = None
+
+    def start(self):
+        """Run the sync in a background thread unless it is running already."""
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def is_built(self):
+        if not self._built:
+            try:
+                conn = connect_sidecar_read()
+            except FileNotFoundError:
+                return False
+            try:
+                self._built = bool(get_sync_state(conn, self._built_state))
+            except sqlite3.Error:
+                pass
+            finally:
+                conn.close()
+        return self._built
+
+    def ensure(self):
+        """Return True if the tables can be read, starting a build or sync as needed."""
+        if not self.is_built():
+            if self._thread is None:
+                logger.info(f"Building {self.name} in the background")
+            self.start()
+            return False
+        if time.time() - self.last_sync >= self._interval and self.stale():
+            self.start()
+        return True
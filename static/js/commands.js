@@ -20,6 +20,17 @@ function setupCommandEventListeners() {
         }
     });
     
+    // Cancel button
+    document.getElementById('cancel-command-button').addEventListener('click', cancelCommand);
+    
+    // Paged output navigation
+    document.getElementById('result-prev').addEventListener('click', function() {
+        loadResultPage(currentResult.start - RESULT_PAGE_SIZE);
+    });
+    document.getElementById('result-next').addEventListener('click', function() {
+        loadResultPage(currentResult.start + RESULT_PAGE_SIZE);
+    });
+    
     // Clear output button
     document.getElementById('clear-output').addEventListener('click', function() {
         document.getElementById('command-output').value = '';
@@ -57,10 +68,20 @@ function populateCommonCommands() {
     });
 }
 
+// Run id of the streaming command, used to cancel it
+let currentRunId = null;
+
 function executeCommand() {
+    if (document.getElementById('paged-output-input').checked) {
+        executePagedCommand();
+        return;
+    }
+    document.getElementById('result-pager').classList.add('d-none');
+    
     const commandInput = document.getElementById('command-input');
     const commandOutput = document.getElementById('command-output');
     const executeButton = document.getElementById('execute-button');
+    const cancelButton = document.getElementById('cancel-command-button');
     
     const command = commandInput.value.trim();
     if (!command) {
@@ -74,39 +95,151 @@ function executeCommand() {
     // Append command to output
     commandOutput.value += `\n> beet ${command}\n`;
     
-    // Make API request to execute the command
-    fetch('/api/command', {
+    // Output is appended once per animation frame, not once per line
+    let pendingOutput = '';
+    let flushScheduled = false;
+    function appendOutput(text) {
+        pendingOutput += text;
+        if (!flushScheduled) {
+            flushScheduled = true;
+            requestAnimationFrame(() => {
+                commandOutput.value += pendingOutput;
+                commandOutput.scrollTop = commandOutput.scrollHeight;
+                pendingOutput = '';
+                flushScheduled = false;
+            });
+        }
+    }
+    
+    function handleFrame(frame) {
+        if (frame.type === 'start') {
+            currentRunId = frame.run_id;
+            cancelButton.disabled = false;
+        } else if (frame.type === 'stdout') {
+            appendOutput(frame.lines.join('\n') + '\n');
+        } else if (frame.type === 'stderr') {
+            appendOutput(frame.lines.map(line => `Error: ${line}`).join('\n') + '\n');
+        } else if (frame.type === 'status') {
+            appendOutput(`[exit code ${frame.returncode}, ${frame.elapsed}s]\n`);
+            if (frame.success) {
+                showSuccess('Command executed successfully');
+            } else if (frame.timed_out) {
+                showError('Command timed out');
+            } else if (frame.cancelled) {
+                showError('Command cancelled');
+            } else {
+                showError(frame.error ? 'Failed to execute command: ' + frame.error : 'Command execution failed');
+            }
+        }
+    }
+    
+    function finish() {
+        currentRunId = null;
+        cancelButton.disabled = true;
+        setButtonLoading(executeButton, false);
+    }
+    
+    // Make API request to execute the command, reading frames as they arrive
+    fetch('/api/command/stream', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json'
         },
         body: JSON.stringify({ command: command })
     })
-    .then(response => {
+    .then(async response => {
         if (!response.ok) {
-            throw new Error('Failed to execute command');
+            const data = await response.json().catch(() => ({}));
+            throw new Error(data.error || 'Failed to execute command');
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.filter(line => line).forEach(line => handleFrame(JSON.parse(line)));
         }
-        return response.json();
+        finish();
     })
-    .then(data => {
+    .catch(error => {
+        console.error('Error executing command:', error);
+        showError('Failed to execute command: ' + error.message);
+        
         // Set button back to normal state
-        setButtonLoading(executeButton, false);
+        finish();
         
-        // Append command output
-        if (data.result.stdout) {
-            commandOutput.value += data.result.stdout;
+        // Append error to output
+        appendOutput(`Error: ${error.message}\n`);
+    });
+}
+
+function cancelCommand() {
+    if (!currentRunId) {
+        return;
+    }
+    
+    fetch(`/api/command/${currentRunId}/cancel`, { method: 'POST' })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error('Command is not running');
         }
-        
-        if (data.result.stderr) {
-            commandOutput.value += `Error: ${data.result.stderr}\n`;
+    })
+    .catch(error => {
+        console.error('Error cancelling command:', error);
+        showError('Failed to cancel command: ' + error.message);
+    });
+}
+
+// Spooled result being paged through
+const RESULT_PAGE_SIZE = 1000;
+let currentResult = null;
+
+function executePagedCommand() {
+    const commandInput = document.getElementById('command-input');
+    const commandOutput = document.getElementById('command-output');
+    const executeButton = document.getElementById('execute-button');
+    
+    const command = commandInput.value.trim();
+    if (!command) {
+        showError('Please enter a command to execute');
+        return;
+    }
+    
+    // Set button to loading state
+    setButtonLoading(executeButton, true);
+    
+    // The output is kept on the server; only the page being viewed is loaded
+    fetch('/api/command', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ command: command })
+    })
+    .then(response => response.json().then(data => {
+        if (!response.ok) {
+            throw new Error(data.error || 'Failed to execute command');
         }
+        return data;
+    }))
+    .then(data => {
+        setButtonLoading(executeButton, false);
         
-        // Scroll to bottom of output
-        commandOutput.scrollTop = commandOutput.scrollHeight;
+        const result = data.result;
+        currentResult = { id: result.result_id, command: command, total: result.lines.stdout, stderr: result.stderr, start: 0 };
+        loadResultPage(0);
         
-        // Show success message if command executed successfully
-        if (data.result.success) {
-            showSuccess('Command executed successfully');
+        if (result.success) {
+            showSuccess(`Command finished with ${result.lines.stdout} lines of output`);
+        } else if (result.timed_out) {
+            showError('Command timed out');
         } else {
             showError('Command execution failed');
         }
@@ -118,8 +251,42 @@ function executeCommand() {
         // Set button back to normal state
         setButtonLoading(executeButton, false);
         
-        // Append error to output
         commandOutput.value += `Error: ${error.message}\n`;
-        commandOutput.scrollTop = commandOutput.scrollHeight;
+    });
+}
+
+function loadResultPage(start) {
+    if (!currentResult) {
+        return;
+    }
+    start = Math.max(0, Math.min(start, Math.max(currentResult.total - 1, 0)));
+    
+    fetch(`/api/command/results/${currentResult.id}/lines?start=${start}&count=${RESULT_PAGE_SIZE}`)
+    .then(response => response.json().then(data => {
+        if (!response.ok) {
+            throw new Error(data.error || 'Failed to load output');
+        }
+        return data;
+    }))
+    .then(data => {
+        const commandOutput = document.getElementById('command-output');
+        currentResult.start = data.start;
+        
+        let text = `> beet ${currentResult.command}\n` + data.lines.join('\n') + '\n';
+        if (currentResult.stderr) {
+            text += currentResult.stderr.split('\n').filter(line => line).map(line => `Error: ${line}`).join('\n') + '\n';
+        }
+        commandOutput.value = text;
+        commandOutput.scrollTop = 0;
+        
+        const end = Math.min(data.start + data.lines.length, data.total);
+        document.getElementById('result-pager').classList.remove('d-none');
+        document.getElementById('result-range').textContent = data.total ? `Lines ${data.start + 1}-${end} of ${data.total}` : 'No output';
+        document.getElementById('result-prev').disabled = data.start === 0;
+        document.getElementById('result-next').disabled = end >= data.total;
+    })
+    .catch(error => {
+        console.error('Error loading command output:', error);
+        showError('Failed to load command output: ' + error.message);
     });
 }
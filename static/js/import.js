@@ -1,6 +1,15 @@
+// Import job being followed, its event stream and the output offset shown so far
+let currentJobId = null;
+let jobEvents = null;
+let jobEventOffset = 0;
+
+// Wait before opening the job's stream again when the server refused it, like its Retry-After
+const IMPORT_EVENTS_RETRY_MS = 10000;
+
 document.addEventListener('DOMContentLoaded', function() {
     if (document.getElementById('import-container')) {
         setupImportEventListeners();
+        loadImportJobs(true);
     }
 });
 
@@ -10,76 +19,270 @@ function setupImportEventListeners() {
         e.preventDefault();
         importMusic();
     });
-    
+
     // Clear output button
     document.getElementById('clear-output').addEventListener('click', function() {
         document.getElementById('import-output').value = '';
     });
+
+    // Cancel button
+    document.getElementById('cancel-import-button').addEventListener('click', function() {
+        if (currentJobId !== null) {
+            cancelImportJob(currentJobId);
+        }
+    });
 }
 
 function importMusic() {
     const pathInput = document.getElementById('path-input');
     const importOutput = document.getElementById('import-output');
     const importButton = document.getElementById('import-button');
-    
+
     const path = pathInput.value.trim();
     if (!path) {
         showError('Please enter a path to import');
         return;
     }
-    
+
     // Set button to loading state
     setButtonLoading(importButton, true);
-    
-    // Append command to output
-    importOutput.value += `\n> Importing music from: ${path}\n`;
-    
-    // Make API request to import music
+
+    // Make API request to queue the import
     fetch('/api/import', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json'
         },
-        body: JSON.stringify({ path: path })
+        body: JSON.stringify({
+            path: path,
+            autotag: !document.getElementById('asis-input').checked
+        })
     })
-    .then(response => {
+    .then(response => response.json().then(data => {
         if (!response.ok) {
-            throw new Error('Failed to import music');
+            throw new Error(data.error || 'Failed to queue import');
         }
-        return response.json();
-    })
+        return data;
+    }))
     .then(data => {
-        // Set button back to normal state
         setButtonLoading(importButton, false);
-        
-        // Append import output
-        if (data.result.stdout) {
-            importOutput.value += data.result.stdout;
-        }
-        
-        if (data.result.stderr) {
-            importOutput.value += `Error: ${data.result.stderr}\n`;
-        }
-        
-        // Scroll to bottom of output
-        importOutput.scrollTop = importOutput.scrollHeight;
-        
-        // Show success message if import was successful
-        if (data.result.success) {
-            showSuccess('Music imported successfully');
-        } else {
-            showError('Music import failed');
-        }
+        showSuccess(`Import job #${data.job.id} queued`);
+        importOutput.value = '';
+        followImportJob(data.job.id);
+        loadImportJobs(false);
     })
     .catch(error => {
         console.error('Error importing music:', error);
         showError('Failed to import music: ' + error.message);
-        
+
         // Set button back to normal state
         setButtonLoading(importButton, false);
-        
+
         // Append error to output
         importOutput.value += `Error: ${error.message}\n`;
         importOutput.scrollTop = importOutput.scrollHeight;
     });
 }
+
+function followImportJob(jobId) {
+    const importOutput = document.getElementById('import-output');
+
+    if (jobEvents) {
+        jobEvents.close();
+    }
+    currentJobId = jobId;
+    jobEventOffset = 0;
+    importOutput.value = '';
+    openImportEvents(jobId);
+}
+
+function openImportEvents(jobId) {
+    const importOutput = document.getElementById('import-output');
+
+    // The stream replays the job's output from the offset, then follows it live
+    jobEvents = new EventSource(`/api/import/jobs/${jobId}/events?offset=${jobEventOffset}`);
+
+    jobEvents.addEventListener('output', function(e) {
+        jobEventOffset = Number(e.lastEventId) || jobEventOffset;
+        const atBottom = importOutput.scrollTop + importOutput.clientHeight >= importOutput.scrollHeight - 5;
+        importOutput.value += JSON.parse(e.data).text;
+        if (atBottom) {
+            importOutput.scrollTop = importOutput.scrollHeight;
+        }
+    });
+
+    jobEvents.addEventListener('progress', function(e) {
+        renderImportProgress(JSON.parse(e.data));
+    });
+
+    jobEvents.addEventListener('done', function(e) {
+        const job = JSON.parse(e.data);
+        jobEvents.close();
+        jobEvents = null;
+        renderImportProgress(job);
+        loadImportJobs(false);
+    });
+
+    jobEvents.addEventListener('error', function(e) {
+        // Server-sent error events carry data; connection errors make EventSource retry
+        if (e.data) {
+            showError(JSON.parse(e.data).error);
+            jobEvents.close();
+            jobEvents = null;
+        } else if (e.target.readyState === EventSource.CLOSED && jobEvents === e.target) {
+            // A refused stream (too many open) is not retried by EventSource
+            jobEvents = null;
+            setTimeout(function() {
+                if (currentJobId === jobId && jobEvents === null) {
+                    openImportEvents(jobId);
+                }
+            }, IMPORT_EVENTS_RETRY_MS);
+        }
+    });
+}
+
+function renderImportProgress(job) {
+    const container = document.getElementById('import-progress');
+    const bar = document.getElementById('import-progress-bar');
+    const label = document.getElementById('import-progress-label');
+    const details = document.getElementById('import-progress-details');
+    const cancelButton = document.getElementById('cancel-import-button');
+
+    container.classList.remove('d-none');
+    label.textContent = `Job #${job.id}: ${job.path} (${job.status})`;
+
+    const total = job.albums_total || 0;
+    const percent = total ? Math.min(100, Math.round(job.albums_done / total * 100)) : 0;
+    bar.style.width = `${job.status === 'succeeded' ? 100 : percent}%`;
+    bar.textContent = total ? `${job.albums_done} / ${total}` : '';
+    bar.className = 'progress-bar';
+    if (job.status === 'running' || job.status === 'queued') {
+        bar.classList.add('progress-bar-striped', 'progress-bar-animated');
+    } else if (job.status === 'succeeded') {
+        bar.classList.add('bg-success');
+    } else {
+        bar.classList.add('bg-danger');
+    }
+
+    const parts = [`Elapsed ${formatTime(job.elapsed)}`];
+    if (job.albums_remaining !== null) {
+        parts.push(`${job.albums_remaining} albums remaining`);
+    }
+    if (job.albums_per_minute) {
+        parts.push(`${job.albums_per_minute} albums/min`);
+    }
+    if (job.error) {
+        parts.push(job.error);
+    }
+    details.textContent = parts.join(' · ');
+
+    cancelButton.disabled = !(job.status === 'running' || job.status === 'queued') || job.cancel_requested;
+}
+
+function loadImportJobs(followActive) {
+    fetch('/api/import/jobs')
+    .then(response => response.json())
+    .then(data => {
+        if (data.error) {
+            throw new Error(data.error);
+        }
+        renderImportJobs(data.jobs);
+
+        // Pick up a running import after a page reload
+        if (followActive && currentJobId === null) {
+            const active = data.jobs.find(job => job.status === 'running' || job.status === 'queued');
+            if (active) {
+                followImportJob(active.id);
+            }
+        }
+    })
+    .catch(error => {
+        console.error('Error loading import jobs:', error);
+    });
+}
+
+function renderImportJobs(jobs) {
+    const body = document.getElementById('import-jobs-body');
+    body.innerHTML = '';
+
+    if (jobs.length === 0) {
+        body.innerHTML = '<tr><td colspan="6" class="text-center text-muted">No import jobs yet</td></tr>';
+        return;
+    }
+
+    jobs.forEach(job => {
+        const row = document.createElement('tr');
+        row.style.cursor = 'pointer';
+
+        const cells = [
+            `#${job.id}`,
+            job.path,
+            job.status,
+            job.albums_total !== null ? `${job.albums_done} / ${job.albums_total}` : '',
+            formatTime(job.elapsed)
+        ];
+        cells.forEach(text => {
+            const cell = document.createElement('td');
+            cell.textContent = text;
+            row.appendChild(cell);
+        });
+
+        const actions = document.createElement('td');
+        actions.className = 'text-end';
+        if (job.status === 'running' || job.status === 'queued') {
+            actions.appendChild(createJobButton('Cancel', 'btn-outline-danger', () => cancelImportJob(job.id)));
+        } else {
+            actions.appendChild(createJobButton('Retry', 'btn-outline-secondary', () => retryImportJob(job.id)));
+        }
+        row.appendChild(actions);
+
+        // Show a job's output when its row is clicked
+        row.addEventListener('click', () => followImportJob(job.id));
+        body.appendChild(row);
+    });
+}
+
+function createJobButton(text, style, onClick) {
+    const button = document.createElement('button');
+    button.type = 'button';
+    button.className = `btn btn-sm ${style}`;
+    button.textContent = text;
+    button.addEventListener('click', function(e) {
+        e.stopPropagation();
+        onClick();
+    });
+    return button;
+}
+
+function cancelImportJob(jobId) {
+    fetch(`/api/import/jobs/${jobId}/cancel`, { method: 'POST' })
+    .then(response => response.json())
+    .then(data => {
+        if (data.error) {
+            throw new Error(data.error);
+        }
+        showSuccess(`Cancelling import job #${jobId}`);
+        loadImportJobs(false);
+    })
+    .catch(error => {
+        console.error('Error cancelling import job:', error);
+        showError('Failed to cancel import: ' + error.message);
+    });
+}
+
+function retryImportJob(jobId) {
+    fetch(`/api/import/jobs/${jobId}/retry`, { method: 'POST' })
+    .then(response => response.json())
+    .then(data => {
+        if (data.error) {
+            throw new Error(data.error);
+        }
+        showSuccess(`Import job #${data.job.id} queued`);
+        followImportJob(data.job.id);
+        loadImportJobs(false);
+    })
+    .catch(error => {
+        console.error('Error retrying import job:', error);
+        showError('Failed to retry import: ' + error.message);
+    });
+}
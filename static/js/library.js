@@ -1,7 +1,49 @@
 let currentPage = 1;
 let totalItems = 0;
 let itemsPerPage = 50;
-let currentSort = 'artist';
+let currentSort = 'artist,album,disc,track';
+// Cursors returned by /api/library for the pages around the current one
+let currentCursor = null;
+let nextCursor = null;
+let prevCursor = null;
+// Active search query and its result page, null when browsing the library
+let activeSearch = null;
+let searchPage = 1;
+// Letter and page of the artists loaded into the artist filter
+let artistLetter = '';
+let artistPage = 1;
+// Selected facet values by facet name, the year range and the filtered page
+let facetFilters = {};
+let facetYearMin = '';
+let facetYearMax = '';
+let facetPage = 1;
+let facetsLoaded = false;
+// Local copy of the library in IndexedDB, kept current with /api/library/changes.
+// Once a full copy is loaded the plain library view pages from it.
+let libraryCache = null;
+let libraryCacheReady = false;
+let libraryCacheSync = null;
+let libraryCacheSynced = 0;
+// Reloads what the table shows, so live library changes can refresh it
+let currentView = null;
+let libraryEvents = null;
+let libraryEventId = null;
+
+const LIBRARY_CACHE_DB = 'beetsmanager-library';
+const LIBRARY_CACHE_SYNC_INTERVAL = 10000;
+// Wait before opening the event stream again when the server refused it, like its Retry-After
+const LIBRARY_EVENTS_RETRY_MS = 60000;
+// Fields compared as text when sorting locally, like the server's IFNULL(field, '')
+const LIBRARY_TEXT_FIELDS = ['title', 'artist', 'album', 'albumartist', 'format'];
+
+const FACET_TITLES = {
+    format: 'Format',
+    bitrate: 'Bitrate',
+    samplerate: 'Sample Rate',
+    year: 'Year',
+    genre: 'Genre',
+    label: 'Label'
+};
 
 document.addEventListener('DOMContentLoaded', function() {
     if (document.getElementById('library-container')) {
@@ -19,21 +61,50 @@ function initLibraryView() {
     
     // Load artists for the filter dropdown
     loadArtists();
+    
+    // Load the local copy of the library for the next pages and visits
+    startLibraryCache();
+    
+    // Refresh what is shown when an import or beet command changes the library
+    watchLibraryChanges();
 }
 
 function setupLibraryEventListeners() {
     // Pagination controls
     document.getElementById('prev-page').addEventListener('click', function() {
-        if (currentPage > 1) {
+        if (activeSearch) {
+            if (searchPage > 1) {
+                searchLibrary(activeSearch, searchPage - 1);
+            }
+        } else if (hasFacetFilters()) {
+            if (facetPage > 1) {
+                browseLibrary(facetPage - 1);
+            }
+        } else if (libraryCacheReady) {
+            if (currentPage > 1) {
+                currentPage--;
+                loadLibraryItems();
+            }
+        } else if (prevCursor) {
             currentPage--;
+            currentCursor = prevCursor;
             loadLibraryItems();
         }
     });
     
     document.getElementById('next-page').addEventListener('click', function() {
-        const maxPage = Math.ceil(totalItems / itemsPerPage);
-        if (currentPage < maxPage) {
+        if (activeSearch) {
+            searchLibrary(activeSearch, searchPage + 1);
+        } else if (hasFacetFilters()) {
+            browseLibrary(facetPage + 1);
+        } else if (libraryCacheReady) {
+            if (currentPage * itemsPerPage < totalItems) {
+                currentPage++;
+                loadLibraryItems();
+            }
+        } else if (nextCursor) {
             currentPage++;
+            currentCursor = nextCursor;
             loadLibraryItems();
         }
     });
@@ -45,14 +116,25 @@ function setupLibraryEventListeners() {
         if (searchQuery) {
             searchLibrary(searchQuery);
         } else {
+            activeSearch = null;
             loadLibraryItems();
         }
     });
     
+    // Letter index change
+    document.getElementById('artist-letter').addEventListener('change', function() {
+        artistLetter = this.value;
+        loadArtists();
+    });
+    
     // Artist filter change
     document.getElementById('artist-filter').addEventListener('change', function() {
         const selectedArtist = this.value;
-        if (selectedArtist) {
+        if (this.selectedOptions[0] && this.selectedOptions[0].dataset.more) {
+            // Keep the previous selection and append the next page of artists
+            this.value = '';
+            loadArtists(artistPage + 1);
+        } else if (selectedArtist) {
             loadAlbumsByArtist(selectedArtist);
         }
     });
@@ -63,7 +145,7 @@ function setupLibraryEventListeners() {
             e.preventDefault();
             currentSort = this.getAttribute('data-sort');
             document.getElementById('current-sort').textContent = this.textContent;
-            currentPage = 1;
+            resetPagination();
             loadLibraryItems();
         });
     });
@@ -71,12 +153,86 @@ function setupLibraryEventListeners() {
     // Items per page change
     document.getElementById('items-per-page').addEventListener('change', function() {
         itemsPerPage = parseInt(this.value);
-        currentPage = 1;
+        resetPagination();
         loadLibraryItems();
     });
+    
+    // Load the facet counts the first time the filter panel is opened
+    document.getElementById('facet-panel').addEventListener('show.bs.collapse', function() {
+        if (!facetsLoaded) {
+            browseLibrary(1, true);
+        }
+    });
+    
+    // Facet value checkboxes and the year range
+    document.getElementById('facet-lists').addEventListener('change', function(e) {
+        const input = e.target;
+        if (input.dataset.facet) {
+            const values = facetFilters[input.dataset.facet] || [];
+            facetFilters[input.dataset.facet] = input.checked
+                ? values.concat([input.value])
+                : values.filter(value => value !== input.value);
+        } else if (input.id === 'facet-year-min') {
+            facetYearMin = input.value;
+        } else if (input.id === 'facet-year-max') {
+            facetYearMax = input.value;
+        } else {
+            return;
+        }
+        applyFacetFilters();
+    });
+    
+    document.getElementById('clear-facets').addEventListener('click', function() {
+        facetFilters = {};
+        facetYearMin = '';
+        facetYearMax = '';
+        applyFacetFilters();
+    });
+}
+
+function hasFacetFilters() {
+    return facetYearMin !== '' || facetYearMax !== '' ||
+        Object.values(facetFilters).some(values => values.length > 0);
+}
+
+function applyFacetFilters() {
+    const activeCount = Object.values(facetFilters).reduce((count, values) => count + values.length, 0) +
+        (facetYearMin !== '' || facetYearMax !== '' ? 1 : 0);
+    const badge = document.getElementById('facet-active-count');
+    badge.textContent = activeCount;
+    badge.classList.toggle('d-none', activeCount === 0);
+    
+    activeSearch = null;
+    resetPagination();
+    if (hasFacetFilters()) {
+        browseLibrary(1);
+    } else {
+        // Refresh the counts and go back to the plain library view
+        browseLibrary(1, true);
+        loadLibraryItems();
+    }
+}
+
+function resetPagination() {
+    currentPage = 1;
+    facetPage = 1;
+    currentCursor = null;
+    nextCursor = null;
+    prevCursor = null;
 }
 
 function loadLibraryItems() {
+    if (hasFacetFilters()) {
+        browseLibrary(facetPage);
+        return;
+    }
+    
+    currentView = loadLibraryItems;
+    if (libraryCacheReady) {
+        renderLocalLibraryPage();
+        return;
+    }
+    
     const libraryTable = document.getElementById('library-table');
     const loadingIndicator = document.getElementById('loading-indicator');
     const paginationInfo = document.getElementById('pagination-info');
@@ -86,7 +242,11 @@ function loadLibraryItems() {
     libraryTable.classList.add('d-none');
     
     // Make API request to get library items
-    fetch(`/api/library?page=${currentPage}&limit=${itemsPerPage}&sort=${currentSort}`)
+    const params = new URLSearchParams({ limit: itemsPerPage, sort: currentSort });
+    if (currentCursor) {
+        params.set('cursor', currentCursor);
+    }
+    fetch(`/api/library?${params.toString()}`)
         .then(response => {
             if (!response.ok) {
                 throw new Error('Failed to load library items');
@@ -94,20 +254,25 @@ function loadLibraryItems() {
             return response.json();
         })
         .then(data => {
-            // Update total items count
+            // Update total items count and the cursors for the neighbouring pages
             totalItems = data.total;
+            nextCursor = data.next_cursor;
+            prevCursor = data.prev_cursor;
+            if (!prevCursor) {
+                currentPage = 1;
+            }
             
             // Render items in the table
             renderLibraryItems(data.items);
             
             // Update pagination info
-            const startItem = (currentPage - 1) * itemsPerPage + 1;
-            const endItem = Math.min(startItem + itemsPerPage - 1, totalItems);
+            const startItem = data.items.length ? (currentPage - 1) * itemsPerPage + 1 : 0;
+            const endItem = Math.min(startItem + data.items.length - 1, totalItems);
             paginationInfo.textContent = `Showing ${startItem}-${endItem} of ${totalItems} items`;
             
             // Update pagination buttons state
-            document.getElementById('prev-page').disabled = currentPage === 1;
-            document.getElementById('next-page').disabled = currentPage >= Math.ceil(totalItems / itemsPerPage);
+            document.getElementById('prev-page').disabled = !prevCursor;
+            document.getElementById('next-page').disabled = !nextCursor;
             
             // Hide loading indicator
             loadingIndicator.classList.add('d-none');
@@ -120,6 +285,397 @@ function loadLibraryItems() {
         });
 }
 
+function renderLocalLibraryPage() {
+    const rows = getSortedLibraryRows(currentSort);
+    totalItems = rows.length;
+    const start = (currentPage - 1) * itemsPerPage;
+    const items = rows.slice(start, start + itemsPerPage).map(libraryRowToItem);
+    
+    renderLibraryItems(items);
+    
+    const startItem = items.length ? start + 1 : 0;
+    document.getElementById('pagination-info').textContent =
+        `Showing ${startItem}-${start + items.length} of ${totalItems} items`;
+    document.getElementById('prev-page').disabled = currentPage <= 1;
+    document.getElementById('next-page').disabled = start + itemsPerPage >= totalItems;
+    document.getElementById('loading-indicator').classList.add('d-none');
+    document.getElementById('library-table').classList.remove('d-none');
+    
+    // Pick up changes made since the last sync and show them if the page is still open
+    if (Date.now() - libraryCacheSynced >= LIBRARY_CACHE_SYNC_INTERVAL) {
+        syncLibraryCache().then(changed => {
+            if (changed && libraryCacheReady && !activeSearch && !hasFacetFilters()) {
+                renderLocalLibraryPage();
+            }
+        });
+    }
+}
+
+function startLibraryCache() {
+    if (!window.indexedDB) {
+        return;
+    }
+    openLibraryCache()
+        .then(() => syncLibraryCache())
+        .catch(error => {
+            console.error('Error loading the local library copy:', error);
+        });
+}
+
+function idbRequest(request) {
+    return new Promise((resolve, reject) => {
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function openLibraryCache() {
+    const request = indexedDB.open(LIBRARY_CACHE_DB, 1);
+    request.onupgradeneeded = () => {
+        // Items are stored as rows of the server's fields, keyed by item id
+        request.result.createObjectStore('items');
+        request.result.createObjectStore('meta');
+    };
+    return idbRequest(request).then(db => {
+        const transaction = db.transaction(['items', 'meta'], 'readonly');
+        const meta = transaction.objectStore('meta');
+        return Promise.all([
+            idbRequest(meta.get('token')),
+            idbRequest(meta.get('fields')),
+            idbRequest(meta.get('complete')),
+            idbRequest(transaction.objectStore('items').getAll())
+        ]).then(([token, fields, complete, rows]) => {
+            const items = new Map();
+            rows.forEach(row => items.set(row[0], row));
+            libraryCache = { db, token, fields, complete: Boolean(complete), items, sorted: {} };
+        });
+    });
+}
+
+function syncLibraryCache() {
+    // Resolves to true if anything changed; one sync runs at a time
+    if (!libraryCache) {
+        return Promise.resolve(false);
+    }
+    if (!libraryCacheSync) {
+        libraryCacheSync = fetchLibraryChanges(false)
+            .catch(error => {
+                console.error('Error syncing the local library copy:', error);
+                return false;
+            })
+            .finally(() => {
+                libraryCacheSync = null;
+                libraryCacheSynced = Date.now();
+            });
+    }
+    return libraryCacheSync;
+}
+
+function fetchLibraryChanges(changed) {
+    const params = new URLSearchParams({ limit: 5000 });
+    if (libraryCache.token) {
+        params.set('since', libraryCache.token);
+    }
+    return fetch(`/api/library/changes?${params.toString()}`)
+        .then(response => {
+            if (response.status === 503) {
+                // No change log until the server's replica is built; try again on a later visit
+                return null;
+            }
+            if (!response.ok) {
+                throw new Error('Failed to load library changes');
+            }
+            return response.json();
+        })
+        .then(batch => {
+            if (!batch) {
+                return changed;
+            }
+            if (!batch.reset && JSON.stringify(batch.fields) !== JSON.stringify(libraryCache.fields)) {
+                // Stored with other fields, load everything again
+                libraryCache.token = null;
+                return fetchLibraryChanges(changed);
+            }
+            return applyLibraryChanges(batch).then(() => {
+                changed = changed || batch.reset || batch.items.length > 0 || batch.deleted.length > 0;
+                return batch.has_more ? fetchLibraryChanges(changed) : changed;
+            });
+        });
+}
+
+function applyLibraryChanges(batch) {
+    const transaction = libraryCache.db.transaction(['items', 'meta'], 'readwrite');
+    const items = transaction.objectStore('items');
+    const meta = transaction.objectStore('meta');
+    
+    if (batch.reset) {
+        items.clear();
+        libraryCache.items.clear();
+        libraryCacheReady = false;
+    }
+    batch.items.forEach(row => {
+        items.put(row, row[0]);
+        libraryCache.items.set(row[0], row);
+    });
+    batch.deleted.forEach(id => {
+        items.delete(id);
+        libraryCache.items.delete(id);
+    });
+    if (batch.reset || batch.items.length || batch.deleted.length) {
+        libraryCache.sorted = {};
+    }
+    
+    // The token is stored with the rows, so an interrupted sync resumes where it stopped
+    const complete = !batch.has_more || (libraryCache.complete && !batch.reset);
+    meta.put(batch.token, 'token');
+    meta.put(batch.fields, 'fields');
+    meta.put(complete, 'complete');
+    
+    return new Promise((resolve, reject) => {
+        transaction.oncomplete = () => {
+            libraryCache.token = batch.token;
+            libraryCache.fields = batch.fields;
+            libraryCache.complete = complete;
+            libraryCacheReady = complete;
+            resolve();
+        };
+        transaction.onerror = () => reject(transaction.error);
+        transaction.onabort = () => reject(transaction.error);
+    });
+}
+
+function getSortedLibraryRows(sort) {
+    // Sorted like the server: NULLs as '' or 0, ties broken by id
+    if (!libraryCache.sorted[sort]) {
+        const fields = libraryCache.fields;
+        const keys = sort.split(',').map(spec => {
+            const name = spec.replace(/^-/, '');
+            return {
+                index: fields.indexOf(name),
+                descending: spec.startsWith('-'),
+                empty: LIBRARY_TEXT_FIELDS.includes(name) ? '' : 0
+            };
+        });
+        const idIndex = fields.indexOf('id');
+        libraryCache.sorted[sort] = Array.from(libraryCache.items.values()).sort((a, b) => {
+            for (const key of keys) {
+                const x = a[key.index] ?? key.empty;
+                const y = b[key.index] ?? key.empty;
+                if (x !== y) {
+                    return (x < y ? -1 : 1) * (key.descending ? -1 : 1);
+                }
+            }
+            return a[idIndex] - b[idIndex];
+        });
+    }
+    return libraryCache.sorted[sort];
+}
+
+function libraryRowToItem(row) {
+    const item = {};
+    libraryCache.fields.forEach((field, index) => {
+        item[field] = row[index];
+    });
+    if (item.length) {
+        const seconds = Math.floor(item.length);
+        item.length_formatted = `${Math.floor(seconds / 60)}:${String(seconds % 60).padStart(2, '0')}`;
+    }
+    return item;
+}
+
+function watchLibraryChanges() {
+    if (!window.EventSource) {
+        return;
+    }
+    // EventSource reconnects by itself and the server replays what was missed
+    const since = libraryEventId ? '?since=' + encodeURIComponent(libraryEventId) : '';
+    libraryEvents = new EventSource('/api/library/events' + since);
+    libraryEvents.addEventListener('state', function(e) {
+        libraryEventId = e.lastEventId;
+    });
+    libraryEvents.addEventListener('change', function(e) {
+        libraryEventId = e.lastEventId;
+        handleLibraryChange(JSON.parse(e.data));
+    });
+    libraryEvents.addEventListener('error', function() {
+        // A refused stream (too many open) is not retried by EventSource
+        if (libraryEvents.readyState === EventSource.CLOSED) {
+            setTimeout(watchLibraryChanges, LIBRARY_EVENTS_RETRY_MS);
+        }
+    });
+}
+
+function handleLibraryChange(change) {
+    // The plain view pages from the local copy, so bring that up to date first
+    const synced = libraryCache ? syncLibraryCache() : Promise.resolve(false);
+    synced.then(() => {
+        if (currentView && libraryViewAffected(change)) {
+            currentView();
+        }
+    });
+}
+
+function libraryViewAffected(change) {
+    if (change.items === null) {
+        // Too many changes to list, or the server cannot tell which
+        return true;
+    }
+    if (currentView === loadLibraryItems) {
+        // Any change can move rows into a sorted page; local pages cost no request
+        return libraryCacheReady || change.counts.items !== totalItems ||
+            change.items.length > 0 || change.deleted.length > 0;
+    }
+    const changedItems = new Set(change.items.concat(change.deleted));
+    const changedAlbums = new Set(change.albums);
+    const tableBody = document.getElementById('library-table-body');
+    return Array.from(tableBody.querySelectorAll('[data-item-id]'))
+        .some(row => changedItems.has(Number(row.dataset.itemId))) ||
+        Array.from(tableBody.querySelectorAll('[data-album-id]'))
+            .some(image => changedAlbums.has(Number(image.dataset.albumId)));
+}
+
+function browseLibrary(page = 1, countsOnly = false) {
+    if (!countsOnly) {
+        currentView = () => browseLibrary(facetPage);
+    }
+    const libraryTable = document.getElementById('library-table');
+    const loadingIndicator = document.getElementById('loading-indicator');
+    const paginationInfo = document.getElementById('pagination-info');
+    const facetStatus = document.getElementById('facet-status');
+    
+    const params = new URLSearchParams({
+        page: page,
+        limit: countsOnly ? 1 : itemsPerPage,
+        sort: currentSort
+    });
+    Object.entries(facetFilters).forEach(([name, values]) => {
+        values.forEach(value => params.append(name, value));
+    });
+    if (facetYearMin !== '') {
+        params.set('year_min', facetYearMin);
+    }
+    if (facetYearMax !== '') {
+        params.set('year_max', facetYearMax);
+    }
+    
+    if (!countsOnly) {
+        loadingIndicator.classList.remove('d-none');
+        libraryTable.classList.add('d-none');
+    }
+    
+    fetch(`/api/browse?${params.toString()}`)
+        .then(response => {
+            if (!response.ok) {
+                return response.json()
+                    .catch(() => ({}))
+                    .then(data => {
+                        throw new Error(data.error || 'Failed to filter library');
+                    });
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (data.building) {
+                // The facet counts are computed once in the background
+                facetStatus.textContent = 'Building filters, this may take a moment...';
+                setTimeout(() => browseLibrary(page, countsOnly), 2000);
+                return;
+            }
+            
+            facetsLoaded = true;
+            renderFacets(data.facets);
+            facetStatus.textContent = `${data.total} matching items`;
+            if (countsOnly) {
+                return;
+            }
+            
+            facetPage = page;
+            renderLibraryItems(data.items);
+            
+            // Update pagination info
+            const startItem = data.items.length ? (page - 1) * itemsPerPage + 1 : 0;
+            const endItem = startItem ? startItem + data.items.length - 1 : 0;
+            paginationInfo.textContent = `Showing ${startItem}-${endItem} of ${data.total} filtered items`;
+            
+            document.getElementById('prev-page').disabled = page === 1;
+            document.getElementById('next-page').disabled = !data.has_more;
+            
+            loadingIndicator.classList.add('d-none');
+            libraryTable.classList.remove('d-none');
+        })
+        .catch(error => {
+            console.error('Error filtering library:', error);
+            showError('Failed to filter library: ' + error.message);
+            loadingIndicator.classList.add('d-none');
+        });
+}
+
+function formatFacetValue(name, value) {
+    if (value === '' || value === 0) {
+        return 'Unknown';
+    }
+    if (name === 'bitrate') {
+        return `${value}+ kbps`;
+    }
+    if (name === 'samplerate') {
+        return `${value / 1000} kHz`;
+    }
+    return value;
+}
+
+function renderFacets(facets) {
+    const facetLists = document.getElementById('facet-lists');
+    facetLists.innerHTML = '';
+    
+    Object.keys(FACET_TITLES).forEach(name => {
+        const column = document.createElement('div');
+        column.className = 'col-md-2';
+        
+        const heading = document.createElement('h6');
+        heading.textContent = FACET_TITLES[name];
+        column.appendChild(heading);
+        
+        if (name === 'year') {
+            column.insertAdjacentHTML('beforeend', `
+                <div class="input-group input-group-sm mb-2">
+                    <input type="number" id="facet-year-min" class="form-control" placeholder="From">
+                    <input type="number" id="facet-year-max" class="form-control" placeholder="To">
+                </div>
+            `);
+            column.querySelector('#facet-year-min').value = facetYearMin;
+            column.querySelector('#facet-year-max').value = facetYearMax;
+        }
+        
+        const list = document.createElement('div');
+        list.className = 'facet-list';
+        const selected = facetFilters[name] || [];
+        (facets[name] || []).forEach((entry, index) => {
+            const id = `facet-${name}-${index}`;
+            const option = document.createElement('div');
+            option.className = 'form-check';
+            
+            const input = document.createElement('input');
+            input.type = 'checkbox';
+            input.className = 'form-check-input';
+            input.id = id;
+            input.value = String(entry.value);
+            input.dataset.facet = name;
+            input.checked = selected.includes(input.value);
+            
+            const label = document.createElement('label');
+            label.className = 'form-check-label small';
+            label.htmlFor = id;
+            label.textContent = `${formatFacetValue(name, entry.value)} (${entry.count})`;
+            
+            option.appendChild(input);
+            option.appendChild(label);
+            list.appendChild(option);
+        });
+        column.appendChild(list);
+        facetLists.appendChild(column);
+    });
+}
+
 function renderLibraryItems(items) {
     const tableBody = document.getElementById('library-table-body');
     
@@ -128,7 +684,7 @@ function renderLibraryItems(items) {
     
     if (items.length === 0) {
         const emptyRow = document.createElement('tr');
-        emptyRow.innerHTML = `<td colspan="6" class="text-center">No items found</td>`;
+        emptyRow.innerHTML = `<td colspan="7" class="text-center">No items found</td>`;
         tableBody.appendChild(emptyRow);
         return;
     }
@@ -140,6 +696,7 @@ function renderLibraryItems(items) {
         row.style.cursor = 'pointer';
         
         row.innerHTML = `
+            <td class="album-thumb-cell">${item.album_id ? `<img class="album-thumb d-none" data-album-id="${item.album_id}" alt="">` : ''}</td>
             <td>${item.title || 'Unknown'}</td>
             <td>${item.artist || 'Unknown'}</td>
             <td>${item.album || 'Unknown'}</td>
@@ -155,6 +712,40 @@ function renderLibraryItems(items) {
         
         tableBody.appendChild(row);
     });
+    
+    loadAlbumThumbnails(items);
+}
+
+function loadAlbumThumbnails(items) {
+    // One request warms the art cache for every album on the page
+    const albumIds = [...new Set(items.map(item => item.album_id).filter(id => id))];
+    if (albumIds.length === 0) {
+        return;
+    }
+    
+    fetch('/api/art/prefetch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ album_ids: albumIds, size: 64 })
+    })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Failed to load album art');
+            }
+            return response.json();
+        })
+        .then(data => {
+            document.querySelectorAll('img.album-thumb').forEach(img => {
+                const url = data.art[img.getAttribute('data-album-id')];
+                if (url) {
+                    img.src = url;
+                    img.classList.remove('d-none');
+                }
+            });
+        })
+        .catch(error => {
+            console.error('Error loading album thumbnails:', error);
+        });
 }
 
 function showItemDetails(itemId) {
@@ -226,34 +817,23 @@ function showItemDetails(itemId) {
 function loadAlbumArt(itemId) {
     const artContainer = document.getElementById('album-art-container');
     
-    fetch(`/api/albumart/${itemId}`)
-        .then(response => {
-            if (!response.ok) {
-                throw new Error('Failed to load album art');
-            }
-            return response.json();
-        })
-        .then(data => {
-            if (data.albumArt) {
-                // Create and display the image
-                const img = document.createElement('img');
-                img.src = `data:image/jpeg;base64,${data.albumArt}`;
-                img.className = 'img-fluid rounded';
-                img.alt = 'Album Cover';
-                artContainer.innerHTML = '';
-                artContainer.appendChild(img);
-            } else {
-                // Show placeholder
-                artContainer.innerHTML = '<div class="text-center p-5 bg-light rounded"><i class="fas fa-music fa-4x text-muted"></i><p class="mt-3 text-muted">No album art available</p></div>';
-            }
-        })
-        .catch(error => {
-            console.error('Error loading album art:', error);
-            artContainer.innerHTML = '<div class="text-center p-5 bg-light rounded"><i class="fas fa-music fa-4x text-muted"></i><p class="mt-3 text-muted">No album art available</p></div>';
-        });
+    // The item URL redirects to a versioned per-album URL the browser can cache
+    const img = document.createElement('img');
+    img.className = 'img-fluid rounded';
+    img.alt = 'Album Cover';
+    img.addEventListener('load', function() {
+        artContainer.innerHTML = '';
+        artContainer.appendChild(img);
+    });
+    img.addEventListener('error', function() {
+        // Show placeholder
+        artContainer.innerHTML = '<div class="text-center p-5 bg-light rounded"><i class="fas fa-music fa-4x text-muted"></i><p class="mt-3 text-muted">No album art available</p></div>';
+    });
+    img.src = `/api/art/item/${itemId}`;
 }
 
-function searchLibrary(query) {
+function searchLibrary(query, page = 1) {
+    currentView = () => searchLibrary(query, page);
     const libraryTable = document.getElementById('library-table');
     const loadingIndicator = document.getElementById('loading-indicator');
     const paginationInfo = document.getElementById('pagination-info');
@@ -262,23 +842,44 @@ function searchLibrary(query) {
     loadingIndicator.classList.remove('d-none');
     libraryTable.classList.add('d-none');
     
+    // Ranges, regexes, negation, alternatives and sorts need the beets query API
+    const beetsSyntax = /\.\.|::|:=|(^|\s)[-^]\S|(^|\s),(\s|$)|\w[+-](\s|$)/.test(query);
+    const url = beetsSyntax
+        ? `/api/query?${new URLSearchParams({ q: query, page: page, limit: itemsPerPage })}`
+        : `/api/search?${new URLSearchParams({ query: query, page: page, limit: itemsPerPage })}`;
+    
     // Make API request to search the library
-    fetch(`/api/search?query=${encodeURIComponent(query)}`)
+    fetch(url)
         .then(response => {
             if (!response.ok) {
-                throw new Error('Failed to search library');
+                return response.json()
+                    .catch(() => ({}))
+                    .then(data => {
+                        throw new Error(data.error || 'Failed to search library');
+                    });
             }
             return response.json();
         })
         .then(data => {
+            activeSearch = query;
+            searchPage = page;
+            
             // Render search results
             renderLibraryItems(data.results);
             
             // Update pagination info
-            paginationInfo.textContent = `Found ${data.results.length} items matching "${query}"`;
+            const startItem = (page - 1) * itemsPerPage + 1;
+            const endItem = startItem + data.results.length - 1;
+            if (data.results.length === 0) {
+                paginationInfo.textContent = `No items matching "${query}"`;
+            } else {
+                paginationInfo.textContent = `Showing ${startItem}-${endItem}${data.has_more ? '+' : ''} items matching "${query}"`;
+            }
             
-            // Hide pagination buttons during search
-            document.getElementById('pagination-controls').classList.add('d-none');
+            // Page through search results with the regular pagination buttons
+            document.getElementById('pagination-controls').classList.remove('d-none');
+            document.getElementById('prev-page').disabled = page === 1;
+            document.getElementById('next-page').disabled = !data.has_more;
             
             // Show clear search button
             const clearButton = document.getElementById('clear-search');
@@ -287,7 +888,8 @@ function searchLibrary(query) {
                 document.getElementById('search-input').value = '';
                 document.getElementById('pagination-controls').classList.remove('d-none');
                 this.classList.add('d-none');
-                currentPage = 1;
+                activeSearch = null;
+                resetPagination();
                 loadLibraryItems();
             });
             
@@ -302,10 +904,14 @@ function searchLibrary(query) {
         });
 }
 
-function loadArtists() {
+function loadArtists(page = 1) {
     const artistFilter = document.getElementById('artist-filter');
+    const params = new URLSearchParams({ page: page, limit: 200 });
+    if (artistLetter) {
+        params.set('letter', artistLetter);
+    }
     
-    fetch('/api/artists')
+    fetch(`/api/artists?${params}`)
         .then(response => {
             if (!response.ok) {
                 throw new Error('Failed to load artists');
@@ -313,16 +919,34 @@ function loadArtists() {
             return response.json();
         })
         .then(data => {
-            // Clear existing options but keep the default one
-            artistFilter.innerHTML = '<option value="">All Artists</option>';
+            artistPage = page;
+            updateLetterIndex(data.letters);
+            
+            if (page === 1) {
+                // Clear existing options but keep the default one
+                artistFilter.innerHTML = '<option value="">All Artists</option>';
+            } else {
+                const more = artistFilter.querySelector('option[data-more]');
+                if (more) {
+                    more.remove();
+                }
+            }
             
             // Add artist options
             data.artists.forEach(artist => {
                 const option = document.createElement('option');
-                option.value = artist;
-                option.textContent = artist;
+                option.value = artist.artist;
+                option.textContent = `${artist.artist} (${artist.album_count} albums, ${artist.track_count} tracks)`;
                 artistFilter.appendChild(option);
             });
+            
+            if (data.has_more) {
+                const option = document.createElement('option');
+                option.value = '';
+                option.dataset.more = 'true';
+                option.textContent = 'Load more…';
+                artistFilter.appendChild(option);
+            }
         })
         .catch(error => {
             console.error('Error loading artists:', error);
@@ -330,7 +954,28 @@ function loadArtists() {
         });
 }
 
+function updateLetterIndex(letters) {
+    const letterSelect = document.getElementById('artist-letter');
+    const total = letters.reduce((sum, entry) => sum + entry.count, 0);
+    
+    letterSelect.innerHTML = '';
+    const all = document.createElement('option');
+    all.value = '';
+    all.textContent = `All (${total})`;
+    letterSelect.appendChild(all);
+    
+    letters.forEach(entry => {
+        const option = document.createElement('option');
+        option.value = entry.letter;
+        option.textContent = `${entry.letter} (${entry.count})`;
+        letterSelect.appendChild(option);
+    });
+    letterSelect.value = artistLetter;
+}
+
 function loadAlbumsByArtist(artist) {
+    activeSearch = null;
+    currentView = () => loadAlbumsByArtist(artist);
     const libraryTable = document.getElementById('library-table');
     const loadingIndicator = document.getElementById('loading-indicator');
     const paginationInfo = document.getElementById('pagination-info');
@@ -340,7 +985,7 @@ function loadAlbumsByArtist(artist) {
     libraryTable.classList.add('d-none');
     
     // Make API request to get albums by artist
-    fetch(`/api/albums?artist=${encodeURIComponent(artist)}`)
+    fetch(`/api/albums?artist=${encodeURIComponent(artist)}&limit=500`)
         .then(response => {
             if (!response.ok) {
                 throw new Error('Failed to load albums');
@@ -355,7 +1000,7 @@ function loadAlbumsByArtist(artist) {
             
             if (data.albums.length === 0) {
                 const emptyRow = document.createElement('tr');
-                emptyRow.innerHTML = `<td colspan="6" class="text-center">No albums found for artist "${artist}"</td>`;
+                emptyRow.innerHTML = `<td colspan="7" class="text-center">No albums found for artist "${artist}"</td>`;
                 tableBody.appendChild(emptyRow);
             } else {
                 // Create a row for each album
@@ -364,23 +1009,26 @@ function loadAlbumsByArtist(artist) {
                     row.style.cursor = 'pointer';
                     
                     row.innerHTML = `
-                        <td colspan="2">${album.album || 'Unknown'}</td>
-                        <td>${album.artist || artist}</td>
+                        <td class="album-thumb-cell"><img class="album-thumb d-none" data-album-id="${album.id}" alt=""></td>
+                        <td>${album.album || 'Unknown'}</td>
+                        <td>${album.albumartist || artist}</td>
+                        <td>${album.track_count} tracks${album.disc_count > 1 ? `, ${album.disc_count} discs` : ''}</td>
                         <td>${album.year || '-'}</td>
-                        <td colspan="2">${album.albumartist || artist}</td>
+                        <td>${album.length_formatted}</td>
+                        <td>${album.formats.join(', ') || '-'}${album.avg_bitrate ? ` <small class="text-muted">${Math.round(album.avg_bitrate / 1000)} kbps</small>` : ''}</td>
                     `;
                     
-                    // Add click event to filter by album
+                    // Add click event to show the album's tracklist
                     row.addEventListener('click', function() {
-                        const query = `album:${album.album} artist:${artist}`;
-                        document.getElementById('search-input').value = query;
-                        searchLibrary(query);
+                        loadAlbumTracks(album.id);
                     });
                     
                     tableBody.appendChild(row);
                 });
             }
             
+            loadAlbumThumbnails(data.albums.map(album => ({ album_id: album.id })));
+            
             // Update pagination info
             paginationInfo.textContent = `Showing ${data.albums.length} albums for artist "${artist}"`;
             
@@ -394,7 +1042,7 @@ function loadAlbumsByArtist(artist) {
                 document.getElementById('artist-filter').value = '';
                 document.getElementById('pagination-controls').classList.remove('d-none');
                 this.classList.add('d-none');
-                currentPage = 1;
+                resetPagination();
                 loadLibraryItems();
             });
             
@@ -408,3 +1056,36 @@ function loadAlbumsByArtist(artist) {
             loadingIndicator.classList.add('d-none');
         });
 }
+
+function loadAlbumTracks(albumId) {
+    currentView = () => loadAlbumTracks(albumId);
+    const libraryTable = document.getElementById('library-table');
+    const loadingIndicator = document.getElementById('loading-indicator');
+    const paginationInfo = document.getElementById('pagination-info');
+    
+    // Show loading indicator
+    loadingIndicator.classList.remove('d-none');
+    libraryTable.classList.add('d-none');
+    
+    // The album and its ordered tracklist come in one request
+    fetch(`/api/album/${albumId}`)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Failed to load album');
+            }
+            return response.json();
+        })
+        .then(album => {
+            renderLibraryItems(album.tracks);
+            paginationInfo.textContent = `${album.album || 'Unknown'} by ${album.albumartist || 'Unknown'}: ${album.track_count} tracks, ${album.length_formatted}`;
+            
+            // Hide loading indicator
+            loadingIndicator.classList.add('d-none');
+            libraryTable.classList.remove('d-none');
+        })
+        .catch(error => {
+            console.error('Error loading album:', error);
+            showError('Failed to load album: ' + error.message);
+            loadingIndicator.classList.add('d-none');
+        });
+}
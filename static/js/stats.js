@@ -0,0 +1,110 @@
+document.addEventListener('DOMContentLoaded', function() {
+    if (document.getElementById('library-stats')) {
+        loadLibraryStats();
+    }
+});
+
+function loadLibraryStats() {
+    fetch('/api/stats')
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Failed to load library statistics');
+            }
+            return response.json();
+        })
+        .then(stats => {
+            if (stats.building) {
+                // The first computation runs in the background, ask again shortly
+                setTimeout(loadLibraryStats, 2000);
+                return;
+            }
+            renderLibraryStats(stats);
+        })
+        .catch(error => {
+            console.error('Error loading library stats:', error);
+            const loading = document.getElementById('stats-loading');
+            loading.classList.remove('text-muted');
+            loading.classList.add('text-danger');
+            loading.textContent = error.message;
+        });
+}
+
+function renderLibraryStats(stats) {
+    document.getElementById('stats-items').textContent = stats.totals.items.toLocaleString();
+    document.getElementById('stats-duration').textContent = formatDuration(stats.totals.length);
+    document.getElementById('stats-size').textContent = formatBytes(stats.totals.size);
+    
+    renderDistribution('stats-formats', stats.formats, stats.totals.items, key => key);
+    renderDistribution('stats-bitrates', stats.bitrates, stats.totals.items, key => {
+        if (!key) {
+            return 'Unknown';
+        }
+        if (key >= stats.bitrate_max_kbps) {
+            return `${key}+ kbps`;
+        }
+        return `${key}–${key + stats.bitrate_bucket_kbps - 1} kbps`;
+    });
+    renderDistribution('stats-samplerates', stats.samplerates, stats.totals.items,
+        key => key ? `${(key / 1000).toLocaleString()} kHz` : 'Unknown');
+    renderHistogram('stats-years', stats.years.filter(bucket => bucket.key), key => key);
+    renderHistogram('stats-added', stats.added_per_month.filter(bucket => bucket.key), key => key);
+    
+    document.getElementById('stats-loading').classList.add('d-none');
+    document.getElementById('stats-content').classList.remove('d-none');
+}
+
+function renderDistribution(elementId, buckets, total, label) {
+    const container = document.getElementById(elementId);
+    container.innerHTML = '';
+    
+    buckets.forEach(bucket => {
+        const percent = total ? (bucket.count / total) * 100 : 0;
+        const row = document.createElement('div');
+        row.className = 'mb-1';
+        row.innerHTML = `
+            <div class="d-flex justify-content-between small">
+                <span>${label(bucket.key)}</span>
+                <span class="text-muted">${bucket.count.toLocaleString()}</span>
+            </div>
+            <div class="progress" style="height: 4px;">
+                <div class="progress-bar" role="progressbar" style="width: ${percent}%"></div>
+            </div>
+        `;
+        container.appendChild(row);
+    });
+}
+
+function renderHistogram(elementId, buckets, label) {
+    const container = document.getElementById(elementId);
+    container.innerHTML = '';
+    
+    const max = Math.max(...buckets.map(bucket => bucket.count), 1);
+    buckets.forEach(bucket => {
+        const bar = document.createElement('div');
+        bar.className = 'stats-histogram-bar';
+        bar.style.height = `${(bucket.count / max) * 100}%`;
+        bar.title = `${label(bucket.key)}: ${bucket.count.toLocaleString()} tracks`;
+        container.appendChild(bar);
+    });
+}
+
+function formatDuration(seconds) {
+    const days = Math.floor(seconds / 86400);
+    const hours = Math.floor((seconds % 86400) / 3600);
+    const minutes = Math.floor((seconds % 3600) / 60);
+    if (days > 0) {
+        return `${days}d ${hours}h`;
+    }
+    return `${hours}h ${minutes}m`;
+}
+
+function formatBytes(bytes) {
+    const units = ['B', 'KB', 'MB', 'GB', 'TB', 'PB'];
+    let value = bytes;
+    let unit = 0;
+    while (value >= 1024 && unit < units.length - 1) {
+        value /= 1024;
+        unit++;
+    }
+    return `${value.toFixed(unit ? 1 : 0)} ${units[unit]}`;
+}
@@ -0,0 +1,339 @@
+import io
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from beets_utils import connect_db
+from sidecar import get_cache_dir, connect_sidecar
+from art_cache import get_art_source, art_cache_key, load_art_bytes, get_cached_album_art
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Thumbnail edge lengths in pixels; images keep their aspect ratio
+THUMBNAIL_SIZES = (64, 256, 512)
+
+THUMBNAIL_FORMAT = os.environ.get("THUMBNAIL_FORMAT", "webp").lower()
+THUMBNAIL_QUALITY = int(os.environ.get("THUMBNAIL_QUALITY", "80"))
+
+# Worker processes for the batch job, one per core by default
+THUMBNAIL_WORKERS = int(os.environ.get("THUMBNAIL_WORKERS", "0")) or os.cpu_count() or 1
+
+# Albums handed to the process pool per batch; progress is saved after each one
+THUMBNAIL_BATCH_SIZE = 64
+
+# A running job whose heartbeat is older than this belongs to a dead process
+JOB_STALE_AFTER = 120
+
+_FORMATS = {
+    "webp": ("WEBP", "webp", "image/webp"),
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+    "jpg": ("JPEG", "jpg", "image/jpeg"),
+}
+
+_job_lock = threading.Lock()
+_job_thread = None
+
+def thumbnails_available():
+    """Return True if Pillow is installed, which thumbnails require."""
+    return Image is not None
+
+def _format_info(fmt=None):
+    return _FORMATS.get(fmt or THUMBNAIL_FORMAT, _FORMATS["jpeg"])
+
+def get_thumbnail_dir():
+    """Get the directory holding generated thumbnails."""
+    thumb_dir = get_cache_dir() / "thumbs"
+    thumb_dir.mkdir(parents=True, exist_ok=True)
+    return thumb_dir
+
+def thumbnail_path(thumb_dir, key, size, fmt=None):
+    """Get the file a thumbnail of the given size is stored in."""
+    _, extension, _ = _format_info(fmt)
+    return os.path.join(thumb_dir, str(size), f"{key}.{extension}")
+
+def render_thumbnails(data, key, thumb_dir, sizes=THUMBNAIL_SIZES, fmt=None):
+    """Resize an image to each thumbnail size and write the results.
+
+    Images smaller than a size are stored as-is rather than upscaled.
+    Returns the number of files written.
+    """
+    pil_format, _, _ = _format_info(fmt)
+    try:
+        image = Image.open(io.BytesIO(data))
+    except Exception:
+        raise ValueError("Album art is not a readable image")
+    with image:
+        image.load()
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        written = 0
+        for size in sorted(sizes, reverse=True):
+            path = thumbnail_path(thumb_dir, key, size, fmt)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            thumb = image.copy()
+            thumb.thumbnail((size, size), Image.LANCZOS)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            thumb.save(tmp_path, pil_format, quality=THUMBNAIL_QUALITY)
+            os.replace(tmp_path, path)
+            written += 1
+    return written
+
+def _generate_for_album(album_id, source, key, thumb_dir, fmt):
+    """Process pool task: load an album's art and write its thumbnails."""
+    data = load_art_bytes(source, use_beet=False)
+    if not data:
+        return album_id, "missing", None
+    render_thumbnails(data, key, thumb_dir, fmt=fmt)
+    return album_id, "generated", None
+
+def get_album_thumbnail(album_id, size):
+    """Get the thumbnail of an album's art, generating it if needed.
+
+    Returns a dictionary with the cache ``key``, ``path`` and ``mimetype``, or
+    None if the album has no art. Raises ValueError for unsupported sizes.
+    """
+    if size not in THUMBNAIL_SIZES:
+        raise ValueError(f"Unsupported thumbnail size {size}, use one of {THUMBNAIL_SIZES}")
+    if not thumbnails_available():
+        raise RuntimeError("Pillow is not installed, thumbnails are unavailable")
+
+    source = get_art_source(album_id=album_id)
+    if source is None:
+        return None
+    key = art_cache_key(source)
+    thumb_dir = get_thumbnail_dir()
+    path = thumbnail_path(thumb_dir, key, size)
+    if not os.path.exists(path):
+        art = get_cached_album_art(album_id=album_id)
+        if not art:
+            return None
+        # Only the size asked for; the job or later requests render the others
+        with open(art["path"], "rb") as f:
+            render_thumbnails(f.read(), key, thumb_dir, sizes=[size])
+    return {"key": key, "path": path, "mimetype": _format_info()[2]}
+
+def _create_job_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS thumbnail_jobs (
+            id INTEGER PRIMARY KEY,
+            status TEXT NOT NULL,
+            created REAL NOT NULL,
+            updated REAL NOT NULL,
+            finished REAL,
+            owner_pid INTEGER,
+            last_album_id INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            processed INTEGER NOT NULL DEFAULT 0,
+            generated INTEGER NOT NULL DEFAULT 0,
+            skipped INTEGER NOT NULL DEFAULT 0,
+            missing INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            elapsed REAL NOT NULL DEFAULT 0,
+            error TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS thumbnail_failures (
+            job_id INTEGER NOT NULL,
+            album_id INTEGER NOT NULL,
+            error TEXT,
+            PRIMARY KEY (job_id, album_id)
+        )
+    """)
+
+def _latest_job(conn):
+    return conn.execute("SELECT * FROM thumbnail_jobs ORDER BY id DESC LIMIT 1").fetchone()
+
+def _is_alive(job):
+    return job["status"] in ("running", "pausing") and time.time() - job["updated"] < JOB_STALE_AFTER
+
+def start_thumbnail_job(restart=False):
+    """Start the thumbnail job, resuming an unfinished one where it stopped.
+
+    With ``restart`` a new job is started from the first album. Returns the
+    job's status; does nothing if a job is already running.
+    """
+    global _job_thread
+    if not thumbnails_available():
+        raise RuntimeError("Pillow is not installed, thumbnails are unavailable")
+
+    with _job_lock:
+        conn = connect_sidecar()
+        try:
+            _create_job_tables(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            job = _latest_job(conn)
+            if job and _is_alive(job):
+                conn.execute("ROLLBACK")
+                return get_thumbnail_job_status()
+
+            now = time.time()
+            if job and job["status"] != "finished" and not restart:
+                job_id = job["id"]
+                conn.execute("""
+                    UPDATE thumbnail_jobs
+                    SET status = 'running', updated = ?, owner_pid = ?, error = NULL
+                    WHERE id = ?
+                """, (now, os.getpid(), job_id))
+                logger.info(f"Resuming thumbnail job {job_id} after album {job['last_album_id']}")
+            else:
+                lib = connect_db()
+                try:
+                    total = lib.execute("SELECT COUNT(*) FROM albums").fetchone()[0]
+                finally:
+                    lib.close()
+                job_id = conn.execute("""
+                    INSERT INTO thumbnail_jobs (status, created, updated, owner_pid, total)
+                    VALUES ('running', ?, ?, ?, ?)
+                """, (now, now, os.getpid(), total)).lastrowid
+                logger.info(f"Starting thumbnail job {job_id} for {total} albums")
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+        _job_thread = threading.Thread(target=_run_job, args=(job_id,), daemon=True)
+        _job_thread.start()
+    return get_thumbnail_job_status()
+
+def pause_thumbnail_job():
+    """Ask the running thumbnail job to stop after its current batch."""
+    conn = connect_sidecar()
+    try:
+        _create_job_tables(conn)
+        conn.execute("UPDATE thumbnail_jobs SET status = 'pausing' WHERE status = 'running'")
+    finally:
+        conn.close()
+    return get_thumbnail_job_status()
+
+def _next_albums(after_id):
+    lib = connect_db()
+    try:
+        rows = lib.execute("""
+            SELECT id FROM albums WHERE id > ? ORDER BY id LIMIT ?
+        """, (after_id, THUMBNAIL_BATCH_SIZE)).fetchall()
+        return [row[0] for row in rows]
+    finally:
+        lib.close()
+
+def _run_job(job_id):
+    """Walk the albums table in id order, generating missing thumbnails."""
+    thumb_dir = str(get_thumbnail_dir())
+    conn = connect_sidecar()
+    # Spawned workers avoid forking a process that runs other threads. They
+    # import __main__ again; app.py skips its startup work in them.
+    pool = ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS,
+                               mp_context=multiprocessing.get_context("spawn"))
+    try:
+        while True:
+            job = conn.execute("SELECT * FROM thumbnail_jobs WHERE id = ?", (job_id,)).fetchone()
+            if job["status"] != "running":
+                conn.execute("UPDATE thumbnail_jobs SET status = 'paused', updated = ? WHERE id = ?",
+                             (time.time(), job_id))
+                logger.info(f"Thumbnail job {job_id} paused after album {job['last_album_id']}")
+                return
+
+            album_ids = _next_albums(job["last_album_id"])
+            if not album_ids:
+                now = time.time()
+                conn.execute("""
+                    UPDATE thumbnail_jobs SET status = 'finished', finished = ?, updated = ? WHERE id = ?
+                """, (now, now, job_id))
+                logger.info(f"Thumbnail job {job_id} finished")
+                return
+
+            started = time.time()
+            counts = {"generated": 0, "skipped": 0, "missing": 0, "failed": 0}
+            failures = []
+            futures = []
+            for album_id in album_ids:
+                try:
+                    source = get_art_source(album_id=album_id)
+                    if source is None:
+                        counts["missing"] += 1
+                        continue
+                    key = art_cache_key(source)
+                    if all(os.path.exists(thumbnail_path(thumb_dir, key, size)) for size in THUMBNAIL_SIZES):
+                        counts["skipped"] += 1
+                        continue
+                    futures.append((album_id, pool.submit(_generate_for_album, album_id, source, key,
+                                                          thumb_dir, THUMBNAIL_FORMAT)))
+                except Exception as e:
+                    counts["failed"] += 1
+                    failures.append((job_id, album_id, str(e)))
+
+            for album_id, future in futures:
+                try:
+                    _, outcome, _ = future.result()
+                    counts[outcome] += 1
+                except Exception as e:
+                    counts["failed"] += 1
+                    failures.append((job_id, album_id, str(e)))
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("""
+                    UPDATE thumbnail_jobs
+                    SET last_album_id = ?, processed = processed + ?, generated = generated + ?,
+                        skipped = skipped + ?, missing = missing + ?, failed = failed + ?,
+                        elapsed = elapsed + ?, updated = ?
+                    WHERE id = ?
+                """, (album_ids[-1], len(album_ids), counts["generated"], counts["skipped"],
+                      counts["missing"], counts["failed"], time.time() - started, time.time(), job_id))
+                conn.executemany("INSERT OR REPLACE INTO thumbnail_failures (job_id, album_id, error) VALUES (?, ?, ?)",
+                                 failures)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    except Exception as e:
+        logger.error(f"Thumbnail job {job_id} failed: {str(e)}")
+        try:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            # Autocommit, so the status is stored even though the batch was not
+            conn.execute("UPDATE thumbnail_jobs SET status = 'interrupted', error = ?, updated = ? WHERE id = ?",
+                         (str(e), time.time(), job_id))
+        except Exception as e:
+            logger.error(f"Could not mark thumbnail job {job_id} as interrupted: {str(e)}")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        conn.close()
+
+def get_thumbnail_job_status():
+    """Get progress, throughput and recent failures of the latest thumbnail job."""
+    conn = connect_sidecar()
+    try:
+        _create_job_tables(conn)
+        job = _latest_job(conn)
+        if not job:
+            return {"status": "idle", "available": thumbnails_available(), "sizes": list(THUMBNAIL_SIZES)}
+        status = dict(job)
+        if job["status"] in ("running", "pausing") and not _is_alive(job):
+            status["status"] = "interrupted"
+        failures = conn.execute("""
+            SELECT album_id, error FROM thumbnail_failures WHERE job_id = ? ORDER BY album_id DESC LIMIT 20
+        """, (job["id"],)).fetchall()
+    finally:
+        conn.close()
+
+    rate = status["processed"] / status["elapsed"] if status["elapsed"] else 0
+    remaining = max(status["total"] - status["processed"], 0)
+    status.update({
+        "available": thumbnails_available(),
+        "sizes": list(THUMBNAIL_SIZES),
+        "format": THUMBNAIL_FORMAT,
+        "workers": THUMBNAIL_WORKERS,
+        "remaining": remaining,
+        "albums_per_second": round(rate, 2),
+        "eta_seconds": round(remaining / rate) if rate else None,
+        "recent_failures": [dict(row) for row in failures],
+    })
+    return status